@@ -14,10 +14,76 @@ class Settings:
     BASE_URL: str = config("BASE_URL", default="http://localhost:8000")
     QR_CODE_SIZE: int = 10
     QR_CODE_BORDER: int = 4
+    QR_MATRIX_CACHE_SIZE: int = config("QR_MATRIX_CACHE_SIZE", default=1024, cast=int)
+    
+    # Short codes: base62 codes from a keyed permutation of a shared counter.
+    # Set the key once, before the first code is issued, and never rotate it:
+    # the counter row records its fingerprint and allocation stops if it changes.
+    # Deliberately separate from SECRET_KEY, which is meant to be rotated.
+    SHORT_CODE_KEY: str = config("SHORT_CODE_KEY", default="")
+    SHORT_CODE_LENGTH: int = config("SHORT_CODE_LENGTH", default=7, cast=int)
+    SHORT_CODE_BLOCK_SIZE: int = config("SHORT_CODE_BLOCK_SIZE", default=1000, cast=int)
     
     # Rate limiting
     RATE_LIMIT_ATTEMPTS: int = 5
     RATE_LIMIT_WINDOW_MINUTES: int = 1
+    RATE_LIMIT_BACKEND: str = config("RATE_LIMIT_BACKEND", default="memory")  # memory | redis
+    UNLOCK_TOKEN_TTL_SECONDS: int = config("UNLOCK_TOKEN_TTL_SECONDS", default=900, cast=int)
+    
+    # Shared cache
+    REDIS_URL: str = config("REDIS_URL", default="redis://localhost:6379/0")
+    
+    # Cross-node cache invalidation
+    INVALIDATION_TRANSPORT: str = config("INVALIDATION_TRANSPORT", default="loopback")  # loopback | redis
+    INVALIDATION_CHANNEL: str = config("INVALIDATION_CHANNEL", default="qr-invalidation")
+    
+    # Redirect cache
+    REDIRECT_CACHE_SIZE: int = config("REDIRECT_CACHE_SIZE", default=10000, cast=int)
+    REDIRECT_CACHE_TTL_SECONDS: float = config("REDIRECT_CACHE_TTL_SECONDS", default=1.0, cast=float)
+    
+    # Memory-mapped redirect snapshot shared by the workers on a host
+    REDIRECT_SNAPSHOT_ENABLED: bool = config("REDIRECT_SNAPSHOT_ENABLED", default=False, cast=bool)
+    REDIRECT_SNAPSHOT_PATH: str = config("REDIRECT_SNAPSHOT_PATH", default="./snapshots/redirects.snap")
+    REDIRECT_SNAPSHOT_POLL_SECONDS: float = config("REDIRECT_SNAPSHOT_POLL_SECONDS", default=0.5, cast=float)
+    REDIRECT_SNAPSHOT_MAX_DELTA_BYTES: int = config("REDIRECT_SNAPSHOT_MAX_DELTA_BYTES", default=1048576, cast=int)
+    REDIRECT_SNAPSHOT_REBUILD_SECONDS: float = config("REDIRECT_SNAPSHOT_REBUILD_SECONDS", default=3600.0, cast=float)
+    
+    # Unknown-code filter (Bloom filter + negative cache)
+    CODE_FILTER_ENABLED: bool = config("CODE_FILTER_ENABLED", default=True, cast=bool)
+    CODE_FILTER_CAPACITY: int = config("CODE_FILTER_CAPACITY", default=100000, cast=int)
+    CODE_FILTER_ERROR_RATE: float = config("CODE_FILTER_ERROR_RATE", default=0.01, cast=float)
+    NEGATIVE_CACHE_SIZE: int = config("NEGATIVE_CACHE_SIZE", default=10000, cast=int)
+    NEGATIVE_CACHE_TTL_SECONDS: float = config("NEGATIVE_CACHE_TTL_SECONDS", default=1.0, cast=float)
+    
+    # Scan ingestion (write-behind buffer)
+    SCAN_SINK_ENABLED: bool = config("SCAN_SINK_ENABLED", default=True, cast=bool)
+    SCAN_SINK_BATCH_SIZE: int = config("SCAN_SINK_BATCH_SIZE", default=500, cast=int)
+    SCAN_SINK_FLUSH_INTERVAL_SECONDS: float = config("SCAN_SINK_FLUSH_INTERVAL_SECONDS", default=1.0, cast=float)
+    SCAN_SINK_MAX_QUEUE: int = config("SCAN_SINK_MAX_QUEUE", default=10000, cast=int)
+    USER_AGENT_CACHE_SIZE: int = config("USER_AGENT_CACHE_SIZE", default=2048, cast=int)
+    
+    # Bot classification (JSON list of [label, pattern]; empty uses the built-in rules)
+    BOT_RULES_PATH: str = config("BOT_RULES_PATH", default="")
+    
+    # GeoIP country lookup (MaxMind MMDB; empty path disables it)
+    GEOIP_DATABASE_PATH: str = config("GEOIP_DATABASE_PATH", default="")
+    GEOIP_CACHE_SIZE: int = config("GEOIP_CACHE_SIZE", default=65536, cast=int)
+    
+    # Bulk jobs. "local" runs queued jobs on a thread in the API process;
+    # "worker" leaves them to separate `python -m app.worker` processes.
+    BULK_JOB_RUNNER: str = config("BULK_JOB_RUNNER", default="local")  # local | worker
+    BULK_JOB_POLL_SECONDS: float = config("BULK_JOB_POLL_SECONDS", default=1.0, cast=float)
+    BULK_CHUNK_SIZE: int = config("BULK_CHUNK_SIZE", default=500, cast=int)
+    # A failed job is queued again, resuming from its last chunk, until it
+    # has run this often; a running job whose heartbeat is older than the
+    # stale timeout (its worker died) is taken over by another worker, or
+    # failed once it has used up its attempts.
+    BULK_JOB_MAX_ATTEMPTS: int = config("BULK_JOB_MAX_ATTEMPTS", default=3, cast=int)
+    BULK_JOB_STALE_SECONDS: float = config("BULK_JOB_STALE_SECONDS", default=600.0, cast=float)
+    BULK_RENDER_WORKERS: int = config("BULK_RENDER_WORKERS", default=0, cast=int)  # 0: one per CPU core
+    # Raw uploads and chunk parts of jobs; must not be under UPLOAD_DIR,
+    # which is served publicly at /uploads.
+    BULK_JOB_DIR: str = config("BULK_JOB_DIR", default="./jobs")
     
     # File storage
     UPLOAD_DIR: str = config("UPLOAD_DIR", default="./uploads")
@@ -1,9 +1,13 @@
 from sqlalchemy.orm import Session
-from app.models import SessionLocal
+from app.models import SessionLocal, AsyncSessionLocal
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
@@ -1,27 +1,40 @@
 from fastapi import FastAPI, Depends, HTTPException, Request, Form, UploadFile, File
-from fastapi.responses import RedirectResponse, FileResponse, HTMLResponse
+from fastapi.responses import RedirectResponse, FileResponse, HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 import os
 
-from app.deps import get_db
-from app.repo import QRCodeRepository
+from app.deps import get_db, get_async_db
+from app.models import async_engine
+from app.repo import QRCodeRepository, AsyncQRCodeRepository
 from app.schemas import (
     QRCreateRequest, QRUpdateRequest, QRTargetUpdate, 
-    QRCodeResponse, JobStatus, AnalyticsSummary,
+    QRCodeResponse, JobStatus, AnalyticsSummary, UTMParams,
     LandingPageCreateRequest, LandingPageUpdateRequest, LandingPageResponse,
     LeadCreateRequest, LeadResponse,
     UserSignUpRequest, UserLoginRequest, UserResponse, AuthResponse, TokenRefreshRequest
 )
-from app.services.qrcode import QRCodeService
-from app.services.redirect import RedirectService
-from app.services.bulk import BulkService
+from app.services.qrcode import MEDIA_TYPES, QRCodeService
+from app.services.redirect import AsyncRedirectService
+from app.services.jobs import bulk_jobs
 from app.services.analytics import AnalyticsService
 from app.services.landing import LandingPageService
 from app.services.auth import AuthService, verify_token, create_access_token, create_refresh_token
+from app.services.code_filter import code_filter
+from app.services.geoip import geoip
+from app.services.invalidation import invalidation_bus
+from app.services.redirect_cache import redirect_cache
+from app.services.redirect_snapshot import redirect_snapshot
+from app.services.scan_sink import scan_sink
+from app.services.short_codes import short_codes
+from app.services.matrix import matrix_cache
+from app.services.render_pool import render_pool
+from app.services.useragent import user_agent_cache
 from app.config import settings
 
 app = FastAPI(title="QRCode SaaS API", version="1.0.0")
@@ -39,6 +52,36 @@ app.add_middleware(
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
 
+@app.on_event("startup")
+async def start_background_services():
+    if settings.CODE_FILTER_ENABLED:
+        try:
+            await run_in_threadpool(code_filter.rebuild)
+        except Exception as e:
+            # Without a filter every code goes to the database as before
+            print(f"Error building code filter: {e}")
+    if settings.REDIRECT_SNAPSHOT_ENABLED:
+        await run_in_threadpool(redirect_snapshot.start)
+    await run_in_threadpool(invalidation_bus.start)
+    if settings.GEOIP_DATABASE_PATH:
+        await run_in_threadpool(geoip.open)
+    if settings.SCAN_SINK_ENABLED:
+        scan_sink.start()
+    if settings.BULK_JOB_RUNNER == "local":
+        bulk_jobs.start()
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    # Flush buffered scans before the worker exits
+    scan_sink.stop()
+    redirect_snapshot.stop()
+    invalidation_bus.stop()
+    geoip.close()
+    bulk_jobs.stop()
+    render_pool.shutdown()
+    # Close pooled async connections; aiosqlite keeps a worker thread per connection
+    await async_engine.dispose()
+
 # Security
 security = HTTPBearer(auto_error=False)
 
@@ -123,25 +166,27 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     return UserResponse(**current_user)
 
 # QR Code endpoints
+# Routes on the sync Session are plain `def` so FastAPI runs them in its
+# threadpool; the hot read paths use the async session instead.
 @app.get("/api/qr", response_model=List[QRCodeResponse])
 async def list_qr_codes(
     folder: Optional[str] = None,
     type: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        repo = QRCodeRepository(db)
+        repo = AsyncQRCodeRepository(db)
         # Filter by user if authenticated
         user_id = current_user.get("id") if current_user else None
-        qrs = repo.list_qrs(folder=folder, qr_type=type, user_id=user_id)
+        qrs = await repo.list_qrs(folder=folder, qr_type=type, user_id=user_id)
         
         qr_service = QRCodeService()
         results = []
         
         for qr in qrs:
-            # Generate download URLs if they don't exist
-            download_urls = qr_service.generate_qr_images(qr, ["png", "svg"])
+            # Images render on first download, not here
+            download_urls = qr_service.image_urls(qr, ["png", "svg"])
             
             results.append(QRCodeResponse(
                 id=qr.id,
@@ -165,7 +210,7 @@ async def list_qr_codes(
         return []
 
 @app.post("/api/qr", response_model=QRCodeResponse, status_code=201)
-async def create_qr_code(
+def create_qr_code(
     qr_data: QRCreateRequest,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -180,8 +225,8 @@ async def create_qr_code(
     # Create QR code
     qr = repo.create_qr(qr_data)
     
-    # Generate images
-    download_urls = qr_service.generate_qr_images(qr, [f.value for f in qr_data.formats])
+    # Images render on first download
+    download_urls = qr_service.image_urls(qr, [f.value for f in qr_data.formats])
     
     return QRCodeResponse(
         id=qr.id,
@@ -202,10 +247,10 @@ async def create_qr_code(
 async def get_qr_code(
     id: str, 
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    repo = QRCodeRepository(db)
-    qr = repo.get_qr_by_id(id)
+    repo = AsyncQRCodeRepository(db)
+    qr = await repo.get_qr_by_id(id)
     
     if not qr:
         raise HTTPException(status_code=404, detail="QR code not found")
@@ -215,7 +260,7 @@ async def get_qr_code(
         raise HTTPException(status_code=403, detail="Access denied")
     
     qr_service = QRCodeService()
-    download_urls = qr_service.generate_qr_images(qr, ["png", "svg"])
+    download_urls = qr_service.image_urls(qr, ["png", "svg"])
     
     return QRCodeResponse(
         id=qr.id,
@@ -233,7 +278,7 @@ async def get_qr_code(
     )
 
 @app.patch("/api/qr/{id}", response_model=QRCodeResponse)
-async def update_qr_code(
+def update_qr_code(
     id: str,
     qr_data: QRUpdateRequest,
     current_user: dict = Depends(get_current_user),
@@ -254,7 +299,7 @@ async def update_qr_code(
     qr = repo.update_qr(id, qr_data)
     
     qr_service = QRCodeService()
-    download_urls = qr_service.generate_qr_images(qr, ["png", "svg"])
+    download_urls = qr_service.image_urls(qr, ["png", "svg"])
     
     return QRCodeResponse(
         id=qr.id,
@@ -271,8 +316,48 @@ async def update_qr_code(
         created_at=qr.created_at
     )
 
+@app.get("/api/qr/{id}/image.{fmt}")
+async def get_qr_image(
+    id: str,
+    fmt: str,
+    request: Request,
+    v: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Render a QR image on first request, then serve it from the render cache"""
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Unsupported image format")
+    
+    repo = AsyncQRCodeRepository(db)
+    qr = await repo.get_qr_by_id(id)
+    if not qr:
+        raise HTTPException(status_code=404, detail="QR code not found")
+    
+    qr_service = QRCodeService()
+    key = qr_service.render_key(qr, fmt)
+    headers = {
+        "ETag": f'"{key}"',
+        # Versioned URLs (as returned by the API) never change; bare ones revalidate
+        "Cache-Control": "public, max-age=31536000, immutable" if v == key[:16] else "public, no-cache"
+    }
+    if etag_matches(request.headers.get("If-None-Match"), key):
+        return Response(status_code=304, headers=headers)
+    
+    filename, _ = await run_in_threadpool(qr_service.ensure_artifact, qr, fmt)
+    return FileResponse(os.path.join(qr_service.upload_dir, filename), media_type=MEDIA_TYPES[fmt], headers=headers)
+
+def etag_matches(if_none_match: Optional[str], key: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 specifies for it)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == f'"{key}"':
+            return True
+    return False
+
 @app.delete("/api/qr/{id}", status_code=204)
-async def delete_qr_code(
+def delete_qr_code(
     id: str, 
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -295,7 +380,7 @@ async def delete_qr_code(
         raise HTTPException(status_code=404, detail="QR code not found")
 
 @app.put("/api/qr/{id}/target", response_model=QRCodeResponse)
-async def update_qr_target(
+def update_qr_target(
     id: str,
     target_data: QRTargetUpdate,
     current_user: dict = Depends(get_current_user),
@@ -319,7 +404,7 @@ async def update_qr_target(
         raise HTTPException(status_code=404, detail="QR code not found or not dynamic")
     
     qr_service = QRCodeService()
-    download_urls = qr_service.generate_qr_images(qr, ["png", "svg"])
+    download_urls = qr_service.image_urls(qr, ["png", "svg"])
     
     return QRCodeResponse(
         id=qr.id,
@@ -336,12 +421,35 @@ async def update_qr_target(
         created_at=qr.created_at
     )
 
+# Folder (campaign) UTM settings, appended to the targets of its dynamic codes
+@app.get("/api/folders/{folder}/utm", response_model=UTMParams)
+def get_folder_utm(
+    folder: str,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    return UTMParams(**QRCodeRepository(db).get_folder_utm(folder))
+
+@app.put("/api/folders/{folder}/utm", response_model=UTMParams)
+def update_folder_utm(
+    folder: str,
+    utm: UTMParams,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    return UTMParams(**QRCodeRepository(db).set_folder_utm(folder, utm))
+
 # Bulk operations
 @app.post("/api/qr/bulk", response_model=JobStatus, status_code=202)
 async def bulk_create_qr(
     file: UploadFile = File(...),
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: dict = Depends(get_current_user)
 ):
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
@@ -349,30 +457,27 @@ async def bulk_create_qr(
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are supported")
     
-    # Read CSV content
-    csv_content = await file.read()
-    csv_text = csv_content.decode('utf-8')
-    
-    # Process bulk creation
-    repo = QRCodeRepository(db)
-    qr_service = QRCodeService()
-    bulk_service = BulkService(repo, qr_service)
-    
-    result = bulk_service.process_bulk_csv(csv_text, user_id=current_user.get("id"))
+    # Queue the job; a worker processes it and /api/jobs/{id} reports progress
+    job = await run_in_threadpool(bulk_jobs.enqueue, file.file, file.filename, current_user.get("id"))
+    return bulk_jobs.status(job)
+
+@app.get("/api/jobs/{id}", response_model=JobStatus)
+def get_job_status(
+    id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
     
-    # For now, return immediate result (in real app, this would be async)
-    zip_filename = os.path.basename(result["zip_path"])
-    result_url = f"{settings.BASE_URL}/uploads/{zip_filename}"
+    job = bulk_jobs.get(id)
+    if not job or job.user_id != current_user.get("id"):
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    return JobStatus(
-        id="immediate",
-        status="done",
-        result_url=result_url
-    )
+    return bulk_jobs.status(job)
 
 # Analytics
 @app.get("/api/analytics/qr/{id}/summary", response_model=AnalyticsSummary)
-async def get_qr_analytics(
+def get_qr_analytics(
     id: str,
     range: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
@@ -395,7 +500,7 @@ async def get_qr_analytics(
     return analytics_service.get_qr_analytics(id, range)
 
 @app.get("/api/analytics/dashboard", response_model=dict)
-async def get_dashboard_analytics(
+def get_dashboard_analytics(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -448,21 +553,37 @@ async def redirect_qr(
     code: str,
     request: Request,
     password: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    repo = QRCodeRepository(db)
-    redirect_service = RedirectService(repo)
+    redirect_service = AsyncRedirectService(AsyncQRCodeRepository(db))
     
-    return redirect_service.handle_redirect(code, request, password)
+    return await redirect_service.handle_redirect(code, request, password)
 
 # Health check
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def runtime_metrics():
+    """In-process counters for the redirect hot path"""
+    return {
+        "redirect_cache": redirect_cache.stats(),
+        "redirect_snapshot": redirect_snapshot.stats(),
+        "code_filter": code_filter.stats(),
+        "invalidation_bus": invalidation_bus.stats(),
+        "scan_sink": scan_sink.stats(),
+        "user_agent_cache": user_agent_cache.stats(),
+        "geoip": geoip.stats(),
+        "short_codes": short_codes.stats(),
+        "matrix_cache": matrix_cache.stats(),
+        "render_pool": render_pool.stats(),
+        "bulk_jobs": bulk_jobs.stats()
+    }
+
 # Landing Page endpoints
 @app.post("/landing-pages", response_model=LandingPageResponse, status_code=201)
-async def create_landing_page(
+def create_landing_page(
     data: LandingPageCreateRequest,
     db: Session = Depends(get_db)
 ):
@@ -477,7 +598,7 @@ async def create_landing_page(
     return LandingPageResponse.model_validate(landing_page.__dict__)
 
 @app.get("/landing-pages", response_model=List[LandingPageResponse])
-async def list_landing_pages(
+def list_landing_pages(
     qr_id: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
@@ -486,7 +607,7 @@ async def list_landing_pages(
     return [LandingPageResponse.model_validate(page.__dict__) for page in pages]
 
 @app.get("/landing-pages/{page_id}", response_model=LandingPageResponse)
-async def get_landing_page(page_id: str, db: Session = Depends(get_db)):
+def get_landing_page(page_id: str, db: Session = Depends(get_db)):
     landing_service = LandingPageService(db)
     page = landing_service.get_landing_page_by_id(page_id)
     
@@ -496,7 +617,7 @@ async def get_landing_page(page_id: str, db: Session = Depends(get_db)):
     return LandingPageResponse.model_validate(page.__dict__)
 
 @app.put("/landing-pages/{page_id}", response_model=LandingPageResponse)
-async def update_landing_page(
+def update_landing_page(
     page_id: str,
     data: LandingPageUpdateRequest,
     db: Session = Depends(get_db)
@@ -510,7 +631,7 @@ async def update_landing_page(
     return LandingPageResponse.model_validate(page.__dict__)
 
 @app.delete("/landing-pages/{page_id}", status_code=204)
-async def delete_landing_page(page_id: str, db: Session = Depends(get_db)):
+def delete_landing_page(page_id: str, db: Session = Depends(get_db)):
     landing_service = LandingPageService(db)
     success = landing_service.delete_landing_page(page_id)
     
@@ -518,7 +639,7 @@ async def delete_landing_page(page_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Landing page not found")
 
 @app.get("/l/{slug}", response_class=HTMLResponse)
-async def view_landing_page(slug: str, db: Session = Depends(get_db)):
+def view_landing_page(slug: str, db: Session = Depends(get_db)):
     """Serve the landing page by slug"""
     landing_service = LandingPageService(db)
     page = landing_service.get_landing_page_by_slug(slug)
@@ -530,7 +651,7 @@ async def view_landing_page(slug: str, db: Session = Depends(get_db)):
     return HTMLResponse(content=html_content)
 
 @app.post("/leads", response_model=LeadResponse, status_code=201)
-async def create_lead(
+def create_lead(
     data: LeadCreateRequest,
     request: Request,
     db: Session = Depends(get_db)
@@ -545,7 +666,7 @@ async def create_lead(
     return LeadResponse.model_validate(lead.__dict__)
 
 @app.get("/landing-pages/{page_id}/leads", response_model=List[LeadResponse])
-async def get_landing_page_leads(page_id: str, db: Session = Depends(get_db)):
+def get_landing_page_leads(page_id: str, db: Session = Depends(get_db)):
     landing_service = LandingPageService(db)
     leads = landing_service.get_leads_for_page(page_id)
     return [LeadResponse.model_validate(lead.__dict__) for lead in leads]
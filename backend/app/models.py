@@ -1,11 +1,26 @@
-from sqlalchemy import create_engine, Column, String, DateTime, Boolean, Integer, Text, JSON
+from sqlalchemy import create_engine, Column, String, Date, DateTime, Boolean, Integer, BigInteger, Text, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from datetime import datetime
 from app.config import settings
 
+def async_database_url(url: str) -> str:
+    """Map a sync database URL onto its asyncio driver"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    return url
+
 engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine over the same database, used by the non-blocking read paths
+async_engine = create_async_engine(async_database_url(settings.DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 class QRCode(Base):
@@ -24,6 +39,35 @@ class QRCode(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class QRVariantSet(Base):
+    """Weighted A/B targets of a dynamic QR code (one row per split QR)"""
+    __tablename__ = "qr_variant_sets"
+    
+    qr_id = Column(String, primary_key=True)
+    variants = Column(JSON, default=[])  # [{"name", "target", "weight"}]
+    sticky = Column(Boolean, default=False)  # same visitor, same variant
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UTMConfig(Base):
+    """UTM parameters appended to the targets of a QR code or a folder (campaign)"""
+    __tablename__ = "utm_configs"
+    
+    scope = Column(String, primary_key=True)  # "qr" or "folder"
+    key = Column(String, primary_key=True)  # QR id or folder name
+    params = Column(JSON, default={})  # {"utm_source": ..., "utm_campaign": ...}
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CompiledRedirect(Base):
+    """Final targets of a dynamic QR code with its UTM parameters compiled in.
+    Rewritten whenever the target, the split or the QR's or folder's UTM
+    settings change, so loading a redirect record only reads it."""
+    __tablename__ = "compiled_redirects"
+    
+    qr_id = Column(String, primary_key=True)
+    target = Column(Text, nullable=True)
+    variants = Column(JSON, nullable=True)  # VariantTable over the compiled targets
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class LandingPage(Base):
     __tablename__ = "landing_pages"
     
@@ -77,6 +121,64 @@ class Scan(Base):
     user_agent = Column(String, nullable=True)
     device = Column(String, nullable=True)
 
+class BotHit(Base):
+    """Daily per-QR counter of redirects served to crawlers and preview bots"""
+    __tablename__ = "bot_hits"
+    
+    qr_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    bot = Column(String, primary_key=True)  # Label of the matching bot rule
+    hits = Column(Integer, default=0)
+
+class VariantHit(Base):
+    """Daily per-QR counter of redirects served to each A/B variant"""
+    __tablename__ = "variant_hits"
+    
+    qr_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    variant = Column(String, primary_key=True)  # Variant name
+    hits = Column(Integer, default=0)
+
+class CodeCounter(Base):
+    """Shared counter that short-code blocks are reserved from"""
+    __tablename__ = "code_counters"
+    
+    name = Column(String, primary_key=True)
+    next_value = Column(BigInteger, default=0)  # First value not yet handed out
+    key_fingerprint = Column(String, nullable=True)  # Of the permutation key the values were issued under
+
+class BulkJob(Base):
+    """A queued bulk CSV import; the table doubles as the job queue"""
+    __tablename__ = "bulk_jobs"
+    
+    id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=True, index=True)
+    status = Column(String, default="queued", index=True)  # queued, running, done, failed
+    filename = Column(String)
+    input_path = Column(String)  # The uploaded CSV, kept until the job finishes
+    result_path = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    total = Column(Integer, nullable=True)
+    processed = Column(Integer, default=0)
+    succeeded = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)  # Runs started, including the current one
+    heartbeat_at = Column(DateTime, nullable=True)  # Refreshed after every chunk while running
+
+class BulkJobChunk(Base):
+    """Checkpoint of one bulk job chunk, committed with the chunk's QR rows"""
+    __tablename__ = "bulk_job_chunks"
+    
+    job_id = Column(String, primary_key=True)
+    chunk = Column(Integer, primary_key=True)
+    first_row = Column(Integer)
+    rows = Column(Integer)
+    results = Column(JSON)  # Result lines in row order; created rows also carry their render input
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class RateLimit(Base):
     __tablename__ = "rate_limits"
     
@@ -1,18 +1,100 @@
-from sqlalchemy.orm import Session
-from app.models import QRCode, Scan, RateLimit
-from app.schemas import QRCreateRequest, QRUpdateRequest, QRTargetUpdate, ScanEvent
-from typing import List, Optional
-from datetime import datetime, timedelta
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import QRCode, QRVariantSet, Scan, BotHit, VariantHit, UTMConfig, BulkJobChunk, CompiledRedirect
+from app.schemas import QRCreateRequest, QRUpdateRequest, QRTargetUpdate, ScanEvent, RedirectRecord, UTMParams, VariantTable
+from app.services.invalidation import QR_CHANGED, invalidation_bus
+from app.services.redirect_snapshot import redirect_snapshot
+from app.services.short_codes import short_codes
+from app.services.utm import compile_target, merge_utm
+from app.services.variants import build_variant_table
+from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
 import uuid
 import hashlib
 
+QR_UTM = aliased(UTMConfig, name="qr_utm")
+FOLDER_UTM = aliased(UTMConfig, name="folder_utm")
+
+# What a dynamic code's final targets are compiled from
+COMPILE_COLUMNS = (
+    QRCode.id, QRCode.target,
+    QRVariantSet.variants.label("variants"), QRVariantSet.sticky.label("sticky_variants"),
+    QR_UTM.params.label("qr_utm"), FOLDER_UTM.params.label("folder_utm")
+)
+
+# Columns the redirect path needs; loaded without building a full ORM object.
+# The compiled targets come from an outer join, so they cost no extra round
+# trip; the compile inputs are only there for codes written before targets
+# were compiled on write.
+REDIRECT_COLUMNS = (
+    QRCode.code, QRCode.type, QRCode.content,
+    QRCode.password_hash, QRCode.expiry_at, QRCode.is_active,
+    CompiledRedirect.qr_id.label("compiled_id"), CompiledRedirect.target.label("compiled_target"),
+    CompiledRedirect.variants.label("compiled_variants")
+) + COMPILE_COLUMNS
+
+def _join_compile_tables(query):
+    """Outer-join what COMPILE_COLUMNS needs beyond qr_codes (Query or select)"""
+    return (
+        query
+        .outerjoin(QRVariantSet, QRVariantSet.qr_id == QRCode.id)
+        .outerjoin(QR_UTM, (QR_UTM.scope == "qr") & (QR_UTM.key == QRCode.id))
+        .outerjoin(FOLDER_UTM, (FOLDER_UTM.scope == "folder") & (FOLDER_UTM.key == QRCode.folder))
+    )
+
+def _join_redirect_tables(query):
+    """Outer-join what REDIRECT_COLUMNS needs beyond qr_codes (Query or select)"""
+    return _join_compile_tables(query.outerjoin(CompiledRedirect, CompiledRedirect.qr_id == QRCode.id))
+
+def _compile_targets(row) -> Tuple[Optional[str], Optional[VariantTable]]:
+    """A dynamic code's target and A/B table with its UTM parameters compiled in"""
+    utm = merge_utm(row.folder_utm, row.qr_utm)
+    variants = None
+    if row.variants:
+        compiled = [{**variant, "target": compile_target(variant["target"], utm)} for variant in row.variants]
+        variants = build_variant_table(compiled, bool(row.sticky_variants))
+    return compile_target(row.target, utm), variants
+
+def _to_redirect_record(row) -> RedirectRecord:
+    """Build the record from the targets compiled when they were written, so
+    neither loading it nor redirecting does any URL work"""
+    target, variants = row.target, None
+    if row.type == "dynamic":
+        if row.compiled_id is not None:
+            target = row.compiled_target
+            variants = VariantTable.model_validate(row.compiled_variants) if row.compiled_variants else None
+        else:
+            target, variants = _compile_targets(row)
+    return RedirectRecord(
+        id=row.id,
+        code=row.code,
+        type=row.type,
+        content=row.content,
+        target=target,
+        password_hash=row.password_hash,
+        expiry_at=row.expiry_at,
+        is_active=bool(row.is_active),
+        variants=variants
+    )
+
+def hash_qr_password(password: str) -> str:
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def verify_qr_password(password: str, password_hash: str) -> bool:
+    return hash_qr_password(password) == password_hash
+
 class QRCodeRepository:
     def __init__(self, db: Session):
         self.db = db
     
-    def create_qr(self, qr_data: QRCreateRequest) -> QRCode:
-        qr_id = str(uuid.uuid4())
-        qr_code = str(uuid.uuid4())[:8]  # Short code for URLs
+    def create_qr(self, qr_data: QRCreateRequest, code: Optional[str] = None, qr_id: Optional[str] = None) -> QRCode:
+        """Create a QR code; ``code`` is one reserved through ``short_codes``
+        up front (bulk creation), otherwise one is allocated here. ``qr_id``
+        lets bulk jobs use ids that are stable across retries."""
+        qr_id = qr_id or str(uuid.uuid4())
+        qr_code = code or short_codes.allocate()  # Short code for URLs
         
         qr = QRCode(
             id=qr_id,
@@ -25,16 +107,109 @@ class QRCodeRepository:
             design=qr_data.design or {}
         )
         self.db.add(qr)
-        self.db.commit()
+        if qr.type == "dynamic" and qr_data.variants:
+            self._set_variants(qr, qr_data.variants, qr_data.sticky_variants)
+        if qr.type == "dynamic" and qr_data.utm:
+            self._set_utm("qr", qr.id, qr_data.utm)
+        try:
+            if qr.type == "dynamic":
+                self._compile_redirects([qr.id])
+            self.db.commit()
+        except Exception:
+            # Leave the session usable for the caller's next create
+            self.db.rollback()
+            raise
         self.db.refresh(qr)
+        self._redirect_changed(qr)
         return qr
     
+    def create_qrs(self, qr_data: List[QRCreateRequest], codes: Optional[List[str]] = None,
+                   ids: Optional[List[str]] = None, extra: Optional[list] = None) -> List[QRCode]:
+        """Create many QR codes in one transaction with multi-row inserts.
+    
+        ``codes`` are reserved short codes, one per request (allocated here
+        in one reservation when omitted); ``ids`` likewise replace the random
+        row ids. ``extra`` objects (a bulk job checkpoint) are added to the
+        same transaction. The returned QRCode objects are detached: they
+        carry the inserted values but are not in the session. If the batch
+        fails as a whole, nothing from it is kept and the error propagates,
+        so callers can retry row by row to find the offending rows.
+        """
+        if not qr_data and not extra:
+            return []
+        codes = codes or short_codes.allocate_many(len(qr_data))
+        ids = ids or [str(uuid.uuid4()) for _ in qr_data]
+        now = datetime.utcnow()
+    
+        qr_rows, variant_rows, utm_rows = [], [], []
+        for data, code, qr_id in zip(qr_data, codes, ids):
+            row = {
+                "id": qr_id,
+                "code": code,
+                "type": data.type.value,
+                "name": data.name,
+                "folder": data.folder,
+                "content": data.content,
+                "target": data.target,
+                "design": data.design or {},
+                "is_active": True,
+                "created_at": now
+            }
+            if row["type"] == "dynamic" and data.variants:
+                variant_rows.append({
+                    "qr_id": row["id"],
+                    "variants": [variant.model_dump() for variant in data.variants],
+                    "sticky": data.sticky_variants,
+                    "updated_at": now
+                })
+                # Clients that don't know about splits still see a target
+                row["target"] = row["target"] or data.variants[0].target
+            if row["type"] == "dynamic" and data.utm:
+                params = data.utm.model_dump(exclude_none=True)
+                if params:
+                    utm_rows.append({"scope": "qr", "key": row["id"], "params": params, "updated_at": now})
+            qr_rows.append(row)
+    
+        try:
+            if qr_rows:
+                self.db.execute(insert(QRCode), qr_rows)
+            if variant_rows:
+                self.db.execute(insert(QRVariantSet), variant_rows)
+            if utm_rows:
+                self.db.execute(insert(UTMConfig), utm_rows)
+            self._compile_redirects([row["id"] for row in qr_rows if row["type"] == "dynamic"])
+            self.db.add_all(extra or [])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+    
+        if qr_rows:
+            self._redirects_changed([row["code"] for row in qr_rows])
+        return [QRCode(**row) for row in qr_rows]
+    
+    def get_qrs_by_ids(self, ids: List[str]) -> Dict[str, QRCode]:
+        """QR codes among ``ids`` that exist, by id"""
+        if not ids:
+            return {}
+        return {qr.id: qr for qr in self.db.query(QRCode).filter(QRCode.id.in_(ids)).all()}
+    
     def get_qr_by_id(self, qr_id: str) -> Optional[QRCode]:
         return self.db.query(QRCode).filter(QRCode.id == qr_id, QRCode.is_active == True).first()
     
     def get_qr_by_code(self, code: str) -> Optional[QRCode]:
         return self.db.query(QRCode).filter(QRCode.code == code).first()
     
+    def get_redirect_record(self, code: str) -> Optional[RedirectRecord]:
+        """Load only the columns the redirect path needs"""
+        row = _join_redirect_tables(self.db.query(*REDIRECT_COLUMNS)).filter(QRCode.code == code).first()
+        return _to_redirect_record(row) if row else None
+    
+    def list_redirect_records(self) -> List[RedirectRecord]:
+        """Redirect records of every active code, for the redirect snapshot"""
+        rows = _join_redirect_tables(self.db.query(*REDIRECT_COLUMNS)).filter(QRCode.is_active == True).all()
+        return [_to_redirect_record(row) for row in rows]
+    
     def list_qrs(self, folder: Optional[str] = None, qr_type: Optional[str] = None, user_id: Optional[str] = None) -> List[QRCode]:
         query = self.db.query(QRCode).filter(QRCode.is_active == True)
         if folder:
@@ -56,9 +231,13 @@ class QRCodeRepository:
             qr.folder = qr_data.folder
         if qr_data.design is not None:
             qr.design = qr_data.design
+        if qr_data.folder is not None and qr.type == "dynamic":
+            # The folder's UTM settings apply from now on
+            self._compile_redirects([qr.id])
         
         self.db.commit()
         self.db.refresh(qr)
+        self._redirect_changed(qr)
         return qr
     
     def update_qr_target(self, qr_id: str, target_data: QRTargetUpdate) -> Optional[QRCode]:
@@ -72,9 +251,15 @@ class QRCodeRepository:
             qr.password_hash = self._hash_password(target_data.password) if target_data.password else None
         if target_data.expiry_at is not None:
             qr.expiry_at = target_data.expiry_at
+        if target_data.variants is not None or target_data.sticky_variants is not None:
+            self._set_variants(qr, target_data.variants, target_data.sticky_variants)
+        if target_data.utm is not None:
+            self._set_utm("qr", qr.id, target_data.utm)
+        self._compile_redirects([qr.id])
         
         self.db.commit()
         self.db.refresh(qr)
+        self._redirect_changed(qr)
         return qr
     
     def delete_qr(self, qr_id: str) -> bool:
@@ -84,8 +269,115 @@ class QRCodeRepository:
         
         qr.is_active = False
         self.db.commit()
+        self._redirect_changed(qr)
         return True
     
+    def get_variants(self, qr_id: str) -> Optional[QRVariantSet]:
+        return self.db.query(QRVariantSet).filter(QRVariantSet.qr_id == qr_id).first()
+    
+    def _set_variants(self, qr: QRCode, variants: Optional[list], sticky: Optional[bool]):
+        """Stage the A/B split of ``qr``; ``variants=None`` keeps the current
+        targets, an empty list removes the split"""
+        variant_set = self.get_variants(qr.id)
+        if variants is not None and not variants:
+            if variant_set:
+                self.db.delete(variant_set)
+            return
+        if variant_set is None:
+            if variants is None:
+                return
+            variant_set = QRVariantSet(qr_id=qr.id, sticky=False)
+            self.db.add(variant_set)
+        if variants is not None:
+            variant_set.variants = [variant.model_dump() for variant in variants]
+            # Clients that don't know about splits still see a target
+            if not qr.target:
+                qr.target = variants[0].target
+        if sticky is not None:
+            variant_set.sticky = sticky
+    
+    def get_folder_utm(self, folder: str) -> Dict[str, str]:
+        config = self.db.query(UTMConfig).filter(UTMConfig.scope == "folder", UTMConfig.key == folder).first()
+        return dict(config.params) if config else {}
+    
+    def set_folder_utm(self, folder: str, utm: UTMParams) -> Dict[str, str]:
+        """Set the UTM parameters of a folder (campaign) and recompile the
+        targets of every code in it"""
+        self._set_utm("folder", folder, utm)
+        qr_ids = [
+            qr_id for qr_id, in self.db.query(QRCode.id)
+            .filter(QRCode.folder == folder, QRCode.type == "dynamic", QRCode.is_active == True)
+        ]
+        self._compile_redirects(qr_ids)
+        self.db.commit()
+        for qr in self.db.query(QRCode).filter(QRCode.folder == folder, QRCode.is_active == True).all():
+            self._redirect_changed(qr)
+        return self.get_folder_utm(folder)
+    
+    def _set_utm(self, scope: str, key: str, utm: UTMParams):
+        """Stage UTM settings; with every field unset the row is removed"""
+        params = utm.model_dump(exclude_none=True)
+        config = self.db.query(UTMConfig).filter(UTMConfig.scope == scope, UTMConfig.key == key).first()
+        if not params:
+            if config:
+                self.db.delete(config)
+        elif config:
+            config.params = params
+        else:
+            self.db.add(UTMConfig(scope=scope, key=key, params=params))
+    
+    def _compile_redirects(self, qr_ids: List[str]):
+        """Stage the compiled targets of dynamic codes from their (staged)
+        target, split and UTM settings; part of the caller's transaction"""
+        self.db.flush()
+        for start in range(0, len(qr_ids), 500):
+            batch = qr_ids[start:start + 500]
+            rows = _join_compile_tables(self.db.query(*COMPILE_COLUMNS)).filter(QRCode.id.in_(batch)).all()
+            existing = {
+                compiled.qr_id: compiled
+                for compiled in self.db.query(CompiledRedirect).filter(CompiledRedirect.qr_id.in_(batch))
+            }
+            for row in rows:
+                target, variants = _compile_targets(row)
+                compiled = existing.get(row.id)
+                if compiled is None:
+                    compiled = CompiledRedirect(qr_id=row.id)
+                    self.db.add(compiled)
+                compiled.target = target
+                compiled.variants = variants.model_dump() if variants else None
+    
+    def _redirect_changed(self, qr: QRCode):
+        """Make a committed change visible to the redirect path on every node"""
+        invalidation_bus.publish(QR_CHANGED, qr.code)
+        if redirect_snapshot.running:
+            redirect_snapshot.record_change(self.get_redirect_record(qr.code))
+    
+    def _redirects_changed(self, codes: List[str]):
+        """``_redirect_changed`` for a batch, loading the snapshot records in one query"""
+        for code in codes:
+            invalidation_bus.publish(QR_CHANGED, code)
+        if redirect_snapshot.running:
+            rows = _join_redirect_tables(self.db.query(*REDIRECT_COLUMNS)).filter(QRCode.code.in_(codes)).all()
+            for row in rows:
+                redirect_snapshot.record_change(_to_redirect_record(row))
+    
+    def get_job_chunk_rows(self, job_id: str) -> Dict[int, int]:
+        """Row count of every checkpointed chunk of a bulk job, by chunk"""
+        rows = self.db.query(BulkJobChunk.chunk, BulkJobChunk.rows).filter(BulkJobChunk.job_id == job_id).all()
+        return {chunk: count for chunk, count in rows}
+    
+    def get_job_chunk(self, job_id: str, chunk: int) -> Optional[BulkJobChunk]:
+        return self.db.get(BulkJobChunk, (job_id, chunk))
+    
+    def add_job_chunk(self, checkpoint: BulkJobChunk):
+        self.db.add(checkpoint)
+        self.db.commit()
+    
+    def delete_job_chunks(self, job_id: str) -> int:
+        deleted = self.db.query(BulkJobChunk).filter(BulkJobChunk.job_id == job_id).delete(synchronize_session=False)
+        self.db.commit()
+        return deleted
+    
     def record_scan(self, scan_event: ScanEvent) -> Scan:
         scan_id = str(uuid.uuid4())
         scan = Scan(
@@ -94,13 +386,71 @@ class QRCodeRepository:
             ip_hash=scan_event.ip_hash,
             country=scan_event.country,
             user_agent=scan_event.user_agent,
-            device=scan_event.device
+            device=scan_event.device,
+            happened_at=scan_event.happened_at or datetime.utcnow()
         )
         self.db.add(scan)
         self.db.commit()
         self.db.refresh(scan)
         return scan
     
+    def record_scans(self, scan_events: List[ScanEvent]) -> int:
+        """Insert a batch of scan events in one multi-row statement"""
+        if not scan_events:
+            return 0
+        
+        now = datetime.utcnow()
+        rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "qr_id": event.qr_id,
+                "ip_hash": event.ip_hash,
+                "country": event.country,
+                "user_agent": event.user_agent,
+                "device": event.device,
+                "happened_at": event.happened_at or now
+            }
+            for event in scan_events
+        ]
+        self.db.execute(insert(Scan), rows)
+        self.db.commit()
+        return len(rows)
+    
+    def record_bot_hits(self, counts: Dict[Tuple[str, date, str], int]) -> int:
+        """Add ``{(qr_id, day, bot): hits}`` to the daily bot counters"""
+        return self._add_daily_hits(BotHit, BotHit.bot, counts)
+    
+    def record_variant_hits(self, counts: Dict[Tuple[str, date, str], int]) -> int:
+        """Add ``{(qr_id, day, variant): hits}`` to the daily A/B counters"""
+        return self._add_daily_hits(VariantHit, VariantHit.variant, counts)
+    
+    def _add_daily_hits(self, model, label_column, counts: Dict[Tuple[str, date, str], int]) -> int:
+        """Upsert ``{(qr_id, day, label): hits}`` into a daily counter table"""
+        for key, hits in counts.items():
+            if self._increment_daily_hits(model, label_column, key, hits):
+                continue
+            # Commit the increments so far; a failed insert rolls back only itself
+            self.db.commit()
+            qr_id, day, label = key
+            try:
+                self.db.add(model(qr_id=qr_id, day=day, hits=hits, **{label_column.key: label}))
+                self.db.commit()
+            except IntegrityError:
+                # Another worker inserted the row first
+                self.db.rollback()
+                self._increment_daily_hits(model, label_column, key, hits)
+        self.db.commit()
+        return sum(counts.values())
+    
+    def _increment_daily_hits(self, model, label_column, key: Tuple[str, date, str], hits: int) -> bool:
+        qr_id, day, label = key
+        result = self.db.execute(
+            update(model)
+            .where(model.qr_id == qr_id, model.day == day, label_column == label)
+            .values(hits=model.hits + hits)
+        )
+        return result.rowcount > 0
+    
     def get_scan_analytics(self, qr_id: str, days: int = 30) -> dict:
         since_date = datetime.utcnow() - timedelta(days=days)
         scans = self.db.query(Scan).filter(
@@ -123,49 +473,81 @@ class QRCodeRepository:
             if scan.country:
                 by_country[scan.country] = by_country.get(scan.country, 0) + 1
         
+        bot_hits = self.db.query(BotHit).filter(
+            BotHit.qr_id == qr_id,
+            BotHit.day >= since_date.date()
+        ).all()
+        
+        # Per-variant hits: every configured variant, then any removed since
+        by_variant = {}
+        variant_set = self.get_variants(qr_id)
+        for variant in (variant_set.variants if variant_set else []):
+            by_variant[variant["name"]] = {"variant": variant["name"], "target": variant["target"], "scans": 0}
+        variant_hits = self.db.query(VariantHit).filter(
+            VariantHit.qr_id == qr_id,
+            VariantHit.day >= since_date.date()
+        ).all()
+        for row in variant_hits:
+            entry = by_variant.setdefault(row.variant, {"variant": row.variant, "target": None, "scans": 0})
+            entry["scans"] += row.hits
+        
         return {
             "total_scans": total_scans,
             "unique_scans": unique_scans,
+            "bot_hits": sum(row.hits for row in bot_hits),
+            "by_variant": list(by_variant.values()),
             "by_day": [{"date": k, "scans": v} for k, v in by_day.items()],
             "top_countries": [{"country": k, "scans": v} for k, v in 
                              sorted(by_country.items(), key=lambda x: x[1], reverse=True)[:10]]
         }
     
-    def check_rate_limit(self, ip_hash: str, qr_code: str, max_attempts: int = 5, window_minutes: int = 1) -> bool:
-        """Check if IP has exceeded rate limit for wrong password attempts"""
-        window_start = datetime.utcnow() - timedelta(minutes=window_minutes)
-        
-        # Clean old entries
-        self.db.query(RateLimit).filter(RateLimit.window_start < window_start).delete()
-        
-        # Check current attempts
-        rate_limit = self.db.query(RateLimit).filter(
-            RateLimit.ip_hash == ip_hash,
-            RateLimit.qr_code == qr_code,
-            RateLimit.window_start >= window_start
-        ).first()
-        
-        if not rate_limit:
-            # First attempt in window
-            rate_limit = RateLimit(
-                id=str(uuid.uuid4()),
-                ip_hash=ip_hash,
-                qr_code=qr_code,
-                attempts=1
-            )
-            self.db.add(rate_limit)
-            self.db.commit()
-            return True
-        
-        if rate_limit.attempts >= max_attempts:
-            return False
-        
-        rate_limit.attempts += 1
-        self.db.commit()
-        return True
-    
     def _hash_password(self, password: str) -> str:
-        return hashlib.sha256(password.encode()).hexdigest()
+        return hash_qr_password(password)
     
     def verify_password(self, password: str, password_hash: str) -> bool:
-        return self._hash_password(password) == password_hash
\ No newline at end of file
+        return verify_qr_password(password, password_hash)
+
+class AsyncQRCodeRepository:
+    """Repository on an AsyncSession, used by the non-blocking routes.
+
+    Reads are native async queries; the write helpers reuse the sync
+    QRCodeRepository through ``AsyncSession.run_sync`` so the logic lives in
+    one place.
+    """
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def get_qr_by_id(self, qr_id: str) -> Optional[QRCode]:
+        result = await self.db.execute(
+            select(QRCode).where(QRCode.id == qr_id, QRCode.is_active == True)
+        )
+        return result.scalars().first()
+    
+    async def get_redirect_record(self, code: str) -> Optional[RedirectRecord]:
+        result = await self.db.execute(
+            _join_redirect_tables(select(*REDIRECT_COLUMNS)).where(QRCode.code == code)
+        )
+        row = result.first()
+        return _to_redirect_record(row) if row else None
+    
+    async def list_qrs(self, folder: Optional[str] = None, qr_type: Optional[str] = None, user_id: Optional[str] = None) -> List[QRCode]:
+        query = select(QRCode).where(QRCode.is_active == True)
+        if folder:
+            query = query.where(QRCode.folder == folder)
+        if qr_type:
+            query = query.where(QRCode.type == qr_type)
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+    
+    async def get_scan_analytics(self, qr_id: str, days: int = 30) -> dict:
+        return await self.db.run_sync(lambda db: QRCodeRepository(db).get_scan_analytics(qr_id, days))
+    
+    async def record_scan(self, scan_event: ScanEvent) -> Scan:
+        return await self.db.run_sync(lambda db: QRCodeRepository(db).record_scan(scan_event))
+    
+    async def record_bot_hits(self, counts: Dict[Tuple[str, date, str], int]) -> int:
+        return await self.db.run_sync(lambda db: QRCodeRepository(db).record_bot_hits(counts))
+    
+    async def record_variant_hits(self, counts: Dict[Tuple[str, date, str], int]) -> int:
+        return await self.db.run_sync(lambda db: QRCodeRepository(db).record_variant_hits(counts))
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, field_validator
 from typing import Optional, Dict, List, Any
 from datetime import datetime
 from enum import Enum
@@ -38,14 +38,46 @@ class QRFormat(str, Enum):
     svg = "svg"
     pdf = "pdf"
 
+class QRVariant(BaseModel):
+    """One weighted target of an A/B split"""
+    target: str
+    weight: float = Field(default=1.0, gt=0)
+    name: Optional[str] = None  # defaults to A, B, C... by position
+
+def _check_variant_names(variants: Optional[List[QRVariant]]) -> Optional[List[QRVariant]]:
+    """Name unnamed variants by position and reject duplicates"""
+    for position, variant in enumerate(variants or []):
+        if not variant.name:
+            variant.name = chr(ord("A") + position) if position < 26 else str(position + 1)
+    names = [variant.name for variant in variants or []]
+    if len(names) != len(set(names)):
+        raise ValueError("variant names must be unique")
+    return variants
+
+class UTMParams(BaseModel):
+    """utm_* parameters appended to dynamic targets; unset fields are inherited"""
+    utm_source: Optional[str] = None
+    utm_medium: Optional[str] = None
+    utm_campaign: Optional[str] = None
+    utm_term: Optional[str] = None
+    utm_content: Optional[str] = None
+
 class QRCreateRequest(BaseModel):
     type: QRType
     content: Optional[str] = None  # for static
     target: Optional[str] = None   # for dynamic
+    variants: Optional[List[QRVariant]] = None  # A/B split, dynamic only
+    sticky_variants: bool = False  # same visitor always gets the same variant
+    utm: Optional[UTMParams] = None  # overrides the folder's UTM settings
     name: Optional[str] = None
     folder: Optional[str] = None
     design: Optional[Dict[str, Any]] = Field(default_factory=dict)
     formats: List[QRFormat] = Field(default=[QRFormat.png])
+    
+    @field_validator("variants")
+    @classmethod
+    def check_variant_names(cls, variants):
+        return _check_variant_names(variants)
 
 class QRUpdateRequest(BaseModel):
     name: Optional[str] = None
@@ -56,6 +88,14 @@ class QRTargetUpdate(BaseModel):
     target: Optional[str] = None
     password: Optional[str] = None
     expiry_at: Optional[datetime] = None
+    variants: Optional[List[QRVariant]] = None  # an empty list removes the split
+    sticky_variants: Optional[bool] = None
+    utm: Optional[UTMParams] = None  # all fields unset removes the QR's own UTM settings
+    
+    @field_validator("variants")
+    @classmethod
+    def check_variant_names(cls, variants):
+        return _check_variant_names(variants)
 
 class QRCodeResponse(BaseModel):
     id: str
@@ -76,6 +116,10 @@ class JobStatus(BaseModel):
     status: str  # queued, running, done, failed
     result_url: Optional[str] = None
     error: Optional[str] = None
+    total: Optional[int] = None  # Rows in the upload, once counted
+    processed: int = 0
+    succeeded: int = 0
+    failed: int = 0
 
 class AnalyticsSummary(BaseModel):
     total_scans: int
@@ -91,6 +135,40 @@ class ScanEvent(BaseModel):
     country: Optional[str] = None
     user_agent: Optional[str] = None
     device: Optional[str] = None
+    happened_at: Optional[datetime] = None
+    variant: Optional[str] = None  # A/B variant served, if the code has a split
+
+class UserAgentInfo(BaseModel):
+    """Labels derived from a User-Agent header"""
+    device: str
+    os: str
+    browser: str
+
+class InvalidationEvent(BaseModel):
+    """Cache invalidation broadcast between backend nodes"""
+    node: str
+    kind: str
+    key: str
+
+class VariantTable(BaseModel):
+    """Weighted targets of a dynamic QR with their precomputed alias table"""
+    names: List[str]
+    targets: List[str]
+    prob: List[float]  # probability of keeping column i
+    alias: List[int]  # column to fall back to otherwise
+    sticky: bool = False
+
+class RedirectRecord(BaseModel):
+    """Resolved fields of a QR code needed to serve /r/{code}"""
+    id: str
+    code: str
+    type: str
+    content: Optional[str] = None
+    target: Optional[str] = None
+    password_hash: Optional[str] = None
+    expiry_at: Optional[datetime] = None
+    is_active: bool = True
+    variants: Optional[VariantTable] = None
 
 # Landing Page Schemas
 class LandingPageContentBlock(BaseModel):
@@ -1,82 +1,247 @@
 import csv
 import io
+import itertools
+import shutil
+import tempfile
 import zipfile
-from typing import List, Dict, Any
+from types import SimpleNamespace
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Union
 import uuid
-import tempfile
 import os
+from app.config import settings
+from app.models import BulkJobChunk
 from app.schemas import QRCreateRequest, QRFormat
 from app.repo import QRCodeRepository
 from app.services.qrcode import QRCodeService
+from app.services.render_pool import render_pool
+from app.services.short_codes import short_codes
+
+RESULT_FIELDS = ["id", "code", "name", "download_url", "status", "error"]
+
+def _row_id(job_id: str, row: int) -> str:
+    """QR code id of a bulk job row; the same on every attempt of the job"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"bulk-job:{job_id}:{row}"))
 
 class BulkService:
     def __init__(self, repo: QRCodeRepository, qr_service: QRCodeService):
         self.repo = repo
         self.qr_service = qr_service
     
-    def process_bulk_csv(self, csv_content: str) -> Dict[str, Any]:
-        """Process bulk QR creation from CSV content"""
-        # Parse CSV
-        csv_reader = csv.DictReader(io.StringIO(csv_content))
-        results = []
+    def process_bulk_csv(self, csv_content: Union[str, IO[str]], progress: Optional[Callable[[Dict[str, int]], None]] = None,
+                         job_id: Optional[str] = None) -> Dict[str, Any]:
+        """Process bulk QR creation from CSV content (a string or a text file).
+        
+        The pipeline streams: rows are read a chunk at a time, each chunk is
+        created in the database and rendered in the render pool, and its
+        result lines go to a part file of their own. At the end the PNGs go
+        straight from the artifact store into the result ZIP, followed by
+        the parts' result lines. Only one chunk is held in
+        memory, whatever the size of the upload (the ZIP's central directory
+        aside). ``progress`` is called with the running counts after every
+        chunk.
         
-        # Create temp directory for images
-        temp_dir = tempfile.mkdtemp()
+        With ``job_id`` the run is checkpointed and can be resumed by calling
+        again with the same upload: each chunk's checkpoint is committed in
+        the transaction that creates its rows, and rows get ids derived from
+        the job and row number, so a retry skips chunks whose part was
+        written, renders chunks that were only committed, and never creates
+        a row twice. ``discard_checkpoints`` removes the state afterwards.
+        """
+        source = io.StringIO(csv_content) if isinstance(csv_content, str) else csv_content
+        total = self._count_rows(source)
+        rows = csv.DictReader(source)
+        chunk_size = max(1, settings.BULK_CHUNK_SIZE)
+        counts = {"total": total, "processed": 0, "succeeded": 0, "failed": 0}
+        
+        if job_id:
+            work_dir = self._job_dir(job_id)
+            os.makedirs(work_dir, exist_ok=True)
+            checkpointed = self.repo.get_job_chunk_rows(job_id)
+            zip_path = os.path.join(self.qr_service.upload_dir, f"bulk_qr_{job_id}.zip")
+        else:
+            work_dir = tempfile.mkdtemp(prefix="bulk-")
+            checkpointed = {}
+            zip_path = os.path.join(self.qr_service.upload_dir, f"bulk_qr_{uuid.uuid4().hex[:8]}.zip")
         
         try:
-            for row in csv_reader:
-                try:
-                    # Create QR request from CSV row
-                    qr_request = self._csv_row_to_qr_request(row)
-                    
-                    # Create QR code
-                    qr = self.repo.create_qr(qr_request)
-                    
-                    # Generate PNG image
-                    download_urls = self.qr_service.generate_qr_images(qr, ["png"])
-                    
-                    # Copy PNG to temp directory
-                    png_filename = f"{qr.code}.png"
-                    src_path = os.path.join(self.qr_service.upload_dir, png_filename)
-                    dst_path = os.path.join(temp_dir, png_filename)
-                    
-                    if os.path.exists(src_path):
-                        import shutil
-                        shutil.copy2(src_path, dst_path)
-                    
-                    results.append({
-                        "id": qr.id,
-                        "code": qr.code,
-                        "name": qr.name or "",
-                        "download_url": download_urls.get("png", ""),
-                        "status": "success",
-                        "error": ""
-                    })
-                    
-                except Exception as e:
-                    results.append({
-                        "id": "",
-                        "code": "",
-                        "name": row.get("name", ""),
-                        "download_url": "",
-                        "status": "error",
-                        "error": str(e)
-                    })
-            
-            # Create ZIP file
-            zip_path = self._create_result_zip(temp_dir, results)
-            
-            return {
-                "total_processed": len(results),
-                "successful": len([r for r in results if r["status"] == "success"]),
-                "failed": len([r for r in results if r["status"] == "error"]),
-                "zip_path": zip_path,
-                "results": results
-            }
+            part_paths = []
+            first_row = 0
+            for chunk_index in itertools.count():
+                # A checkpointed chunk keeps its rows even if the chunk size changed since
+                chunk = list(itertools.islice(rows, checkpointed.get(chunk_index, chunk_size)))
+                if not chunk:
+                    break
+                part_path = os.path.join(work_dir, f"chunk-{chunk_index:06d}.csv")
+                if not os.path.exists(part_path):
+                    if chunk_index in checkpointed:
+                        results = self.repo.get_job_chunk(job_id, chunk_index).results
+                    else:
+                        results = self._create_chunk(chunk, job_id, chunk_index, first_row)
+                    self._write_part(results, part_path)
+                part_paths.append(part_path)
+                first_row += len(chunk)
+                
+                for result in self._read_part(part_path):
+                    counts["processed"] += 1
+                    counts["succeeded" if result["status"] == "success" else "failed"] += 1
+                if progress:
+                    progress(dict(counts))
             
+            self._join_parts(part_paths, zip_path)
+        finally:
+            if not job_id:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        
+        return {
+            "total_processed": counts["processed"],
+            "successful": counts["succeeded"],
+            "failed": counts["failed"],
+            "zip_path": zip_path
+        }
+    
+    def discard_checkpoints(self, job_id: str):
+        """Remove a finished job's checkpoints and parts"""
+        self.repo.delete_job_chunks(job_id)
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+    
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(settings.BULK_JOB_DIR, job_id)
+    
+    def _count_rows(self, source: IO[str]) -> Optional[int]:
+        """Data rows in a seekable upload, counted in one streaming pass (None otherwise)"""
+        if not source.seekable():
+            return None
+        start = source.tell()
+        total = max(0, sum(1 for _ in csv.reader(source)) - 1)  # minus the header
+        source.seek(start)
+        return total
+    
+    def _create_chunk(self, rows: List[Dict[str, str]], job_id: Optional[str], chunk_index: int, first_row: int) -> List[Dict[str, Any]]:
+        """Create one chunk of rows in the database; results in row order.
+        
+        Created rows' results also carry their render input under "render".
+        For a job the results are committed as the chunk's checkpoint along
+        with the rows.
+        """
+        results = []
+        ids = [_row_id(job_id, first_row + offset) if job_id else str(uuid.uuid4()) for offset in range(len(rows))]
+        
+        # Validate every row first; invalid rows are reported and skipped
+        requests = []  # (index into results, QR request)
+        for row in rows:
+            try:
+                requests.append((len(results), self._csv_row_to_qr_request(row)))
+                results.append(None)
+            except Exception as e:
+                results.append(self._error_result(row, e))
+        
+        # Rows an interrupted row-by-row retry of this chunk already created are kept
+        existing = self.repo.get_qrs_by_ids([ids[index] for index, _ in requests]) if job_id else {}
+        for index, _ in requests:
+            if ids[index] in existing:
+                results[index] = self._created_result(existing[ids[index]])
+        requests = [(index, qr_request) for index, qr_request in requests if ids[index] not in existing]
+        
+        # Reserve the chunk's short codes in one go and insert the chunk in one transaction
+        codes = short_codes.allocate_many(len(requests))
+        batch = list(results)
+        for (index, qr_request), code in zip(requests, codes):
+            batch[index] = self._created_result(SimpleNamespace(
+                id=ids[index], code=code, name=qr_request.name, type=qr_request.type.value,
+                content=qr_request.content, design=qr_request.design
+            ))
+        try:
+            self.repo.create_qrs(
+                [qr_request for _, qr_request in requests], codes,
+                ids=[ids[index] for index, _ in requests],
+                extra=[self._checkpoint(job_id, chunk_index, first_row, batch)] if job_id else None
+            )
+            return batch
+        except Exception as e:
+            # Nothing from the chunk was kept; insert row by row so only the offending rows fail
+            print(f"Bulk insert of {len(requests)} rows failed, retrying row by row: {e}")
+        
+        for (index, qr_request), code in zip(requests, codes):
+            try:
+                results[index] = self._created_result(self.repo.create_qr(qr_request, code=code, qr_id=ids[index]))
+            except Exception as row_error:
+                results[index] = self._error_result(rows[index], row_error)
+        if job_id:
+            self.repo.add_job_chunk(self._checkpoint(job_id, chunk_index, first_row, results))
+        return results
+    
+    def _write_part(self, results: List[Dict[str, Any]], part_path: str):
+        """Render a chunk's created rows and write its result lines to ``part_path``"""
+        results = [dict(result) for result in results]
+        created = [result for result in results if result.get("render")]
+        
+        # Generate PNG images; results come back in the order of the tasks
+        rendered = render_pool.render([result["render"] for result in created], self.qr_service.upload_dir, "png")
+        for result, (filename, error) in zip(created, rendered):
+            if error:
+                result.update(status="error", error=f"Rendering failed: {error}")
+            else:
+                result["download_url"] = f"{self.qr_service.base_url}/uploads/{filename}"
+        
+        # Written under a temporary name, so a part that exists is complete
+        with open(f"{part_path}.tmp", "w", encoding="utf-8", newline="") as f:
+            csv.DictWriter(f, fieldnames=RESULT_FIELDS, extrasaction="ignore").writerows(results)
+        os.replace(f"{part_path}.tmp", part_path)
+    
+    def _read_part(self, part_path: str) -> Iterator[Dict[str, str]]:
+        with open(part_path, "r", encoding="utf-8", newline="") as f:
+            yield from csv.DictReader(f, fieldnames=RESULT_FIELDS)
+    
+    def _join_parts(self, part_paths: List[str], zip_path: str):
+        """Write the parts' PNGs, then their result lines under one header, to the result ZIP"""
+        temp_path = f"{zip_path}.part"
+        try:
+            with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_STORED) as zipf:
+                for part_path in part_paths:
+                    for result in self._read_part(part_path):
+                        if result["status"] == "success":
+                            # PNG is already compressed, so it is stored as-is; it comes
+                            # straight from the artifact store the download URL points at
+                            filename = result["download_url"].rsplit("/", 1)[1]
+                            zipf.write(os.path.join(self.qr_service.upload_dir, filename), f"{result['code']}.png")
+                
+                with zipf.open("results.csv", "w") as member:
+                    member.write((",".join(RESULT_FIELDS) + "\r\n").encode("utf-8"))
+                    for part_path in part_paths:
+                        with open(part_path, "rb") as f:
+                            shutil.copyfileobj(f, member)
+            os.replace(temp_path, zip_path)
         finally:
-            # Cleanup temp directory (except the zip file)
-            self._cleanup_temp_files(temp_dir)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def _checkpoint(self, job_id: str, chunk_index: int, first_row: int, results: List[Dict[str, Any]]) -> BulkJobChunk:
+        return BulkJobChunk(job_id=job_id, chunk=chunk_index, first_row=first_row, rows=len(results), results=results)
+    
+    def _created_result(self, qr) -> Dict[str, Any]:
+        return {
+            "id": qr.id,
+            "code": qr.code,
+            "name": qr.name or "",
+            "download_url": "",
+            "status": "success",
+            "error": "",
+            "render": {
+                "code": qr.code,
+                "content": self.qr_service.get_qr_content(qr),
+                "design": qr.design or {}
+            }
+        }
+    
+    def _error_result(self, row: Dict[str, str], error: Exception) -> Dict[str, Any]:
+        return {
+            "id": "",
+            "code": "",
+            "name": row.get("name", ""),
+            "download_url": "",
+            "status": "error",
+            "error": str(error)
+        }
     
     def _csv_row_to_qr_request(self, row: Dict[str, str]) -> QRCreateRequest:
         """Convert CSV row to QR creation request"""
@@ -96,44 +261,3 @@ class BulkService:
             folder=row.get("folder", ""),
             formats=[QRFormat.png]
         )
-    
-    def _create_result_zip(self, temp_dir: str, results: List[Dict[str, Any]]) -> str:
-        """Create ZIP file containing PNG files and results CSV"""
-        zip_filename = f"bulk_qr_{uuid.uuid4().hex[:8]}.zip"
-        zip_path = os.path.join(self.qr_service.upload_dir, zip_filename)
-        
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Add PNG files
-            for filename in os.listdir(temp_dir):
-                if filename.endswith('.png'):
-                    file_path = os.path.join(temp_dir, filename)
-                    zipf.write(file_path, filename)
-            
-            # Add results CSV
-            csv_content = self._create_results_csv(results)
-            zipf.writestr("results.csv", csv_content)
-        
-        return zip_path
-    
-    def _create_results_csv(self, results: List[Dict[str, Any]]) -> str:
-        """Create CSV content from results"""
-        output = io.StringIO()
-        fieldnames = ["id", "code", "name", "download_url", "status", "error"]
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        for result in results:
-            writer.writerow(result)
-        
-        return output.getvalue()
-    
-    def _cleanup_temp_files(self, temp_dir: str):
-        """Clean up temporary files"""
-        try:
-            import shutil
-            # Remove PNG files but keep the directory structure
-            for filename in os.listdir(temp_dir):
-                if filename.endswith('.png'):
-                    os.remove(os.path.join(temp_dir, filename))
-        except Exception:
-            pass  # Ignore cleanup errors
\ No newline at end of file
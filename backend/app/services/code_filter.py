@@ -0,0 +1,246 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+import hashlib
+import math
+import threading
+import time
+from app.config import settings
+from app.models import SessionLocal, QRCode
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on blake2b)"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def add(self, item: str) -> bool:
+        """Set the item's bits; returns False if they were all set already"""
+        positions = self._positions(item)
+        if all(self._bits[position >> 3] & (1 << (position & 7)) for position in positions):
+            return False
+        for position in positions:
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+        return True
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+    @property
+    def expected_false_positive_rate(self) -> float:
+        """Theoretical false-positive rate at the current fill"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+class CodeFilter:
+    """Answers "can this short code exist?" without a database round trip.
+
+    A Bloom filter over every active ``QRCode.code`` is rebuilt at startup and
+    updated as this worker creates codes. Codes the filter let through but
+    the database confirmed missing go into a short-TTL negative cache.
+    Codes created by other workers are picked up by an incremental sync on
+    ``created_at`` that runs at most once per sync interval, before a code is
+    rejected. A miss is only final right after a sync, or while
+    ``creates_broadcast()`` says every create reaches this filter at once
+    (a shared invalidation transport); otherwise the database decides, so a
+    code created elsewhere never 404s. Until the first rebuild succeeds
+    every code is let through.
+
+    Bloom filters can't forget, so deleted codes stay in the filter until the
+    next rebuild; their lookups still reach the database and 404 there.
+    """
+
+    # Rows created this close to the last sync are re-read, to cover clock
+    # skew between workers and commits that landed out of order
+    SYNC_OVERLAP = timedelta(seconds=5)
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        capacity: int = 100000,
+        error_rate: float = 0.01,
+        negative_ttl: float = 1.0,
+        negative_cache_size: int = 10000,
+        sync_interval: float = 1.0,
+        creates_broadcast: Callable[[], bool] = lambda: False
+    ):
+        self.session_factory = session_factory
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.negative_ttl = negative_ttl
+        self.negative_cache_size = negative_cache_size
+        self.sync_interval = sync_interval
+        self.creates_broadcast = creates_broadcast
+        self._bloom: Optional[BloomFilter] = None
+        self._negative: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._synced_until: Optional[datetime] = None
+        self._next_sync = 0.0
+
+        self.rejected = 0
+        self.unsynced_misses = 0
+        self.false_positives = 0
+        self.negative_hits = 0
+        self.syncs = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._bloom is not None
+
+    def rebuild(self):
+        """Reload the filter from every active code in the database"""
+        db = self.session_factory()
+        try:
+            rows = db.query(QRCode.code, QRCode.created_at).filter(QRCode.is_active == True).all()
+        finally:
+            db.close()
+
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        synced_until = None
+        for code, created_at in rows:
+            bloom.add(code)
+            if created_at and (synced_until is None or created_at > synced_until):
+                synced_until = created_at
+
+        with self._lock:
+            self._bloom = bloom
+            self._synced_until = synced_until
+            self._negative.clear()
+
+    def add(self, code: str):
+        """Register a code created by this worker"""
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(code)
+            self._negative.pop(code, None)
+
+    def known_missing(self, code: str) -> bool:
+        """True when the database recently confirmed the code doesn't exist"""
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._negative.get(code)
+            if expires_at is None:
+                return False
+            if expires_at <= now:
+                del self._negative[code]
+                return False
+            self.negative_hits += 1
+            return True
+
+    def might_exist(self, code: str) -> bool:
+        """False only when the filter rules the code out"""
+        with self._lock:
+            return self._bloom is None or code in self._bloom
+
+    def reject(self, synced: bool) -> bool:
+        """Whether a filter miss can be answered without the database.
+
+        ``synced`` says a sync ran for this miss. Without one, a code another
+        worker created since the last sync may be missing from the filter,
+        so unless creates are broadcast the caller checks the database (the
+        negative cache absorbs repeated probes).
+        """
+        trusted = synced or self.creates_broadcast()
+        with self._lock:
+            if trusted:
+                self.rejected += 1
+            else:
+                self.unsynced_misses += 1
+        return trusted
+
+    def sync_due(self) -> bool:
+        """Claim the next incremental sync slot, at most once per interval"""
+        now = time.monotonic()
+        with self._lock:
+            if self._bloom is None or now < self._next_sync:
+                return False
+            self._next_sync = now + self.sync_interval
+            return True
+
+    def sync(self):
+        """Add codes created (on any worker) since the last sync"""
+        if self._bloom is None:
+            return
+        since = self._synced_until - self.SYNC_OVERLAP if self._synced_until else None
+        db = self.session_factory()
+        try:
+            query = db.query(QRCode.code, QRCode.created_at).filter(QRCode.is_active == True)
+            if since is not None:
+                query = query.filter(QRCode.created_at >= since)
+            rows = query.all()
+        finally:
+            db.close()
+
+        self._add_synced(rows)
+        if self._bloom is not None and self._bloom.count > self._bloom.capacity:
+            # Past capacity the false-positive rate climbs; size up
+            self.rebuild()
+
+    def record_missing(self, code: str):
+        """The database had no row for a code the filter let through or couldn't rule out"""
+        with self._lock:
+            if self._bloom is None or code in self._bloom:
+                self.false_positives += 1
+            self._remember_missing(code, time.monotonic())
+
+    def stats(self) -> dict:
+        with self._lock:
+            bloom = self._bloom
+            negatives = self.rejected + self.false_positives
+            return {
+                "ready": bloom is not None,
+                "codes": bloom.count if bloom else 0,
+                "capacity": bloom.capacity if bloom else 0,
+                "memory_bytes": bloom.memory_bytes if bloom else 0,
+                "hash_functions": bloom.num_hashes if bloom else 0,
+                "expected_false_positive_rate": bloom.expected_false_positive_rate if bloom else 0.0,
+                "observed_false_positive_rate": self.false_positives / negatives if negatives else 0.0,
+                "rejected": self.rejected,
+                "unsynced_misses": self.unsynced_misses,
+                "false_positives": self.false_positives,
+                "negative_cache_size": len(self._negative),
+                "negative_cache_hits": self.negative_hits,
+                "syncs": self.syncs
+            }
+
+    def _add_synced(self, rows: Iterable):
+        with self._lock:
+            if self._bloom is None:
+                return
+            for code, created_at in rows:
+                self._bloom.add(code)
+                self._negative.pop(code, None)
+                if created_at and (self._synced_until is None or created_at > self._synced_until):
+                    self._synced_until = created_at
+            self.syncs += 1
+
+    def _remember_missing(self, code: str, now: float):
+        if self.negative_cache_size <= 0:
+            return
+        self._negative[code] = now + self.negative_ttl
+        self._negative.move_to_end(code)
+        while len(self._negative) > self.negative_cache_size:
+            self._negative.popitem(last=False)
+
+code_filter = CodeFilter(
+    capacity=settings.CODE_FILTER_CAPACITY,
+    error_rate=settings.CODE_FILTER_ERROR_RATE,
+    negative_ttl=settings.NEGATIVE_CACHE_TTL_SECONDS,
+    negative_cache_size=settings.NEGATIVE_CACHE_SIZE
+)
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import ipaddress
+import os
+import threading
+from app.config import settings
+
+class GeoIPResolver:
+    """Client IP -> ISO country code from a MaxMind (GeoLite2/GeoIP2) MMDB.
+
+    The database is memory-mapped once per process. Answers are cached per
+    /24 (IPv4) or /48 (IPv6) prefix, which is finer than country-level
+    allocations in practice, so repeat visitors from the same network skip
+    the tree walk. Without a configured database every lookup returns None.
+    """
+
+    def __init__(self, db_path: str = "", cache_size: int = 65536):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._reader = None
+        self._opened = False
+        self._cache: "OrderedDict[Tuple[int, int], Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def open(self) -> bool:
+        """Map the database now rather than on the first lookup"""
+        return self._get_reader() is not None
+
+    def country(self, ip: str) -> Optional[str]:
+        """ISO 3166 alpha-2 code for an address, or None if unknown"""
+        reader = self._get_reader()
+        if reader is None:
+            return None
+        prefix = self._prefix(ip)
+        if prefix is None:
+            return None
+
+        with self._lock:
+            if prefix in self._cache:
+                self._cache.move_to_end(prefix)
+                self.hits += 1
+                return self._cache[prefix]
+            self.misses += 1
+
+        try:
+            record = reader.get(ip)
+        except ValueError:
+            # e.g. an IPv6 address against an IPv4-only database
+            record = None
+        country = self._country_code(record)
+
+        if self.cache_size > 0:
+            with self._lock:
+                self._cache[prefix] = country
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return country
+
+    def close(self):
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+            self._reader = None
+            self._opened = False
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self._reader is not None,
+                "cache_size": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "errors": self.errors
+            }
+
+    def _get_reader(self):
+        if not self._opened:
+            with self._lock:
+                if not self._opened:
+                    self._reader = self._open()
+                    self._opened = True
+        return self._reader
+
+    def _open(self):
+        if not self.db_path or not os.path.exists(self.db_path):
+            return None
+        try:
+            import maxminddb
+            return maxminddb.open_database(self.db_path, maxminddb.MODE_MMAP)
+        except Exception as e:
+            self.errors += 1
+            print(f"Error opening GeoIP database {self.db_path}: {e}")
+            return None
+
+    def _prefix(self, ip: str) -> Optional[Tuple[int, int]]:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        # /24 for IPv4, /48 for IPv6
+        if address.version == 4:
+            return 4, int(address) >> 8
+        return 6, int(address) >> 80
+
+    def _country_code(self, record) -> Optional[str]:
+        if not isinstance(record, dict):
+            return None
+        for field in ("country", "registered_country"):
+            iso_code = (record.get(field) or {}).get("iso_code")
+            if iso_code:
+                return iso_code
+        return None
+
+geoip = GeoIPResolver(settings.GEOIP_DATABASE_PATH, settings.GEOIP_CACHE_SIZE)
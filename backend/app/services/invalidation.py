@@ -0,0 +1,237 @@
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from app.config import settings
+from app.schemas import InvalidationEvent
+from app.services.code_filter import code_filter
+from app.services.redirect_cache import redirect_cache
+from app.services.redirect_snapshot import redirect_snapshot
+
+# Event kinds
+QR_CHANGED = "qr"  # key: QR code (create, update, retarget, delete)
+
+class Subscription(ABC):
+    @abstractmethod
+    def get(self, timeout: float) -> Optional[bytes]:
+        """Next message, or None if nothing arrived within ``timeout``"""
+
+    def close(self):
+        pass
+
+class LoopbackTransport:
+    """In-process transport: every subscription sees every message"""
+
+    shared = False  # Other processes never see these messages
+
+    def __init__(self):
+        self._queues: List["queue.Queue[bytes]"] = []
+        self._lock = threading.Lock()
+
+    def publish(self, payload: bytes):
+        with self._lock:
+            queues = list(self._queues)
+        for q in queues:
+            q.put(payload)
+
+    def subscribe(self) -> Subscription:
+        subscription = LoopbackSubscription(self)
+        with self._lock:
+            self._queues.append(subscription.queue)
+        return subscription
+
+class LoopbackSubscription(Subscription):
+    def __init__(self, transport: LoopbackTransport):
+        self.transport = transport
+        self.queue: "queue.Queue[bytes]" = queue.Queue()
+
+    def get(self, timeout: float) -> Optional[bytes]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self.transport._lock:
+            if self.queue in self.transport._queues:
+                self.transport._queues.remove(self.queue)
+
+class RedisTransport:
+    """Redis pub/sub transport shared by every node"""
+
+    shared = True
+
+    def __init__(self, client, channel: str = "qr-invalidation"):
+        self.client = client
+        self.channel = channel
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisTransport":
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def publish(self, payload: bytes):
+        self.client.publish(self.channel, payload)
+
+    def subscribe(self) -> Subscription:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        return RedisSubscription(pubsub)
+
+class RedisSubscription(Subscription):
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    def get(self, timeout: float) -> Optional[bytes]:
+        message = self.pubsub.get_message(timeout=timeout)
+        return message["data"] if message else None
+
+    def close(self):
+        self.pubsub.close()
+
+class InvalidationBus:
+    """Fans committed changes out to the caches of every node.
+
+    ``publish`` runs the local handlers straight away, then broadcasts the
+    event; the subscriber thread on every other node runs the same handlers
+    when it arrives. Events a node published itself are skipped on receipt.
+    Pub/sub is fire-and-forget, so events sent while a node is reconnecting
+    are lost; the redirect cache TTL still bounds how long that node serves
+    stale entries, and ``on_connect`` handlers run after every (re)subscribe
+    to catch up on state that can't wait for it.
+    """
+
+    def __init__(self, transport, node_id: Optional[str] = None):
+        self.transport = transport
+        self.node_id = node_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, List[Callable[[str], None]]] = defaultdict(list)
+        self._connect_handlers: List[Callable[[], None]] = []
+        self._connected = False
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+        self.published = 0
+        self.received = 0
+        self.publish_errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def delivering(self) -> bool:
+        """True while every other node's events reach this one"""
+        return self.running and self._connected and getattr(self.transport, "shared", False)
+
+    def register(self, kind: str, handler: Callable[[str], None]):
+        self._handlers[kind].append(handler)
+
+    def on_connect(self, handler: Callable[[], None]):
+        self._connect_handlers.append(handler)
+
+    def start(self):
+        """Start the subscriber thread; returns once it is subscribed"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name="invalidation-bus", daemon=True)
+        self._thread.start()
+        self._ready.wait(2.0)
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def publish(self, kind: str, key: str):
+        """Invalidate locally, then tell the other nodes"""
+        self._dispatch(kind, key)
+        event = InvalidationEvent(node=self.node_id, kind=kind, key=key)
+        try:
+            self.transport.publish(event.model_dump_json().encode())
+            self.published += 1
+        except Exception as e:
+            # The change is committed; other nodes fall back to their cache TTLs
+            self.publish_errors += 1
+            print(f"Error publishing invalidation for {kind} {key}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "node_id": self.node_id,
+            "published": self.published,
+            "received": self.received,
+            "publish_errors": self.publish_errors
+        }
+
+    def _dispatch(self, kind: str, key: str):
+        for handler in self._handlers.get(kind, []):
+            try:
+                handler(key)
+            except Exception as e:
+                print(f"Error handling invalidation for {kind} {key}: {e}")
+
+    def _run(self):
+        subscription = None
+        while not self._stop_event.is_set():
+            try:
+                if subscription is None:
+                    subscription = self.transport.subscribe()
+                    for handler in self._connect_handlers:
+                        handler()
+                    self._connected = True
+                    self._ready.set()
+                payload = subscription.get(timeout=0.1)
+            except Exception as e:
+                print(f"Invalidation subscriber error, reconnecting: {e}")
+                self._connected = False
+                if subscription is not None:
+                    subscription.close()
+                subscription = None
+                time.sleep(1.0)
+                continue
+
+            if payload is None:
+                continue
+            try:
+                event = InvalidationEvent.model_validate_json(payload)
+            except ValueError:
+                continue
+            if event.node == self.node_id:
+                continue
+            self.received += 1
+            self._dispatch(event.kind, event.key)
+
+        self._connected = False
+        if subscription is not None:
+            subscription.close()
+
+def create_transport():
+    """Build the transport selected by INVALIDATION_TRANSPORT"""
+    if settings.INVALIDATION_TRANSPORT == "redis":
+        return RedisTransport.from_url(settings.REDIS_URL, channel=settings.INVALIDATION_CHANNEL)
+    if settings.INVALIDATION_TRANSPORT == "loopback":
+        return LoopbackTransport()
+    raise ValueError(f"Unknown INVALIDATION_TRANSPORT: {settings.INVALIDATION_TRANSPORT}")
+
+def _qr_changed(code: str):
+    redirect_cache.invalidate(code)
+    # Another host's change never reaches this host's snapshot delta log
+    redirect_snapshot.evict(code)
+    # Lets other nodes redirect a freshly created code without waiting for a sync
+    code_filter.add(code)
+
+invalidation_bus = InvalidationBus(create_transport())
+invalidation_bus.register(QR_CHANGED, _qr_changed)
+# Codes created while the subscriber was away never reach the filter as
+# events; until a sync has picked them up, its misses go to the database
+invalidation_bus.on_connect(code_filter.sync)
+code_filter.creates_broadcast = lambda: invalidation_bus.delivering
@@ -0,0 +1,266 @@
+from datetime import datetime, timedelta
+from typing import IO, Optional
+import os
+import shutil
+import threading
+import uuid
+from sqlalchemy import and_, func, or_, update
+from app.config import settings
+from app.models import SessionLocal, BulkJob
+from app.repo import QRCodeRepository
+from app.schemas import JobStatus
+from app.services.bulk import BulkService
+from app.services.qrcode import QRCodeService
+
+class BulkJobQueue:
+    """Persisted queue of bulk CSV imports.
+
+    The ``bulk_jobs`` table is the queue. The API stores the upload, inserts
+    a queued row and returns; a worker claims the oldest queued job with a
+    compare-and-swap on its status, so two workers never run the same job,
+    and writes progress counts back after every chunk. Workers are either a
+    thread in the API process (``BULK_JOB_RUNNER=local``, no broker needed)
+    or ``python -m app.worker`` processes sharing the database, the job
+    directory and the upload directory.
+
+    Jobs are checkpointed chunk by chunk (see ``BulkService``). A job that
+    fails is queued again until it has run ``max_attempts`` times, and a
+    running job whose heartbeat is older than ``stale_after`` seconds (its
+    worker died) can be claimed by another worker; either way the next run
+    resumes after the last committed chunk. A stale job that already ran
+    ``max_attempts`` times is failed instead of taken over again.
+    """
+
+    def __init__(self, session_factory=SessionLocal, poll_interval: float = 1.0,
+                 max_attempts: int = 3, stale_after: float = 600.0):
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.stale_after = stale_after
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+
+        self.enqueued = 0
+        self.completed = 0
+        self.retried = 0
+        self.resumed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the worker thread"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="bulk-jobs", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Stop taking jobs; a job already running finishes first"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def enqueue(self, source: IO[bytes], filename: str, user_id: Optional[str] = None) -> BulkJob:
+        """Store the upload next to the other job files and queue a job for it"""
+        job_id = str(uuid.uuid4())
+        os.makedirs(settings.BULK_JOB_DIR, exist_ok=True)
+        input_path = os.path.join(settings.BULK_JOB_DIR, f"{job_id}.csv")
+        with open(input_path, "wb") as f:
+            shutil.copyfileobj(source, f)
+
+        db = self.session_factory()
+        try:
+            job = BulkJob(id=job_id, user_id=user_id, status="queued", filename=filename, input_path=input_path)
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+        finally:
+            db.close()
+
+        with self._stats_lock:
+            self.enqueued += 1
+        self._wake.set()
+        return job
+
+    def get(self, job_id: str) -> Optional[BulkJob]:
+        db = self.session_factory()
+        try:
+            job = db.get(BulkJob, job_id)
+            if job is not None:
+                db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    def status(self, job: BulkJob) -> JobStatus:
+        result_url = None
+        if job.result_path:
+            result_url = f"{settings.BASE_URL}/uploads/{os.path.basename(job.result_path)}"
+        return JobStatus(
+            id=job.id,
+            status=job.status,
+            result_url=result_url,
+            error=job.error,
+            total=job.total,
+            processed=job.processed or 0,
+            succeeded=job.succeeded or 0,
+            failed=job.failed or 0
+        )
+
+    def claim(self) -> Optional[str]:
+        """Mark the oldest queued (or stale running) job as running and return its id (None when idle)"""
+        db = self.session_factory()
+        try:
+            while True:
+                stale = datetime.utcnow() - timedelta(seconds=self.stale_after)
+                job = (
+                    db.query(BulkJob.id, BulkJob.status, BulkJob.heartbeat_at, BulkJob.attempts)
+                    .filter(or_(
+                        BulkJob.status == "queued",
+                        and_(BulkJob.status == "running", BulkJob.heartbeat_at < stale)
+                    ))
+                    .order_by(BulkJob.created_at)
+                    .limit(1)
+                    .first()
+                )
+                if job is None:
+                    return None
+                swap = [BulkJob.id == job.id, BulkJob.status == job.status]
+                if job.status == "running":
+                    # The heartbeat is part of the swap, so a stale job is taken over once
+                    swap.append(BulkJob.heartbeat_at == job.heartbeat_at)
+                now = datetime.utcnow()
+                if job.status == "running" and (job.attempts or 0) >= self.max_attempts:
+                    # Its worker keeps dying on it; give up instead of taking it over again
+                    result = db.execute(
+                        update(BulkJob)
+                        .where(*swap)
+                        .values(
+                            status="failed",
+                            error=f"Worker stopped responding {job.attempts} times",
+                            finished_at=now
+                        )
+                    )
+                    db.commit()
+                    if result.rowcount == 1:
+                        print(f"Failing bulk job {job.id}: its worker stopped responding {job.attempts} times")
+                        with self._stats_lock:
+                            self.failed += 1
+                    continue
+                result = db.execute(
+                    update(BulkJob)
+                    .where(*swap)
+                    .values(
+                        status="running",
+                        started_at=func.coalesce(BulkJob.started_at, now),
+                        heartbeat_at=now,
+                        attempts=func.coalesce(BulkJob.attempts, 0) + 1
+                    )
+                )
+                db.commit()
+                if result.rowcount == 1:
+                    if job.status == "running":
+                        print(f"Resuming bulk job {job.id}: its worker stopped responding")
+                        with self._stats_lock:
+                            self.resumed += 1
+                    return job.id
+                # Another worker claimed it first; look again
+        finally:
+            db.close()
+
+    def run(self, job_id: str):
+        """Execute a claimed job and record how it ended"""
+        db = self.session_factory()
+        try:
+            job = db.get(BulkJob, job_id)
+            bulk_service = BulkService(QRCodeRepository(db), QRCodeService())
+            # The upload is streamed from disk, never read whole
+            with open(job.input_path, "r", encoding="utf-8", newline="") as f:
+                result = bulk_service.process_bulk_csv(
+                    f,
+                    progress=lambda counts: self._update(job_id, heartbeat_at=datetime.utcnow(), **counts),
+                    job_id=job_id
+                )
+            self._update(
+                job_id,
+                status="done",
+                result_path=result["zip_path"],
+                processed=result["total_processed"],
+                succeeded=result["successful"],
+                failed=result["failed"],
+                finished_at=datetime.utcnow()
+            )
+            bulk_service.discard_checkpoints(job_id)
+            os.remove(job.input_path)
+            with self._stats_lock:
+                self.completed += 1
+        except Exception as e:
+            print(f"Error running bulk job {job_id}: {e}")
+            db.rollback()
+            attempts = db.query(BulkJob.attempts).filter(BulkJob.id == job_id).scalar() or 0
+            if attempts < self.max_attempts:
+                # Checkpoints are kept, so the next run resumes where this one stopped
+                self._update(job_id, status="queued", error=str(e))
+                with self._stats_lock:
+                    self.retried += 1
+            else:
+                self._update(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+                with self._stats_lock:
+                    self.failed += 1
+        finally:
+            db.close()
+
+    def run_pending(self) -> int:
+        """Run queued jobs until none are left (or the worker is stopping)"""
+        count = 0
+        while not self._stop_event.is_set():
+            job_id = self.claim()
+            if job_id is None:
+                break
+            self.run(job_id)
+            count += 1
+        return count
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "running": self.running,
+                "enqueued": self.enqueued,
+                "completed": self.completed,
+                "retried": self.retried,
+                "resumed": self.resumed,
+                "failed": self.failed
+            }
+
+    def _update(self, job_id: str, **values):
+        db = self.session_factory()
+        try:
+            db.execute(update(BulkJob).where(BulkJob.id == job_id).values(**values))
+            db.commit()
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake.clear()
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"Error polling bulk jobs: {e}")
+            # Poll for jobs queued by other processes; enqueue() here wakes us at once
+            self._wake.wait(self.poll_interval)
+
+bulk_jobs = BulkJobQueue(
+    poll_interval=settings.BULK_JOB_POLL_SECONDS,
+    max_attempts=settings.BULK_JOB_MAX_ATTEMPTS,
+    stale_after=settings.BULK_JOB_STALE_SECONDS
+)
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from typing import Tuple
+import threading
+import qrcode
+from app.config import settings
+
+Matrix = Tuple[Tuple[bool, ...], ...]
+
+def encode_matrix(content: str, error_correction: int, border: int) -> Matrix:
+    """Encode content once and return its module matrix, border included"""
+    qr = qrcode.QRCode(version=1, error_correction=error_correction, border=border)
+    qr.add_data(content)
+    qr.make(fit=True)
+    return tuple(tuple(row) for row in qr.get_matrix())
+
+class MatrixCache:
+    """Bounded LRU of module matrices keyed on what was encoded.
+
+    Every format of an artifact, and every design of the same content, is
+    drawn from the same matrix, so the Reed-Solomon and mask-selection work
+    runs once per content rather than once per file. Matrices are immutable
+    tuples and safe to share between threads.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, Matrix]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, content: str, error_correction: int, border: int) -> Matrix:
+        key = (content, error_correction, border)
+        with self._lock:
+            matrix = self._entries.get(key)
+            if matrix is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return matrix
+            self.misses += 1
+
+        # Encode outside the lock; a racing duplicate encode is harmless
+        matrix = encode_matrix(content, error_correction, border)
+        if self.max_size > 0:
+            with self._lock:
+                self._entries[key] = matrix
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return matrix
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+matrix_cache = MatrixCache(max_size=settings.QR_MATRIX_CACHE_SIZE)
@@ -5,93 +5,135 @@ from PIL import Image, ImageDraw
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.units import inch
-from reportlab.lib.utils import ImageReader
-import io
-import base64
-from typing import Dict, List
+import glob
+import hashlib
+import json
+import threading
+from typing import Dict, List, Tuple
 from app.config import settings
+from app.services.matrix import Matrix, matrix_cache
+from app.services.raster import rasterize, to_rgba
+from app.services.svg import module_runs, write_svg
 import os
 
+# Bump when the renderers change output, so cached artifacts are re-rendered
+RENDER_VERSION = 3
+ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_L
+RENDERERS = {"png": "_render_png", "svg": "_render_svg", "pdf": "_render_pdf"}
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml", "pdf": "application/pdf"}
+
 class QRCodeService:
     def __init__(self):
         self.base_url = settings.BASE_URL
         self.upload_dir = settings.UPLOAD_DIR
     
     def generate_qr_images(self, qr_code_obj, formats: List[str] = ["png"]) -> Dict[str, str]:
-        """Generate QR code images in specified formats"""
+        """Generate QR code images in specified formats.
+
+        Artifacts are content-addressed: the file name carries a hash of
+        everything that affects the rendered output, so an artifact that
+        already exists is returned as-is without encoding or writing
+        anything. Rendering a new one removes the code's older artifacts of
+        that format. All formats are drawn from one module matrix, which
+        is encoded once per content and cached.
+        """
         download_urls = {}
         
-        # Determine the content to encode
-        if qr_code_obj.type == "static":
-            qr_content = qr_code_obj.content
-        else:  # dynamic
-            qr_content = f"{self.base_url}/r/{qr_code_obj.code}"
-        
-        # Create QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=settings.QR_CODE_SIZE,
-            border=settings.QR_CODE_BORDER,
-        )
-        qr.add_data(qr_content)
-        qr.make(fit=True)
-        
-        # Apply design customizations
-        design = qr_code_obj.design or {}
-        fill_color = design.get("color", "black")
-        back_color = design.get("bgColor", "white")
-        
         for format_type in formats:
-            if format_type == "png":
-                img = qr.make_image(fill_color=fill_color, back_color=back_color)
-                
-                # Add logo if specified
-                logo_url = design.get("logoUrl")
-                if logo_url:
-                    img = self._add_logo_to_qr(img, logo_url)
-                
-                # Save PNG
-                filename = f"{qr_code_obj.code}.png"
-                filepath = os.path.join(self.upload_dir, filename)
-                img.save(filepath)
-                download_urls["png"] = f"{self.base_url}/uploads/{filename}"
-            
-            elif format_type == "svg":
-                # Generate SVG
-                from qrcode.image.svg import SvgPathImage
-                img = qr.make_image(image_factory=SvgPathImage)
-                
-                filename = f"{qr_code_obj.code}.svg"
-                filepath = os.path.join(self.upload_dir, filename)
-                with open(filepath, 'wb') as f:
-                    img.save(f)
-                download_urls["svg"] = f"{self.base_url}/uploads/{filename}"
-            
-            elif format_type == "pdf":
-                # Generate PDF
-                img = qr.make_image(fill_color=fill_color, back_color=back_color)
-                
-                # Add logo if specified
-                logo_url = design.get("logoUrl")
-                if logo_url:
-                    img = self._add_logo_to_qr(img, logo_url)
-                
-                # Save as PDF
-                filename = f"{qr_code_obj.code}.pdf"
-                filepath = os.path.join(self.upload_dir, filename)
-                self._create_pdf_with_qr(img, filepath, qr_code_obj)
-                download_urls["pdf"] = f"{self.base_url}/uploads/{filename}"
+            if format_type not in RENDERERS:
+                continue
+            filename, _ = self.ensure_artifact(qr_code_obj, format_type)
+            download_urls[format_type] = f"{self.base_url}/uploads/{filename}"
         
         return download_urls
     
-    def _create_pdf_with_qr(self, qr_img, filepath: str, qr_code_obj):
-        """Create a PDF document with QR code and additional information"""
-        # Create a BytesIO buffer for the QR image
-        img_buffer = io.BytesIO()
-        qr_img.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
+    def image_urls(self, qr_code_obj, formats: List[str] = ["png", "svg"]) -> Dict[str, str]:
+        """URLs of the on-demand image endpoint; nothing is rendered here.
+        The ``v`` parameter changes with the artifact, so each URL is immutable."""
+        return {
+            format_type: f"{self.base_url}/api/qr/{qr_code_obj.id}/image.{format_type}?v={self.render_key(qr_code_obj, format_type)[:16]}"
+            for format_type in formats if format_type in RENDERERS
+        }
+    
+    def ensure_artifact(self, qr_code_obj, format_type: str) -> Tuple[str, str]:
+        """Render an artifact unless it is already cached; returns its file
+        name (under ``upload_dir``) and render key"""
+        key = self.render_key(qr_code_obj, format_type)
+        filename = f"{qr_code_obj.code}-{key[:16]}.{format_type}"
+        filepath = os.path.join(self.upload_dir, filename)
+        
+        if not os.path.exists(filepath):
+            matrix = self._encode(self.get_qr_content(qr_code_obj))
+            # Write under a temporary name so a half-written file is never served or reused
+            tmp_path = f"{filepath}.tmp.{os.getpid()}.{threading.get_ident()}"
+            try:
+                getattr(self, RENDERERS[format_type])(matrix, qr_code_obj.design or {}, tmp_path, qr_code_obj)
+                os.replace(tmp_path, filepath)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self._remove_stale_artifacts(qr_code_obj.code, format_type, keep=filename)
+        
+        return filename, key
+    
+    def _encode(self, qr_content: str) -> Matrix:
+        """Module matrix for the content, border included"""
+        return matrix_cache.get(qr_content, ERROR_CORRECTION, settings.QR_CODE_BORDER)
+    
+    def _render_png(self, matrix: Matrix, design: dict, filepath: str, qr_code_obj):
+        img = self._rasterize(matrix, design)
+        
+        # Add logo if specified
+        logo_url = design.get("logoUrl")
+        if logo_url:
+            img = self._add_logo_to_qr(img, logo_url)
         
+        img.save(filepath, format="PNG")
+    
+    def _rasterize(self, matrix: Matrix, design: dict):
+        """Module matrix -> PIL image with the design colours (same pixels as qr.make_image)"""
+        return rasterize(matrix, settings.QR_CODE_SIZE, design.get("color", "black"), design.get("bgColor", "white"))
+    
+    def _render_svg(self, matrix: Matrix, design: dict, filepath: str, qr_code_obj):
+        with open(filepath, 'w', encoding='utf-8', newline='\n') as f:
+            write_svg(matrix, settings.QR_CODE_SIZE, f, design.get("color", "black"), design.get("bgColor", "white"))
+    
+    def _render_pdf(self, matrix: Matrix, design: dict, filepath: str, qr_code_obj):
+        # Modules are drawn as vector rectangles, so no raster is made or
+        # re-encoded here (logos are not composited yet, see _add_logo_to_qr)
+        self._create_pdf_with_qr(matrix, design, filepath, qr_code_obj)
+    
+    def render_key(self, qr_code_obj, format_type: str) -> str:
+        """Hash of every input that changes the rendered artifact"""
+        parts = {
+            "version": RENDER_VERSION,
+            "format": format_type,
+            "content": self.get_qr_content(qr_code_obj),
+            "ecc": ERROR_CORRECTION,
+            "box_size": settings.QR_CODE_SIZE,
+            "border": settings.QR_CODE_BORDER,
+            "design": qr_code_obj.design or {},
+        }
+        if format_type == "pdf":
+            # The PDF page also prints these
+            parts["page"] = [qr_code_obj.name, qr_code_obj.folder, qr_code_obj.type, qr_code_obj.code, qr_code_obj.content]
+        payload = json.dumps(parts, sort_keys=True, default=str).encode()
+        return hashlib.sha256(payload).hexdigest()
+    
+    def _remove_stale_artifacts(self, code: str, format_type: str, keep: str):
+        """Delete earlier renders of a code in one format (and the legacy ``<code>.<fmt>``)"""
+        stale = glob.glob(os.path.join(glob.escape(self.upload_dir), f"{glob.escape(code)}-*.{format_type}"))
+        stale.append(os.path.join(self.upload_dir, f"{code}.{format_type}"))
+        for path in stale:
+            if os.path.basename(path) == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    def _create_pdf_with_qr(self, matrix: Matrix, design: dict, filepath: str, qr_code_obj):
+        """Create a PDF document with QR code and additional information"""
         # Create PDF
         c = canvas.Canvas(filepath, pagesize=A4)
         width, height = A4
@@ -110,7 +152,7 @@ class QRCodeService:
         qr_x = (width - qr_size) / 2
         qr_y = height - 350
         
-        c.drawImage(ImageReader(img_buffer), qr_x, qr_y, qr_size, qr_size)
+        self._draw_modules(c, matrix, design, qr_x, qr_y, qr_size)
         
         # Add QR code information below
         info_y = qr_y - 50
@@ -136,6 +178,28 @@ class QRCodeService:
         
         c.save()
     
+    def _draw_modules(self, c: canvas.Canvas, matrix: Matrix, design: dict, x: float, y: float, size: float):
+        """Draw the matrix as filled rectangles, one per horizontal run of dark modules"""
+        module = size / len(matrix)
+        back = design.get("bgColor", "white")
+        if not (isinstance(back, str) and back.lower() == "transparent"):
+            self._set_fill(c, back)
+            c.rect(x, y, size, size, stroke=0, fill=1)
+        
+        self._set_fill(c, design.get("color", "black"))
+        path = c.beginPath()
+        for column, row, length in module_runs(matrix):
+            # PDF y grows upwards
+            path.rect(x + column * module, y + size - (row + 1) * module, length * module, module)
+        c.drawPath(path, stroke=0, fill=1)
+        c.setFillColorRGB(0, 0, 0)
+        c.setFillAlpha(1)
+    
+    def _set_fill(self, c: canvas.Canvas, color):
+        red, green, blue, alpha = to_rgba(color)
+        c.setFillColorRGB(red / 255, green / 255, blue / 255)
+        c.setFillAlpha(alpha / 255)
+    
     def _add_logo_to_qr(self, qr_img, logo_url: str):
         """Add logo to center of QR code (simplified implementation)"""
         try:
@@ -0,0 +1,40 @@
+from typing import Sequence, Union
+import numpy as np
+from PIL import Image, ImageColor
+
+Color = Union[str, Sequence[int]]
+
+def to_rgba(color: Color) -> tuple:
+    """Colour name, hex string or RGB(A) sequence -> RGBA tuple"""
+    if isinstance(color, str):
+        return ImageColor.getcolor(color, "RGBA")
+    color = tuple(color)
+    return color + (255,) if len(color) == 3 else color
+
+def rasterize(matrix: Sequence[Sequence[bool]], box_size: int, fill_color: Color = "black", back_color: Color = "white") -> Image.Image:
+    """Scale a module matrix (``QRCode.get_matrix()``, border included) to
+    pixels in one NumPy pass.
+
+    Gives the same pixels as ``qr.make_image`` with square modules. Black
+    on white is a 1-bit image, as there. Any other colours become a
+    two-entry palette image rather than RGB(A): the decoded pixels are the
+    same, but the PNG is 1 bit per pixel and much quicker to encode.
+    """
+    modules = np.asarray(matrix, dtype=bool)
+    pixels = np.repeat(np.repeat(modules, box_size, axis=0), box_size, axis=1)
+
+    fill = fill_color.lower() if isinstance(fill_color, str) else fill_color
+    back = back_color.lower() if isinstance(back_color, str) else back_color
+    if fill == "black" and back == "white":
+        # Mode "1": set bits are white
+        return Image.fromarray(~pixels)
+
+    back_value = (0, 0, 0, 0) if back == "transparent" else to_rgba(back)
+    fill_value = to_rgba(fill)
+    height, width = pixels.shape
+    img = Image.frombytes("P", (width, height), pixels.view(np.uint8).tobytes())
+    img.putpalette(bytes(back_value[:3] + fill_value[:3]))
+    if back == "transparent":
+        # Decodes to RGBA, as qrcode's transparent-background images are
+        img.info["transparency"] = bytes([0, fill_value[3]])
+    return img
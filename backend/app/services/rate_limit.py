@@ -0,0 +1,129 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Dict
+import threading
+import time
+import uuid
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+
+class RateLimiter(ABC):
+    """Sliding-window limit on password attempts per (IP hash, QR code).
+
+    ``hit`` records an attempt and returns True while the key has made fewer
+    than ``max_attempts`` attempts in the last ``window_seconds``; once the
+    limit is reached further attempts are refused and not counted, so the
+    key is let through again as soon as its oldest attempt leaves the window.
+    """
+
+    def __init__(self, max_attempts: int = 5, window_seconds: float = 60.0):
+        self.max_attempts = max_attempts
+        self.window_seconds = window_seconds
+
+    @abstractmethod
+    def hit(self, ip_hash: str, qr_code: str) -> bool:
+        """Record an attempt; False once the key is over the limit"""
+
+    async def ahit(self, ip_hash: str, qr_code: str) -> bool:
+        """``hit`` for async callers"""
+        return self.hit(ip_hash, qr_code)
+
+    @abstractmethod
+    def reset(self):
+        """Forget every recorded attempt"""
+
+    def _key(self, ip_hash: str, qr_code: str) -> str:
+        return f"{ip_hash}:{qr_code}"
+
+class InMemoryRateLimiter(RateLimiter):
+    """Per-process limiter; attempts are only counted within one worker"""
+
+    def __init__(self, max_attempts: int = 5, window_seconds: float = 60.0, max_keys: int = 100000):
+        super().__init__(max_attempts, window_seconds)
+        self.max_keys = max_keys
+        self._attempts: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, ip_hash: str, qr_code: str) -> bool:
+        now = time.monotonic()
+        window_start = now - self.window_seconds
+        key = self._key(ip_hash, qr_code)
+
+        with self._lock:
+            attempts = self._attempts.get(key)
+            if attempts is None:
+                if len(self._attempts) >= self.max_keys:
+                    self._prune(window_start)
+                attempts = self._attempts[key] = deque()
+
+            while attempts and attempts[0] <= window_start:
+                attempts.popleft()
+
+            if len(attempts) >= self.max_attempts:
+                return False
+            attempts.append(now)
+            return True
+
+    def reset(self):
+        with self._lock:
+            self._attempts.clear()
+
+    def _prune(self, window_start: float):
+        # Drop keys whose attempts have all left the window
+        for key in [key for key, attempts in self._attempts.items() if attempts[-1] <= window_start]:
+            del self._attempts[key]
+
+class RedisRateLimiter(RateLimiter):
+    """Limiter shared by every worker through a Redis sorted set per key"""
+
+    def __init__(self, client, max_attempts: int = 5, window_seconds: float = 60.0, prefix: str = "ratelimit:"):
+        super().__init__(max_attempts, window_seconds)
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisRateLimiter":
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def hit(self, ip_hash: str, qr_code: str) -> bool:
+        now = time.time()
+        key = self.prefix + self._key(ip_hash, qr_code)
+        member = f"{now}:{uuid.uuid4().hex}"
+
+        # Optimistically record the attempt; MULTI/EXEC keeps the trim, add
+        # and count consistent across workers
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zremrangebyscore(key, 0, now - self.window_seconds)
+        pipe.zadd(key, {member: now})
+        pipe.zcard(key)
+        pipe.pexpire(key, int(self.window_seconds * 1000) + 1000)
+        _, _, count, _ = pipe.execute()
+
+        if count > self.max_attempts:
+            # Refused attempts don't count towards the window
+            self.client.zrem(key, member)
+            return False
+        return True
+
+    async def ahit(self, ip_hash: str, qr_code: str) -> bool:
+        return await run_in_threadpool(self.hit, ip_hash, qr_code)
+
+    def reset(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+def create_rate_limiter() -> RateLimiter:
+    """Build the limiter selected by RATE_LIMIT_BACKEND"""
+    options = {
+        "max_attempts": settings.RATE_LIMIT_ATTEMPTS,
+        "window_seconds": settings.RATE_LIMIT_WINDOW_MINUTES * 60
+    }
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimiter.from_url(settings.REDIS_URL, **options)
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return InMemoryRateLimiter(**options)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {settings.RATE_LIMIT_BACKEND}")
+
+rate_limiter = create_rate_limiter()
@@ -1,10 +1,22 @@
 from fastapi import HTTPException, Request
 from fastapi.responses import RedirectResponse
-from app.repo import QRCodeRepository
-from app.schemas import ScanEvent
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.repo import QRCodeRepository, AsyncQRCodeRepository, verify_qr_password
+from app.schemas import ScanEvent, RedirectRecord
+from app.services.bots import bot_classifier
+from app.services.code_filter import code_filter
+from app.services.geoip import geoip
+from app.services.rate_limit import rate_limiter
+from app.services.redirect_cache import redirect_cache
+from app.services.redirect_snapshot import redirect_snapshot
+from app.services.scan_sink import scan_sink
+from app.services.unlock import UNLOCK_COOKIE, unlock_tokens
+from app.services.useragent import apply_user_agent
+from app.services.variants import pick_variant
 from datetime import datetime
+from typing import Optional
 import hashlib
-import user_agents
 
 class RedirectService:
     def __init__(self, repo: QRCodeRepository):
@@ -13,45 +25,133 @@ class RedirectService:
     def handle_redirect(self, code: str, request: Request, password: str = None) -> RedirectResponse:
         """Handle QR code redirect with password and expiry checks"""
         
-        # Get QR code
-        qr = self.repo.get_qr_by_code(code)
-        if not qr or not qr.is_active:
-            raise HTTPException(status_code=404, detail="QR code not found")
-        
-        # Check expiry
-        if qr.expiry_at and qr.expiry_at < datetime.utcnow():
-            raise HTTPException(status_code=410, detail="QR code has expired")
+        # Get QR code (cached record first, database on miss)
+        qr = self._get_record(code)
+        self._check_available(qr)
         
         # Get client IP
         client_ip = self._get_client_ip(request)
         ip_hash = self._hash_ip(client_ip)
         
-        # Check password if required
-        if qr.password_hash:
-            if not password:
-                raise HTTPException(status_code=401, detail="Password required")
-            
+        # Check password if required (a valid unlock cookie skips the check)
+        unlocked = False
+        if not self._has_unlock_token(qr, request) and self._requires_password(qr, password):
             # Check rate limit for wrong password attempts
-            if not self.repo.check_rate_limit(ip_hash, code):
+            if not rate_limiter.hit(ip_hash, code):
                 raise HTTPException(status_code=429, detail="Too many failed attempts")
             
-            if not self.repo.verify_password(password, qr.password_hash):
-                raise HTTPException(status_code=401, detail="Invalid password")
+            self._verify_password(qr, password)
+            unlocked = True
+        
+        variant = self._choose_variant(qr, ip_hash)
+        target_url = self._get_target_url(qr, variant)
         
-        # Determine target URL
+        # Record scan analytics
+        self._record_scan(qr.id, request, client_ip, ip_hash, self._variant_name(qr, variant))
+        
+        # Redirect to target
+        response = RedirectResponse(url=target_url, status_code=302)
+        if unlocked:
+            self._set_unlock_cookie(response, qr)
+        return response
+    
+    def _get_record(self, code: str) -> Optional[RedirectRecord]:
+        """Resolve a code through the redirect cache and snapshot, skipping
+        the database for codes the code filter rules out"""
+        record = self._get_local_record(code)
+        if record is None:
+            if not self._might_exist(code):
+                return None
+            record = self.repo.get_redirect_record(code)
+            self._remember(code, record)
+        return record
+    
+    def _get_local_record(self, code: str) -> Optional[RedirectRecord]:
+        """Look a code up without leaving the process"""
+        record = redirect_cache.get(code)
+        if record is None and redirect_snapshot.running:
+            record = redirect_snapshot.get(code)
+            if record:
+                redirect_cache.set(code, record)
+        return record
+    
+    def _might_exist(self, code: str) -> bool:
+        if code_filter.known_missing(code):
+            return False
+        if code_filter.might_exist(code):
+            return True
+        # The code may have been created on another worker since the last sync
+        synced = code_filter.sync_due()
+        if synced:
+            code_filter.sync()
+            if code_filter.might_exist(code):
+                return True
+        return not code_filter.reject(synced)
+    
+    def _remember(self, code: str, record: Optional[RedirectRecord]):
+        if record:
+            redirect_cache.set(code, record)
+        else:
+            code_filter.record_missing(code)
+    
+    def _check_available(self, qr: Optional[RedirectRecord]):
+        """Reject unknown, deleted and expired codes"""
+        if not qr or not qr.is_active:
+            raise HTTPException(status_code=404, detail="QR code not found")
+        
+        # Check expiry
+        if qr.expiry_at and qr.expiry_at < datetime.utcnow():
+            raise HTTPException(status_code=410, detail="QR code has expired")
+    
+    def _requires_password(self, qr: RedirectRecord, password: Optional[str]) -> bool:
+        """True when the code is protected and a password was supplied to check"""
+        if not qr.password_hash:
+            return False
+        if not password:
+            raise HTTPException(status_code=401, detail="Password required")
+        return True
+    
+    def _has_unlock_token(self, qr: RedirectRecord, request: Request) -> bool:
+        """Check the signed cookie issued after a previous correct password"""
+        return bool(qr.password_hash) and unlock_tokens.verify(request.cookies.get(UNLOCK_COOKIE), qr)
+    
+    def _set_unlock_cookie(self, response: RedirectResponse, qr: RedirectRecord):
+        response.set_cookie(
+            UNLOCK_COOKIE,
+            unlock_tokens.issue(qr),
+            max_age=unlock_tokens.ttl_seconds,
+            path=f"/r/{qr.code}",
+            httponly=True,
+            secure=settings.BASE_URL.startswith("https://"),
+            samesite="lax"
+        )
+    
+    def _verify_password(self, qr: RedirectRecord, password: str):
+        if not verify_qr_password(password, qr.password_hash):
+            raise HTTPException(status_code=401, detail="Invalid password")
+    
+    def _choose_variant(self, qr: RedirectRecord, ip_hash: str) -> Optional[int]:
+        """Pick an A/B variant from the alias table cached with the record"""
+        if qr.variants is None:
+            return None
+        sticky_key = f"{ip_hash}:{qr.code}" if qr.variants.sticky else None
+        return pick_variant(qr.variants, sticky_key)
+    
+    def _variant_name(self, qr: RedirectRecord, variant: Optional[int]) -> Optional[str]:
+        return qr.variants.names[variant] if variant is not None else None
+    
+    def _get_target_url(self, qr: RedirectRecord, variant: Optional[int] = None) -> str:
+        """Determine target URL"""
         if qr.type == "static":
             target_url = qr.content
+        elif variant is not None:
+            target_url = qr.variants.targets[variant]
         else:  # dynamic
             target_url = qr.target
         
         if not target_url:
             raise HTTPException(status_code=404, detail="No target URL configured")
-        
-        # Record scan analytics
-        self._record_scan(qr.id, request, ip_hash)
-        
-        # Redirect to target
-        return RedirectResponse(url=target_url, status_code=302)
+        return target_url
     
     def _get_client_ip(self, request: Request) -> str:
         """Get client IP address from request"""
@@ -69,29 +169,126 @@ class RedirectService:
         """Hash IP address for privacy"""
         return hashlib.sha256(ip.encode()).hexdigest()[:16]
     
-    def _record_scan(self, qr_id: str, request: Request, ip_hash: str):
+    def _build_scan_event(self, qr_id: str, request: Request, client_ip: str, ip_hash: str, variant: Optional[str] = None) -> ScanEvent:
+        """Build the scan event for a redirect; the device label is filled in later"""
+        ua_string = request.headers.get("User-Agent", "")
+        
+        # Resolve the country from the raw address; only its hash is stored
+        country = geoip.country(client_ip)
+        
+        return ScanEvent(
+            qr_id=qr_id,
+            ip_hash=ip_hash,
+            country=country,
+            user_agent=ua_string[:200],  # Limit length
+            happened_at=datetime.utcnow(),
+            variant=variant
+        )
+    
+    def _record_scan(self, qr_id: str, request: Request, client_ip: str, ip_hash: str, variant: Optional[str] = None):
         """Record scan event for analytics"""
         try:
-            # Parse user agent
-            ua_string = request.headers.get("User-Agent", "")
-            ua = user_agents.parse(ua_string)
+            scan_event = self._build_scan_event(qr_id, request, client_ip, ip_hash, variant)
             
-            device = f"{ua.device.family}"
-            if ua.os.family != "Other":
-                device += f" ({ua.os.family})"
+            # Hand off to the write-behind sink (it sorts out bots and labels the
+            # UA on its own thread); write inline only when it isn't running
+            if scan_sink.running:
+                scan_sink.submit(scan_event)
+                return
             
-            # For now, set country as None (would need GeoIP database)
-            country = None
+            # Bots only bump a daily counter
+            bot = bot_classifier.classify(scan_event.user_agent)
+            if bot:
+                self.repo.record_bot_hits({(qr_id, scan_event.happened_at.date(), bot): 1})
+            else:
+                apply_user_agent(scan_event)
+                self.repo.record_scan(scan_event)
+                if variant:
+                    self.repo.record_variant_hits({(qr_id, scan_event.happened_at.date(), variant): 1})
+        except Exception:
+            # Don't fail the redirect if analytics recording fails
+            pass
+
+class AsyncRedirectService(RedirectService):
+    """RedirectService for the async route: database calls are awaited and
+    CPU-heavy work stays off the event loop"""
+    
+    def __init__(self, repo: AsyncQRCodeRepository):
+        self.repo = repo
+    
+    async def handle_redirect(self, code: str, request: Request, password: str = None) -> RedirectResponse:
+        """Handle QR code redirect with password and expiry checks"""
+        
+        # Get QR code (cached record first, database on miss)
+        qr = await self._get_record(code)
+        self._check_available(qr)
+        
+        # Get client IP
+        client_ip = self._get_client_ip(request)
+        ip_hash = self._hash_ip(client_ip)
+        
+        # Check password if required (a valid unlock cookie skips the check)
+        unlocked = False
+        if not self._has_unlock_token(qr, request) and self._requires_password(qr, password):
+            # Check rate limit for wrong password attempts
+            if not await rate_limiter.ahit(ip_hash, code):
+                raise HTTPException(status_code=429, detail="Too many failed attempts")
+            
+            self._verify_password(qr, password)
+            unlocked = True
+        
+        variant = self._choose_variant(qr, ip_hash)
+        target_url = self._get_target_url(qr, variant)
+        
+        # Record scan analytics
+        await self._record_scan(qr.id, request, client_ip, ip_hash, self._variant_name(qr, variant))
+        
+        # Redirect to target
+        response = RedirectResponse(url=target_url, status_code=302)
+        if unlocked:
+            self._set_unlock_cookie(response, qr)
+        return response
+    
+    async def _get_record(self, code: str) -> Optional[RedirectRecord]:
+        """Resolve a code through the redirect cache and snapshot, skipping
+        the database for codes the code filter rules out"""
+        record = self._get_local_record(code)
+        if record is None:
+            if not await self._might_exist(code):
+                return None
+            record = await self.repo.get_redirect_record(code)
+            self._remember(code, record)
+        return record
+    
+    async def _might_exist(self, code: str) -> bool:
+        if code_filter.known_missing(code):
+            return False
+        if code_filter.might_exist(code):
+            return True
+        synced = code_filter.sync_due()
+        if synced:
+            await run_in_threadpool(code_filter.sync)
+            if code_filter.might_exist(code):
+                return True
+        return not code_filter.reject(synced)
+    
+    async def _record_scan(self, qr_id: str, request: Request, client_ip: str, ip_hash: str, variant: Optional[str] = None):
+        """Record scan event for analytics"""
+        try:
+            scan_event = self._build_scan_event(qr_id, request, client_ip, ip_hash, variant)
             
-            scan_event = ScanEvent(
-                qr_id=qr_id,
-                ip_hash=ip_hash,
-                country=country,
-                user_agent=ua_string[:200],  # Limit length
-                device=device[:100]
-            )
+            if scan_sink.running:
+                scan_sink.submit(scan_event)
+                return
             
-            self.repo.record_scan(scan_event)
+            bot = await run_in_threadpool(bot_classifier.classify, scan_event.user_agent)
+            if bot:
+                await self.repo.record_bot_hits({(qr_id, scan_event.happened_at.date(), bot): 1})
+            else:
+                await run_in_threadpool(apply_user_agent, scan_event)
+                await self.repo.record_scan(scan_event)
+                if variant:
+                    await self.repo.record_variant_hits({(qr_id, scan_event.happened_at.date(), variant): 1})
         except Exception:
             # Don't fail the redirect if analytics recording fails
-            pass
\ No newline at end of file
+            pass
@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import threading
+import time
+from app.config import settings
+from app.schemas import RedirectRecord
+
+class RedirectCache:
+    """Bounded LRU cache of resolved redirect records with a per-entry TTL.
+
+    The TTL bounds how long another worker can keep serving a stale target
+    after an update, so it must stay below the 2 s window of AC-QR-Target-02.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 1.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, RedirectRecord]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, code: str) -> Optional[RedirectRecord]:
+        """Return the cached record for a code, or None if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, record = entry
+            if expires_at <= now:
+                del self._entries[code]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(code)
+            self.hits += 1
+            return record
+
+    def set(self, code: str, record: RedirectRecord):
+        """Store a record, evicting the least recently used entries if full"""
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[code] = (expires_at, record)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, code: str):
+        """Drop a code so the next redirect reloads it from the database"""
+        with self._lock:
+            self._entries.pop(code, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+redirect_cache = RedirectCache(
+    max_size=settings.REDIRECT_CACHE_SIZE,
+    ttl_seconds=settings.REDIRECT_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,318 @@
+from typing import Dict, Iterable, Optional
+import mmap
+import os
+import struct
+import threading
+import time
+from app.config import settings
+from app.models import SessionLocal
+from app.schemas import RedirectRecord
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized between workers
+    fcntl = None
+
+# File layout: header, then ``count`` fixed-width index entries sorted by
+# code, then the JSON-encoded records the entries point at
+MAGIC = b"QRSNAP01"
+HEADER = struct.Struct("<8sId")  # magic, entry count, built_at (epoch seconds)
+KEY_WIDTH = 16
+INDEX_ENTRY = struct.Struct(f"<{KEY_WIDTH}sQI")  # code, record offset, record length
+
+def _key(code: str) -> Optional[bytes]:
+    raw = code.encode()
+    if len(raw) > KEY_WIDTH or b"\0" in raw:
+        return None
+    return raw.ljust(KEY_WIDTH, b"\0")
+
+def write_snapshot(path: str, records: Iterable[RedirectRecord], built_at: Optional[float] = None) -> int:
+    """Write records to ``path`` atomically; returns the number of entries"""
+    entries = []
+    for record in records:
+        key = _key(record.code)
+        if key is not None:
+            entries.append((key, record.model_dump_json().encode()))
+    entries.sort(key=lambda entry: entry[0])
+
+    data_start = HEADER.size + INDEX_ENTRY.size * len(entries)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries), built_at if built_at is not None else time.time()))
+        offset = data_start
+        for key, payload in entries:
+            f.write(INDEX_ENTRY.pack(key, offset, len(payload)))
+            offset += len(payload)
+        for _, payload in entries:
+            f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(entries)
+
+class SnapshotFile:
+    """Read-only memory map of a snapshot written by ``write_snapshot``"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self.size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        if self._map is None or self.size < HEADER.size:
+            raise ValueError(f"Truncated redirect snapshot: {path}")
+        magic, self.count, self.built_at = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a redirect snapshot: {path}")
+
+    def get(self, code: str) -> Optional[RedirectRecord]:
+        """Binary search over the mapped index; only the hit is decoded"""
+        key = _key(code)
+        if key is None:
+            return None
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = HEADER.size + mid * INDEX_ENTRY.size
+            probe = self._map[position:position + KEY_WIDTH]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                _, offset, length = INDEX_ENTRY.unpack_from(self._map, position)
+                return RedirectRecord.model_validate_json(self._map[offset:offset + length])
+        return None
+
+class RedirectSnapshot:
+    """Code -> redirect record table shared by every worker on a host.
+
+    The snapshot is an immutable sorted file that each worker memory-maps, so
+    the page cache holds one copy however many workers there are. Changes
+    made after it was built are appended to ``<path>.delta`` as JSON lines by
+    the worker that committed them; every worker tails that log on a
+    background thread and layers the entries on top of the map.
+
+    Compaction rotates the delta log, rebuilds the snapshot from the database
+    and renames it into place. Rotating first is safe: entries are appended
+    after their commit, so anything left in the rotated log is already in
+    the rebuilt snapshot. Because lookups never need the database, codes in
+    the snapshot keep redirecting while the database is unavailable.
+
+    The delta log only covers this host. A change announced by another node
+    (``evict``) leaves a tombstone that sends lookups of the code to the
+    database until a snapshot built after it is loaded.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        session_factory=SessionLocal,
+        poll_interval: float = 0.5,
+        max_delta_bytes: int = 1024 * 1024,
+        rebuild_interval: float = 3600.0
+    ):
+        self.path = path
+        self.delta_path = path + ".delta"
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.max_delta_bytes = max_delta_bytes
+        self.rebuild_interval = rebuild_interval
+        self._file: Optional[SnapshotFile] = None
+        self._overlay: Dict[str, RedirectRecord] = {}
+        self._evicted: Dict[str, float] = {}  # code -> when another node changed it
+        self._delta_inode: Optional[int] = None
+        self._delta_pos = 0
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Load (building it first if missing or stale) and start tailing deltas"""
+        if self.running:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if self._needs_build():
+            try:
+                self.build(wait=True)
+            except Exception as e:
+                # Serve the previous snapshot, if any, until the database is back
+                print(f"Error building redirect snapshot: {e}")
+        self.refresh()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="redirect-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def get(self, code: str) -> Optional[RedirectRecord]:
+        """Record for a code from the delta overlay or the mapped snapshot"""
+        if code in self._evicted:
+            record = None
+        else:
+            record = self._overlay.get(code)
+            if record is None:
+                snapshot = self._file
+                record = snapshot.get(code) if snapshot is not None else None
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return record
+
+    def record_change(self, record: RedirectRecord):
+        """Publish a committed change to every worker on this host"""
+        if not self.running:
+            return
+        line = record.model_dump_json().encode() + b"\n"
+        with self._refresh_lock:
+            # O_APPEND keeps concurrent single-line writes from interleaving
+            with open(self.delta_path, "ab") as f:
+                f.write(line)
+            self._overlay[record.code] = record
+            self._evicted.pop(record.code, None)
+
+    def evict(self, code: str):
+        """Stop serving a code changed on another node until the next rebuild"""
+        if not self.running:
+            return
+        with self._refresh_lock:
+            self._evicted[code] = time.time()
+
+    def build(self, wait: bool = False) -> bool:
+        """Compact: rotate the delta log and rebuild the snapshot from the
+        database. Returns False if another worker is already building."""
+        from app.repo import QRCodeRepository
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    return False
+                if wait and not self._needs_build():
+                    # Another worker built it while we waited
+                    return True
+
+            rotated = os.path.exists(self.delta_path)
+            if rotated:
+                os.replace(self.delta_path, self.delta_path + ".old")
+            built_at = time.time()
+            db = self.session_factory()
+            try:
+                records = QRCodeRepository(db).list_redirect_records()
+            except Exception:
+                # Put the log back unless a new one was started meanwhile
+                if rotated and not os.path.exists(self.delta_path):
+                    os.replace(self.delta_path + ".old", self.delta_path)
+                raise
+            finally:
+                db.close()
+            write_snapshot(self.path, records, built_at)
+            self.builds += 1
+        self.refresh()
+        return True
+
+    def refresh(self):
+        """Pick up a rebuilt snapshot and any new delta entries"""
+        with self._refresh_lock:
+            try:
+                inode = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                inode = None
+            if inode is not None and (self._file is None or self._file.inode != inode):
+                try:
+                    self._file = SnapshotFile(self.path)
+                    # The new snapshot already contains the rotated entries,
+                    # and the changes of codes evicted before it was built
+                    self._overlay = {}
+                    self._evicted = {
+                        code: evicted_at for code, evicted_at in self._evicted.items()
+                        if evicted_at >= self._file.built_at
+                    }
+                    self._delta_inode = None
+                except (OSError, ValueError) as e:
+                    print(f"Error loading redirect snapshot: {e}")
+            self._read_delta()
+
+    def stats(self) -> dict:
+        snapshot = self._file
+        lookups = self.hits + self.misses
+        return {
+            "running": self.running,
+            "entries": snapshot.count if snapshot else 0,
+            "file_bytes": snapshot.size if snapshot else 0,
+            "age_seconds": time.time() - snapshot.built_at if snapshot else None,
+            "delta_entries": len(self._overlay),
+            "evicted": len(self._evicted),
+            "delta_bytes": self._delta_pos,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "builds": self.builds
+        }
+
+    def _needs_build(self) -> bool:
+        try:
+            snapshot = SnapshotFile(self.path)
+        except (OSError, ValueError):
+            return True
+        return time.time() - snapshot.built_at > self.rebuild_interval
+
+    def _read_delta(self):
+        try:
+            f = open(self.delta_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            inode = os.fstat(f.fileno()).st_ino
+            if inode != self._delta_inode:
+                # Rotated: start from the top of the new log
+                self._delta_inode = inode
+                self._delta_pos = 0
+            f.seek(self._delta_pos)
+            data = f.read()
+
+        # Leave a partially written last line for the next poll
+        end = data.rfind(b"\n") + 1
+        overlay = dict(self._overlay)
+        for line in data[:end].splitlines():
+            try:
+                record = RedirectRecord.model_validate_json(line)
+            except ValueError:
+                continue
+            overlay[record.code] = record
+        self._overlay = overlay
+        self._delta_pos += end
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.refresh()
+                if self._delta_pos > self.max_delta_bytes or self._needs_rebuild_by_age():
+                    self.build()
+            except Exception as e:
+                print(f"Error refreshing redirect snapshot: {e}")
+
+    def _needs_rebuild_by_age(self) -> bool:
+        snapshot = self._file
+        return snapshot is None or time.time() - snapshot.built_at > self.rebuild_interval
+
+redirect_snapshot = RedirectSnapshot(
+    settings.REDIRECT_SNAPSHOT_PATH,
+    poll_interval=settings.REDIRECT_SNAPSHOT_POLL_SECONDS,
+    max_delta_bytes=settings.REDIRECT_SNAPSHOT_MAX_DELTA_BYTES,
+    rebuild_interval=settings.REDIRECT_SNAPSHOT_REBUILD_SECONDS
+)
@@ -0,0 +1,224 @@
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+import queue
+import threading
+import time
+from app.config import settings
+from app.models import SessionLocal
+from app.repo import QRCodeRepository
+from app.schemas import ScanEvent
+from app.services.bots import bot_classifier
+from app.services.useragent import apply_user_agent
+
+class ScanSink:
+    """Write-behind buffer for scan events.
+
+    Redirects enqueue events without touching the database; a background
+    thread bulk-inserts them into ``scans`` whenever a batch fills up or the
+    flush interval elapses. Events queued without a ``device`` label get it
+    from the memoized user-agent parser on the flusher, off the request path.
+    When the queue is full new events are dropped and counted rather than
+    slowing the redirect down.
+
+    Events from bots don't become scan rows: the flusher classifies each
+    event's User-Agent and tallies bot hits per (QR, day, bot), adding them
+    to ``bot_hits`` on each flush. Human scans of an A/B split are tallied
+    the same way per (QR, day, variant) into ``variant_hits``.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queue_size: int = 10000
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[ScanEvent]" = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._bot_hits: Counter = Counter()
+        self._variant_hits: Counter = Counter()
+        self._counter_lock = threading.Lock()
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.bot_hits = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the background flusher thread"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="scan-sink", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the flusher and write out everything still queued"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def submit(self, event: ScanEvent) -> bool:
+        """Queue a scan event; returns False if it was dropped"""
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.enqueued += 1
+        return True
+
+    def flush(self) -> int:
+        """Synchronously drain the queue into the database"""
+        total = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                self._write_counters()
+                return total
+            total += self._write(batch)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "running": self.running,
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+                "flushes": self.flushes,
+                "bot_hits": self.bot_hits
+            }
+
+    def _run(self):
+        batch: List[ScanEvent] = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while not self._stop_event.is_set():
+            # Wake up regularly so stop() never waits a whole interval
+            timeout = min(max(0.0, deadline - time.monotonic()), 0.1)
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+
+            # Flush on a full batch or when the interval has elapsed
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                batch.extend(self._drain(self.batch_size - len(batch)))
+                if batch:
+                    self._write(batch)
+                    batch = []
+                self._write_counters()
+                deadline = time.monotonic() + self.flush_interval
+
+        if batch:
+            self._write(batch)
+
+    def _drain(self, limit: int) -> List[ScanEvent]:
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def _write(self, events: List[ScanEvent]) -> int:
+        with self._write_lock:
+            db = self.session_factory()
+            try:
+                events = self._count_bots(events)
+                self._count_variants(events)
+                for event in events:
+                    if event.device is None:
+                        apply_user_agent(event)
+                written = QRCodeRepository(db).record_scans(events)
+                with self._stats_lock:
+                    self.written += written
+                    self.flushes += 1
+                return written
+            except Exception as e:
+                db.rollback()
+                with self._stats_lock:
+                    self.failed += len(events)
+                print(f"Error flushing {len(events)} scan events: {e}")
+                return 0
+            finally:
+                db.close()
+
+    def _count_bots(self, events: List[ScanEvent]) -> List[ScanEvent]:
+        """Tally events from bots and return the rest"""
+        humans = []
+        bots = Counter()
+        for event in events:
+            bot = bot_classifier.classify(event.user_agent)
+            if bot:
+                bots[(event.qr_id, (event.happened_at or datetime.utcnow()).date(), bot)] += 1
+            else:
+                humans.append(event)
+        if bots:
+            with self._counter_lock:
+                self._bot_hits.update(bots)
+            with self._stats_lock:
+                self.bot_hits += sum(bots.values())
+        return humans
+
+    def _count_variants(self, events: List[ScanEvent]):
+        """Tally the A/B variant each scan was served"""
+        variants = Counter(
+            (event.qr_id, (event.happened_at or datetime.utcnow()).date(), event.variant)
+            for event in events if event.variant
+        )
+        if variants:
+            with self._counter_lock:
+                self._variant_hits.update(variants)
+
+    def _write_counters(self):
+        with self._counter_lock:
+            bot_hits, self._bot_hits = self._bot_hits, Counter()
+            variant_hits, self._variant_hits = self._variant_hits, Counter()
+        if not bot_hits and not variant_hits:
+            return
+
+        db = self.session_factory()
+        try:
+            repo = QRCodeRepository(db)
+            if bot_hits:
+                repo.record_bot_hits(bot_hits)
+                bot_hits = Counter()
+            if variant_hits:
+                repo.record_variant_hits(variant_hits)
+        except Exception as e:
+            db.rollback()
+            # Keep the tallies for the next flush
+            with self._counter_lock:
+                self._bot_hits.update(bot_hits)
+                self._variant_hits.update(variant_hits)
+            print(f"Error flushing hit counters: {e}")
+        finally:
+            db.close()
+
+scan_sink = ScanSink(
+    batch_size=settings.SCAN_SINK_BATCH_SIZE,
+    flush_interval=settings.SCAN_SINK_FLUSH_INTERVAL_SECONDS,
+    max_queue_size=settings.SCAN_SINK_MAX_QUEUE
+)
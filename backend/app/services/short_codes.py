@@ -0,0 +1,183 @@
+from typing import List, Tuple
+import hashlib
+import threading
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+from app.models import SessionLocal, CodeCounter
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+FEISTEL_ROUNDS = 6
+
+class ShortCodePermutation:
+    """Keyed bijection on ``[0, 62**length)``, rendered as base62.
+
+    A balanced Feistel network over the smallest even bit width that covers
+    the code space; values that land outside it are fed through again
+    (cycle-walking), which keeps the mapping a bijection on the code space
+    itself. Distinct counter values therefore always give distinct codes, and
+    consecutive values give codes that look unrelated.
+    """
+
+    def __init__(self, key: bytes, length: int = 7):
+        self.length = length
+        self.size = len(ALPHABET) ** length
+        bits = (self.size - 1).bit_length()
+        self.half_bits = (bits + 1) // 2
+        self._mask = (1 << self.half_bits) - 1
+        self._key = hashlib.sha256(b"qr-short-code:" + key).digest()
+        # Identifies the key without revealing it
+        self.fingerprint = hashlib.sha256(b"qr-short-code-fingerprint:" + self._key).hexdigest()[:16]
+
+    def permute(self, value: int) -> int:
+        if not 0 <= value < self.size:
+            raise ValueError(f"{value} is outside the code space")
+        value = self._feistel(value)
+        while value >= self.size:
+            value = self._feistel(value)
+        return value
+
+    def encode(self, value: int) -> str:
+        chars = []
+        for _ in range(self.length):
+            value, digit = divmod(value, len(ALPHABET))
+            chars.append(ALPHABET[digit])
+        return "".join(reversed(chars))
+
+    def code(self, value: int) -> str:
+        return self.encode(self.permute(value))
+
+    def _feistel(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self._mask
+        for round_number in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ self._round(round_number, right)
+        return (left << self.half_bits) | right
+
+    def _round(self, round_number: int, half: int) -> int:
+        digest = hashlib.blake2b(
+            half.to_bytes(8, "big") + bytes([round_number]), key=self._key, digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "big") & self._mask
+
+class ShortCodeAllocator:
+    """Hands out collision-free short codes without a round trip per code.
+
+    Each process reserves a block of counter values from the shared
+    ``code_counters`` row with a compare-and-swap update, then turns the
+    values into codes through ``ShortCodePermutation``. Blocks never overlap,
+    so codes never collide, across workers and nodes alike. Values left in a
+    block when the process exits are simply skipped.
+
+    That only holds under one key: the counter row keeps the fingerprint of
+    the key its values were issued under, and reserving with another key
+    fails instead of producing codes that may collide with issued ones.
+    """
+
+    def __init__(
+        self,
+        key: bytes,
+        length: int = 7,
+        block_size: int = 1000,
+        session_factory=SessionLocal,
+        counter: str = "qr_codes"
+    ):
+        self.permutation = ShortCodePermutation(key, length)
+        self.block_size = block_size
+        self.session_factory = session_factory
+        self.counter = counter
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+        self.allocated = 0
+        self.reservations = 0
+        self.conflicts = 0
+
+    def allocate(self) -> str:
+        """Next code from this process's block, reserving a new block when empty"""
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self._reserve(self.block_size)
+            value = self._next
+            self._next += 1
+            self.allocated += 1
+        return self.permutation.code(value)
+
+    def allocate_many(self, count: int) -> List[str]:
+        """``count`` codes at once; large requests get a dedicated range so
+        bulk creation costs one round trip however many codes it needs"""
+        if count <= 0:
+            return []
+        with self._lock:
+            if count <= self._end - self._next:
+                start = self._next
+                self._next += count
+            else:
+                start, _ = self._reserve(count)
+            self.allocated += count
+        return [self.permutation.code(value) for value in range(start, start + count)]
+
+    def reset(self):
+        """Forget the current block (tests, or after switching databases)"""
+        with self._lock:
+            self._next = self._end = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "block_remaining": self._end - self._next,
+                "allocated": self.allocated,
+                "reservations": self.reservations,
+                "conflicts": self.conflicts
+            }
+
+    def _reserve(self, count: int) -> Tuple[int, int]:
+        """Claim ``[start, start + count)`` from the shared counter"""
+        db = self.session_factory()
+        try:
+            fingerprint = self.permutation.fingerprint
+            while True:
+                row = (
+                    db.query(CodeCounter.next_value, CodeCounter.key_fingerprint)
+                    .filter(CodeCounter.name == self.counter)
+                    .first()
+                )
+                if row is None:
+                    # First reservation ever: create the row, unless another worker just did
+                    try:
+                        db.add(CodeCounter(name=self.counter, next_value=count, key_fingerprint=fingerprint))
+                        db.commit()
+                        start = 0
+                        break
+                    except IntegrityError:
+                        db.rollback()
+                        self.conflicts += 1
+                        continue
+                start, issued_under = row
+                if issued_under is not None and issued_under != fingerprint:
+                    raise RuntimeError(
+                        f"SHORT_CODE_KEY changed since codes were issued from counter {self.counter!r}; "
+                        "new codes could collide with existing ones"
+                    )
+                if start + count > self.permutation.size:
+                    raise RuntimeError(f"Short code space exhausted ({self.permutation.size} codes)")
+                result = db.execute(
+                    update(CodeCounter)
+                    .where(CodeCounter.name == self.counter, CodeCounter.next_value == start)
+                    .values(next_value=start + count, key_fingerprint=fingerprint)
+                )
+                db.commit()
+                if result.rowcount == 1:
+                    break
+                # Another worker reserved a block in between; read the counter again
+                self.conflicts += 1
+        finally:
+            db.close()
+        self.reservations += 1
+        return start, start + count
+
+short_codes = ShortCodeAllocator(
+    settings.SHORT_CODE_KEY.encode(),
+    length=settings.SHORT_CODE_LENGTH,
+    block_size=settings.SHORT_CODE_BLOCK_SIZE
+)
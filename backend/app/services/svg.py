@@ -0,0 +1,56 @@
+from typing import IO, Iterator, Sequence, Tuple
+from app.services.raster import Color, to_rgba
+
+def _paint(color: Color) -> str:
+    """``fill`` attributes for a colour; always normalised, so design values never reach the markup as-is"""
+    red, green, blue, alpha = to_rgba(color)
+    paint = f'fill="#{red:02x}{green:02x}{blue:02x}"'
+    if alpha < 255:
+        paint += f' fill-opacity="{round(alpha / 255, 3)}"'
+    return paint
+
+def _units(pixels: int) -> str:
+    """Same physical size as qrcode's SVG images: a box_size of 10 is 1mm"""
+    return f"{pixels / 10:g}mm"
+
+def module_runs(matrix: Sequence[Sequence[bool]]) -> Iterator[Tuple[int, int, int]]:
+    """``(x, y, length)`` for every horizontal run of dark modules"""
+    for y, row in enumerate(matrix):
+        x, width = 0, len(row)
+        while x < width:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < width and row[x]:
+                x += 1
+            yield start, y, x - start
+
+def write_svg(matrix: Sequence[Sequence[bool]], box_size: int, stream: IO[str], fill_color: Color = "black", back_color: Color = "white"):
+    """Write a module matrix (``QRCode.get_matrix()``, border included) as SVG.
+
+    All dark modules go into one path, one ``h``/``v`` rectangle per
+    horizontal run, each positioned relative to the previous one; the
+    viewBox is in modules, so coordinates stay small integers.
+    """
+    size = len(matrix)
+    dimension = _units(size * box_size)
+    stream.write(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{dimension}" height="{dimension}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+    )
+    back = back_color.lower() if isinstance(back_color, str) else back_color
+    if back != "transparent":
+        stream.write(f'<rect width="{size}" height="{size}" {_paint(back_color)}/>')
+
+    stream.write(f'<path {_paint(fill_color)} d="')
+    last_x = last_y = None
+    for x, y, length in module_runs(matrix):
+        if last_x is None:
+            stream.write(f"M{x} {y}")
+        else:
+            stream.write(f"m{x - last_x} {y - last_y}")
+        stream.write(f"h{length}v1h-{length}z")
+        last_x, last_y = x, y
+    stream.write('"/></svg>\n')
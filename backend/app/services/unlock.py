@@ -0,0 +1,45 @@
+from typing import Optional
+import base64
+import hashlib
+import hmac
+import time
+from app.config import settings
+from app.schemas import RedirectRecord
+
+UNLOCK_COOKIE = "qr_unlock"
+
+class UnlockTokenSigner:
+    """Short-lived HMAC tokens proving a visitor already entered a QR password.
+
+    A token is ``<expires>.<signature>``, where the signature covers the code,
+    the expiry and a fingerprint of the record's password hash and target.
+    Verifying only needs the (cached) redirect record, so a returning visitor
+    skips the rate limiter and the password check, and changing the password
+    or target through ``update_qr_target`` invalidates every issued token.
+    """
+
+    def __init__(self, secret_key: str, ttl_seconds: int = 900):
+        self._key = hashlib.sha256(b"qr-unlock:" + secret_key.encode()).digest()
+        self.ttl_seconds = ttl_seconds
+
+    def issue(self, record: RedirectRecord, now: Optional[float] = None) -> str:
+        expires = int((now if now is not None else time.time()) + self.ttl_seconds)
+        return f"{expires}.{self._sign(record, expires)}"
+
+    def verify(self, token: Optional[str], record: RedirectRecord, now: Optional[float] = None) -> bool:
+        if not token or not record.password_hash:
+            return False
+        expires, _, signature = token.partition(".")
+        if not expires.isdigit() or not signature:
+            return False
+        if int(expires) <= (now if now is not None else time.time()):
+            return False
+        return hmac.compare_digest(signature, self._sign(record, int(expires)))
+
+    def _sign(self, record: RedirectRecord, expires: int) -> str:
+        fingerprint = hashlib.sha256(f"{record.password_hash}\0{record.target or record.content}".encode()).hexdigest()
+        message = f"{record.code}\0{expires}\0{fingerprint}".encode()
+        digest = hmac.new(self._key, message, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+unlock_tokens = UnlockTokenSigner(settings.SECRET_KEY, settings.UNLOCK_TOKEN_TTL_SECONDS)
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+import threading
+import user_agents
+from app.config import settings
+from app.schemas import ScanEvent, UserAgentInfo
+
+# Scans store at most this many characters of the User-Agent header
+MAX_USER_AGENT_LENGTH = 200
+
+def parse_user_agent(ua_string: str) -> UserAgentInfo:
+    """Run the ua-parser regex cascade and derive the labels stored on a scan"""
+    ua = user_agents.parse(ua_string or "")
+    
+    device = f"{ua.device.family}"
+    if ua.os.family != "Other":
+        device += f" ({ua.os.family})"
+    
+    return UserAgentInfo(
+        device=device[:100],
+        os=ua.os.family[:50],
+        browser=ua.browser.family[:50]
+    )
+
+class UserAgentCache:
+    """Bounded LRU of parsed user agents keyed on the truncated UA string.
+
+    Scan traffic comes from a few hundred distinct UA strings, so nearly
+    every lookup is a dictionary hit instead of a full regex cascade.
+    """
+    
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, UserAgentInfo]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def parse(self, ua_string: str) -> UserAgentInfo:
+        key = (ua_string or "")[:MAX_USER_AGENT_LENGTH]
+        with self._lock:
+            info = self._entries.get(key)
+            if info is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return info
+            self.misses += 1
+        
+        # Parse outside the lock; a racing duplicate parse is harmless
+        info = parse_user_agent(key)
+        if self.max_size > 0:
+            with self._lock:
+                self._entries[key] = info
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return info
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+user_agent_cache = UserAgentCache(max_size=settings.USER_AGENT_CACHE_SIZE)
+
+def apply_user_agent(scan_event: ScanEvent) -> ScanEvent:
+    """Fill the device label of a scan from its User-Agent"""
+    scan_event.device = user_agent_cache.parse(scan_event.user_agent).device
+    return scan_event
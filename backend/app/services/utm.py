@@ -0,0 +1,31 @@
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+UTM_FIELDS = ("utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content")
+
+def merge_utm(*configs: Optional[Dict[str, Optional[str]]]) -> Dict[str, str]:
+    """Combine UTM configs; later ones (e.g. the QR's own) override earlier
+    ones (its folder's) field by field"""
+    merged: Dict[str, str] = {}
+    for config in configs:
+        for field, value in (config or {}).items():
+            if field in UTM_FIELDS and value:
+                merged[field] = value
+    return merged
+
+def compile_target(url: Optional[str], utm: Dict[str, str]) -> Optional[str]:
+    """Append UTM parameters to a target URL.
+
+    Runs when a target or UTM setting is written, never per redirect. The target's
+    own query string is kept byte for byte; parameters it already sets win
+    over the configured ones, and any fragment stays at the end.
+    """
+    if not url or not utm:
+        return url
+    parts = urlsplit(url)
+    present = {key for key, _ in parse_qsl(parts.query, keep_blank_values=True)}
+    extra = urlencode([(field, utm[field]) for field in UTM_FIELDS if field in utm and field not in present])
+    if not extra:
+        return url
+    query = f"{parts.query}&{extra}" if parts.query and not parts.query.endswith("&") else parts.query + extra
+    return urlunsplit(parts._replace(query=query))
@@ -0,0 +1,56 @@
+from typing import Optional, Sequence
+import hashlib
+import random
+from app.schemas import VariantTable
+
+def build_variant_table(variants: Sequence[dict], sticky: bool = False) -> Optional[VariantTable]:
+    """Precompute the alias table (Vose's method) for ``[{name, target, weight}]``.
+
+    Built when the split or its UTM settings are written, so picking a
+    variant on each redirect is one uniform draw and one comparison whatever
+    the number of variants.
+    """
+    variants = [variant for variant in variants if variant["weight"] > 0]
+    if not variants:
+        return None
+    count = len(variants)
+    total = sum(variant["weight"] for variant in variants)
+    scaled = [variant["weight"] * count / total for variant in variants]
+
+    prob = [1.0] * count
+    alias = list(range(count))
+    small = [i for i, weight in enumerate(scaled) if weight < 1.0]
+    large = [i for i, weight in enumerate(scaled) if weight >= 1.0]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+        (small if scaled[more] < 1.0 else large).append(more)
+    # Whatever is left is 1.0 up to rounding error
+
+    return VariantTable(
+        names=[variant["name"] for variant in variants],
+        targets=[variant["target"] for variant in variants],
+        prob=prob,
+        alias=alias,
+        sticky=sticky
+    )
+
+def pick_variant(table: VariantTable, sticky_key: Optional[str] = None) -> int:
+    """Index of the variant to serve.
+
+    With a ``sticky_key`` (the visitor's IP hash plus the code) the draw is
+    derived from a hash of the key, so the same visitor keeps landing on the
+    same variant for as long as the split is unchanged.
+    """
+    count = len(table.prob)
+    if sticky_key is not None:
+        value = int.from_bytes(hashlib.blake2b(sticky_key.encode(), digest_size=8).digest(), "big")
+        column = (value >> 32) % count
+        coin = (value & 0xFFFFFFFF) / 2 ** 32
+    else:
+        draw = random.random() * count
+        column = int(draw)
+        coin = draw - column
+    return column if coin < table.prob[column] else table.alias[column]
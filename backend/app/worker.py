@@ -0,0 +1,30 @@
+"""Bulk job worker.
+
+Runs queued bulk jobs from the shared database until stopped:
+
+    python -m app.worker
+
+Run the API with BULK_JOB_RUNNER=worker when jobs should only run here.
+Workers need the API's BULK_JOB_DIR and UPLOAD_DIR mounted at the same paths.
+"""
+import signal
+import threading
+from app.services.jobs import bulk_jobs
+from app.services.render_pool import render_pool
+
+def main():
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stop.set())
+
+    print("Bulk job worker started")
+    bulk_jobs.start()
+    stop.wait()
+
+    # A job already running finishes before the worker exits
+    bulk_jobs.stop(timeout=None)
+    render_pool.shutdown()
+    print("Bulk job worker stopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Bulk PNG rendering throughput of the render pool at several worker counts.
+
+Each worker count renders the same batch of distinct codes into an empty
+directory, so nothing is served from the artifact cache. Pool start-up is
+timed separately (a one-task-per-worker warm-up batch) and left out of the
+throughput; a long-running API process pays it once. The projection for
+10k rows is what SPEC's "10k-row bulk job under 15 minutes" is measured
+against; the database inserts are not included here.
+
+    cd backend
+    python -m benchmarks.bulk_render --rows 2000 --workers 1,2,4,8
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from app.services.render_pool import RenderPool
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000, help="codes rendered per worker count")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts")
+    parser.add_argument("--design", default="navy", help="design colour ('black' for the 1-bit fast path)")
+    return parser.parse_args()
+
+def make_tasks(rows: int, color: str, prefix: str):
+    return [
+        {"code": f"{prefix}{i:06d}", "content": f"https://qrbuilder.pro/r/{prefix}{i:06d}", "design": {"color": color}}
+        for i in range(rows)
+    ]
+
+def measure(args, workers: int) -> dict:
+    pool = RenderPool(workers=workers)
+    directory = tempfile.mkdtemp(prefix="qr-bulk-render-")
+    try:
+        started = time.perf_counter()
+        pool.render(make_tasks(workers, args.design, "warm"), directory)
+        startup = time.perf_counter() - started
+
+        tasks = make_tasks(args.rows, args.design, "row")
+        started = time.perf_counter()
+        results = pool.render(tasks, directory)
+        elapsed = time.perf_counter() - started
+    finally:
+        pool.shutdown()
+        shutil.rmtree(directory)
+
+    return {
+        "workers": workers,
+        "startup_s": round(startup, 3),
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(args.rows / elapsed, 1),
+        "failed": sum(1 for _, error in results if error),
+        "projected_10k_s": round(10000 * elapsed / args.rows, 1)
+    }
+
+def main():
+    args = parse_args()
+    results = [measure(args, int(workers)) for workers in args.workers.split(",")]
+    baseline = results[0]["seconds"]
+    for result in results:
+        result["speedup"] = round(baseline / result["seconds"], 2)
+    print(json.dumps({
+        "benchmark": "bulk_render",
+        "cpu_count": os.cpu_count(),
+        "rows": args.rows,
+        "design": args.design,
+        "results": results
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""False-positive rate, memory and lookup cost of the unknown-code filter.
+
+Fills a Bloom filter sized for each capacity with random 8-character codes,
+then probes it with codes that were never added.
+
+    cd backend
+    python -m benchmarks.code_filter --sizes 10000,100000,1000000
+"""
+import argparse
+import json
+import time
+import uuid
+
+from app.services.code_filter import BloomFilter
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated code counts")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="target false-positive rate")
+    parser.add_argument("--probes", type=int, default=100000, help="unknown codes to look up per size")
+    return parser.parse_args()
+
+def measure(size: int, error_rate: float, probes: int) -> dict:
+    bloom = BloomFilter(capacity=size, error_rate=error_rate)
+    for _ in range(size):
+        bloom.add(uuid.uuid4().hex[:8])
+    
+    unknown = [f"x{uuid.uuid4().hex[:7]}" for _ in range(probes)]
+    started = time.perf_counter()
+    false_positives = sum(code in bloom for code in unknown)
+    elapsed = time.perf_counter() - started
+    
+    return {
+        "codes": bloom.count,
+        "memory_bytes": bloom.memory_bytes,
+        "bits_per_code": round(bloom.num_bits / size, 2),
+        "hash_functions": bloom.num_hashes,
+        "expected_false_positive_rate": round(bloom.expected_false_positive_rate, 5),
+        "observed_false_positive_rate": round(false_positives / probes, 5),
+        "lookup_us": round(elapsed / probes * 1e6, 2)
+    }
+
+def main():
+    args = parse_args()
+    results = [measure(int(size), args.error_rate, args.probes) for size in args.sizes.split(",")]
+    print(json.dumps({"benchmark": "code_filter", "error_rate": args.error_rate, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Per-request render time for png + svg + pdf, before and after sharing one matrix.
+
+"before" replays the previous pipeline: encode a QRCode, rasterize it for
+the PNG, write the SVG, then rasterize again for the PDF and re-encode
+that raster as a PNG to embed it; it skips the page text, which only
+flatters it. "after" is ``QRCodeService.generate_qr_images`` with the module matrix cache cold
+(cleared before every request) and warm (the same content re-rendered,
+e.g. after a design change). Every request writes into an empty
+directory, so the artifact cache never short-circuits the work.
+
+    cd backend
+    python -m benchmarks.formats --repeat 50
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+import qrcode
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from app.config import settings
+from app.services.matrix import matrix_cache
+from app.services.qrcode import ERROR_CORRECTION, QRCodeService
+from app.services.raster import rasterize
+from app.services.svg import write_svg
+
+FORMATS = ["png", "svg", "pdf"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="requests per path")
+    parser.add_argument("--content", default="https://qrbuilder.pro/r/Xk3p9Qa", help="static content to encode")
+    parser.add_argument("--fill", default="navy", help="design colour")
+    parser.add_argument("--back", default="#ffeecc", help="design background")
+    return parser.parse_args()
+
+def before(qr_code_obj, directory: str):
+    design = qr_code_obj.design
+    qr = qrcode.QRCode(version=1, error_correction=ERROR_CORRECTION, box_size=settings.QR_CODE_SIZE, border=settings.QR_CODE_BORDER)
+    qr.add_data(qr_code_obj.content)
+    qr.make(fit=True)
+
+    rasterize(qr.get_matrix(), qr.box_size, design["color"], design["bgColor"]).save(os.path.join(directory, "a.png"), format="PNG")
+    with open(os.path.join(directory, "a.svg"), "w", encoding="utf-8") as f:
+        write_svg(qr.get_matrix(), qr.box_size, f, design["color"], design["bgColor"])
+
+    buffer = io.BytesIO()
+    rasterize(qr.get_matrix(), qr.box_size, design["color"], design["bgColor"]).save(buffer, format="PNG")
+    buffer.seek(0)
+    c = canvas.Canvas(os.path.join(directory, "a.pdf"), pagesize=A4)
+    c.drawImage(ImageReader(buffer), 197, 491, 200, 200)
+    c.save()
+
+def time_requests(render, qr_code_obj, repeat: int, setup=lambda: None) -> float:
+    total = 0.0
+    for _ in range(repeat):
+        directory = tempfile.mkdtemp(prefix="qr-formats-")
+        setup()
+        started = time.perf_counter()
+        render(qr_code_obj, directory)
+        total += time.perf_counter() - started
+        shutil.rmtree(directory)
+    return total / repeat
+
+def main():
+    args = parse_args()
+    qr_code_obj = SimpleNamespace(
+        id=1, code="bench01", type="static", content=args.content, name="Benchmark", folder=None,
+        design={"color": args.fill, "bgColor": args.back}
+    )
+    service = QRCodeService()
+
+    def after(obj, directory):
+        service.upload_dir = directory
+        service.generate_qr_images(obj, FORMATS)
+
+    before_seconds = time_requests(before, qr_code_obj, args.repeat)
+    cold_seconds = time_requests(after, qr_code_obj, args.repeat, setup=matrix_cache.clear)
+    matrix_cache.clear()
+    warm_seconds = time_requests(after, qr_code_obj, args.repeat)
+    print(json.dumps({
+        "benchmark": "formats",
+        "formats": FORMATS,
+        "content_length": len(args.content),
+        "repeat": args.repeat,
+        "before_ms": round(before_seconds * 1000, 3),
+        "after_cold_ms": round(cold_seconds * 1000, 3),
+        "after_warm_ms": round(warm_seconds * 1000, 3),
+        "speedup_cold": round(before_seconds / cold_seconds, 2),
+        "speedup_warm": round(before_seconds / warm_seconds, 2),
+        "matrix_cache": matrix_cache.stats()
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""PNG rendering time: qrcode's PIL drawer vs the NumPy rasterizer.
+
+Both paths start from an already encoded QR code and end with PNG bytes,
+so only rasterizing and PNG encoding are timed. Each size also checks that
+the two PNGs decode to identical pixels. Coloured designs come out as 1-bit
+palette PNGs instead of RGB, which is where most of the difference is.
+
+    cd backend
+    python -m benchmarks.rasterize --box-sizes 10,20,30,40 --repeat 50
+"""
+import argparse
+import io
+import json
+import time
+
+import qrcode
+from PIL import Image
+
+from app.services.raster import rasterize
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--box-sizes", default="10,20,30,40", help="comma-separated pixels per module")
+    parser.add_argument("--repeat", type=int, default=50, help="renders per size and path")
+    parser.add_argument("--data", default="https://qrbuilder.pro/r/Xk3p9Qa", help="content to encode")
+    parser.add_argument("--fill", default="black", help="fill colour")
+    parser.add_argument("--back", default="white", help="background colour")
+    return parser.parse_args()
+
+def encode(data: str, box_size: int) -> qrcode.QRCode:
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=box_size, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+def png(image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def time_path(render, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        png(render())
+    return (time.perf_counter() - started) / repeat
+
+def decode(data: bytes, mode: str) -> bytes:
+    return Image.open(io.BytesIO(data)).convert(mode).tobytes()
+
+def measure(args, box_size: int) -> dict:
+    qr = encode(args.data, box_size)
+    pil = lambda: qr.make_image(fill_color=args.fill, back_color=args.back).get_image()
+    numpy = lambda: rasterize(qr.get_matrix(), box_size, args.fill, args.back)
+
+    reference, candidate = png(pil()), png(numpy())
+    mode = Image.open(io.BytesIO(reference)).mode
+    identical = decode(reference, mode) == decode(candidate, mode)
+
+    pil_seconds = time_path(pil, args.repeat)
+    numpy_seconds = time_path(numpy, args.repeat)
+    return {
+        "box_size": box_size,
+        "pixels": Image.open(io.BytesIO(reference)).size[0],
+        "mode": mode,
+        "pixel_identical": identical,
+        "pil_png_bytes": len(reference),
+        "numpy_png_bytes": len(candidate),
+        "pil_ms": round(pil_seconds * 1000, 3),
+        "numpy_ms": round(numpy_seconds * 1000, 3),
+        "speedup": round(pil_seconds / numpy_seconds, 2)
+    }
+
+def main():
+    args = parse_args()
+    results = [measure(args, int(size)) for size in args.box_sizes.split(",")]
+    print(json.dumps({
+        "benchmark": "rasterize",
+        "data_length": len(args.data),
+        "fill": args.fill,
+        "back": args.back,
+        "results": results
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
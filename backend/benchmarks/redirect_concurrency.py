@@ -0,0 +1,152 @@
+"""Throughput of /r/{code} as the number of in-flight requests grows.
+
+Compares the async redirect route against the previous implementation (a
+sync SQLAlchemy session used inside an ``async def`` handler), both served
+in-process on one event loop, which is what a single uvicorn worker does.
+The redirect cache is disabled so every request reaches the database, and
+``--db-latency-ms`` adds a fixed delay to every SELECT to stand in for a
+networked database.
+
+    cd backend
+    python -m benchmarks.redirect_concurrency --levels 1,2,4,8,16 --db-latency-ms 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,2,4,8,16", help="comma-separated in-flight request counts")
+    parser.add_argument("--requests", type=int, default=400, help="requests per level and route")
+    parser.add_argument("--codes", type=int, default=200, help="number of seeded QR codes")
+    parser.add_argument("--db-latency-ms", type=float, default=5.0, help="simulated latency per SELECT")
+    return parser.parse_args()
+
+def configure_environment(workdir: str):
+    # Settings are read at import time, so this has to run before importing app.*
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["REDIRECT_CACHE_SIZE"] = "0"
+
+def install_latency(latency_ms: float):
+    """Sleep inside SQLite's statement trace hook, on whichever thread runs the query"""
+    from sqlalchemy import event
+    from app.models import engine, async_engine
+
+    delay = latency_ms / 1000.0
+
+    def trace(statement: str):
+        if statement.lstrip().upper().startswith("SELECT"):
+            time.sleep(delay)
+
+    @event.listens_for(engine, "connect")
+    def on_sync_connect(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(trace)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def on_async_connect(dbapi_connection, connection_record):
+        dbapi_connection.run_async(lambda conn: conn.set_trace_callback(trace))
+
+    # Drop connections opened before the hooks were installed (table creation)
+    engine.dispose()
+
+def add_legacy_route(app):
+    """The pre-async redirect route: sync session inside an async handler"""
+    from fastapi import Request
+    from app.models import SessionLocal
+    from app.repo import QRCodeRepository
+    from app.services.redirect import RedirectService
+
+    @app.get("/legacy/r/{code}")
+    async def legacy_redirect(code: str, request: Request):
+        db = SessionLocal()
+        try:
+            return RedirectService(QRCodeRepository(db)).handle_redirect(code, request)
+        finally:
+            db.close()
+
+def seed_codes(count: int):
+    from app.models import SessionLocal
+    from app.repo import QRCodeRepository
+    from app.schemas import QRCreateRequest
+
+    db = SessionLocal()
+    try:
+        repo = QRCodeRepository(db)
+        return [
+            repo.create_qr(QRCreateRequest(type="dynamic", target=f"https://example.com/{i}")).code
+            for i in range(count)
+        ]
+    finally:
+        db.close()
+
+async def run_level(client, path_prefix: str, codes, in_flight: int, total: int) -> dict:
+    next_index = 0
+    errors = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < total:
+            code = codes[next_index % len(codes)]
+            next_index += 1
+            response = await client.get(f"{path_prefix}/{code}")
+            if response.status_code != 302:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(in_flight)))
+    elapsed = time.perf_counter() - started
+    return {
+        "in_flight": in_flight,
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(total / elapsed, 1)
+    }
+
+async def main_async(args, codes):
+    import httpx
+    from app.main import app
+    from app.models import async_engine
+    from app.services.scan_sink import scan_sink
+
+    levels = [int(level) for level in args.levels.split(",")]
+    results = {"async": [], "legacy_sync": []}
+
+    scan_sink.start()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for in_flight in levels:
+                results["async"].append(await run_level(client, "/r", codes, in_flight, args.requests))
+                results["legacy_sync"].append(await run_level(client, "/legacy/r", codes, in_flight, args.requests))
+    finally:
+        scan_sink.stop()
+        await async_engine.dispose()
+    return results
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="qr-bench-")
+    configure_environment(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app.main import app
+    install_latency(args.db_latency_ms)
+    add_legacy_route(app)
+    codes = seed_codes(args.codes)
+
+    results = asyncio.run(main_async(args, codes))
+    print(json.dumps({
+        "benchmark": "redirect_concurrency",
+        "db_latency_ms": args.db_latency_ms,
+        "codes": args.codes,
+        "results": results
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""SVG output: qrcode's SvgPathImage vs the run-length path writer.
+
+Both paths start from an already encoded QR code. For each payload length
+this reports the document size, the time to produce the bytes, the time to
+parse them back with ElementTree, and whether both draw the same modules.
+
+    cd backend
+    python -m benchmarks.svg --lengths 20,100,500,1500 --repeat 200
+"""
+import argparse
+import io
+import json
+import re
+import time
+import xml.etree.ElementTree as ET
+
+import qrcode
+from qrcode.image.svg import SvgPathImage
+
+from app.services.svg import write_svg
+
+NUMBER = re.compile(r"[A-Za-z]|-?\d+(?:\.\d+)?")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", default="20,100,500,1500", help="comma-separated payload lengths")
+    parser.add_argument("--repeat", type=int, default=200, help="renders per length and path")
+    parser.add_argument("--box-size", type=int, default=10, help="pixels per module")
+    return parser.parse_args()
+
+def encode(data: str, box_size: int) -> qrcode.QRCode:
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=box_size, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+def path_image(qr) -> bytes:
+    buffer = io.BytesIO()
+    qr.make_image(image_factory=SvgPathImage).save(buffer)
+    return buffer.getvalue()
+
+def run_length(qr) -> bytes:
+    buffer = io.StringIO()
+    write_svg(qr.get_matrix(), qr.box_size, buffer)
+    return buffer.getvalue().encode()
+
+def dark_modules(svg: bytes) -> set:
+    """Cells covered by the path, for documents made of axis-aligned unit-height rectangles"""
+    path = next(e for e in ET.fromstring(svg).iter() if e.tag.endswith("path"))
+    tokens = NUMBER.findall(path.get("d"))
+    cells, x, y, start, command, i = set(), 0.0, 0.0, (0.0, 0.0), None, 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+            if command in "zZ":
+                x, y = start
+                continue
+        if command in "Mm":
+            dx, dy = float(tokens[i]), float(tokens[i + 1])
+            x, y = (dx, dy) if command == "M" else (x + dx, y + dy)
+            start = (x, y)
+            i += 2
+        elif command in "Hh":
+            target = float(tokens[i]) if command == "H" else x + float(tokens[i])
+            cells.update((int(c), int(y)) for c in range(int(min(x, target)), int(max(x, target))))
+            x = target
+            i += 1
+        elif command in "Vv":
+            y = float(tokens[i]) if command == "V" else y + float(tokens[i])
+            i += 1
+    return cells
+
+def time_path(render, qr, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        render(qr)
+    return (time.perf_counter() - started) / repeat
+
+def time_parse(svg: bytes, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        ET.fromstring(svg)
+    return (time.perf_counter() - started) / repeat
+
+def measure(args, length: int) -> dict:
+    qr = encode("x" * length, args.box_size)
+    reference, candidate = path_image(qr), run_length(qr)
+
+    reference_seconds = time_path(path_image, qr, args.repeat)
+    candidate_seconds = time_path(run_length, qr, args.repeat)
+    return {
+        "payload_length": length,
+        "modules": len(qr.get_matrix()),
+        "same_modules": dark_modules(reference) == dark_modules(candidate),
+        "svgpath_bytes": len(reference),
+        "run_length_bytes": len(candidate),
+        "size_ratio": round(len(candidate) / len(reference), 3),
+        "svgpath_ms": round(reference_seconds * 1000, 3),
+        "run_length_ms": round(candidate_seconds * 1000, 3),
+        "speedup": round(reference_seconds / candidate_seconds, 2),
+        "svgpath_parse_ms": round(time_parse(reference, args.repeat) * 1000, 3),
+        "run_length_parse_ms": round(time_parse(candidate, args.repeat) * 1000, 3)
+    }
+
+def main():
+    args = parse_args()
+    results = [measure(args, int(length)) for length in args.lengths.split(",")]
+    print(json.dumps({
+        "benchmark": "svg",
+        "box_size": args.box_size,
+        "results": results
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
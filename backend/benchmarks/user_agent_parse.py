@@ -0,0 +1,38 @@
+"""Cost of labelling a scan's User-Agent, uncached vs memoized.
+
+    cd backend
+    python -m benchmarks.user_agent_parse
+"""
+import json
+import time
+
+from app.services.useragent import UserAgentCache, parse_user_agent
+
+USER_AGENTS = [
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15",
+    "Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Mobile Safari/537.36",
+]
+
+def time_per_call(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        fn(USER_AGENTS[i % len(USER_AGENTS)])
+    return (time.perf_counter() - started) / iterations
+
+def main():
+    cache = UserAgentCache(max_size=2048)
+    uncached = time_per_call(parse_user_agent, 500)
+    cached = time_per_call(cache.parse, 50000)
+    print(json.dumps({
+        "benchmark": "user_agent_parse",
+        "uncached_us": round(uncached * 1e6, 2),
+        "cached_us": round(cached * 1e6, 2),
+        "speedup": round(uncached / cached, 1),
+        "cache": cache.stats()
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
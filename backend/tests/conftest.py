@@ -1,18 +1,33 @@
 import pytest
 import tempfile
 import os
+import uuid
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from fastapi.testclient import TestClient
+from starlette.requests import Request
 
 from app.main import app
 from app.models import Base
-from app.deps import get_db
+from app.deps import get_db, get_async_db
+from app.schemas import RedirectRecord
+from app.services.code_filter import code_filter
+from app.services.jobs import bulk_jobs
+from app.services.rate_limit import rate_limiter
+from app.services.redirect_cache import redirect_cache
+from app.services.scan_sink import scan_sink
+from app.services.short_codes import short_codes
 
 # Create test database
 TEST_DATABASE_URL = "sqlite:///./test.db"
 test_engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+# NullPool: each TestClient request runs on its own event loop, so pooled
+# aiosqlite connections (and their worker threads) must not outlive it
+test_async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestAsyncSessionLocal = async_sessionmaker(test_async_engine, autoflush=False, expire_on_commit=False)
 
 def override_get_db():
     try:
@@ -21,7 +36,16 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with TestAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+scan_sink.session_factory = TestSessionLocal
+code_filter.session_factory = TestSessionLocal
+short_codes.session_factory = TestSessionLocal
+bulk_jobs.session_factory = TestSessionLocal
 
 @pytest.fixture(scope="session")
 def setup_test_db():
@@ -50,6 +74,7 @@ def client(setup_test_db):
             db.commit()
         finally:
             db.close()
+        rate_limiter.reset()
         
         yield test_client
     
@@ -66,4 +91,24 @@ def db_session(setup_test_db):
     try:
         yield session
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+@pytest.fixture
+def clear_redirect_cache():
+    redirect_cache.clear()
+    yield
+    redirect_cache.clear()
+
+def make_request(headers: dict = None) -> Request:
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/r/test",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 12345),
+        "query_string": b"",
+    })
+
+def make_record(code: str) -> RedirectRecord:
+    return RedirectRecord(id=str(uuid.uuid4()), code=code, type="dynamic", target=f"https://{code}.example")
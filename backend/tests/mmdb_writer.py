@@ -0,0 +1,83 @@
+"""Minimal MaxMind DB writer for GeoIP test fixtures.
+
+Writes an IPv6 tree (IPv4 networks live under ::/96, as in GeoLite2) with
+24-bit records and ``{"country": {"iso_code": ...}}`` data entries.
+"""
+import ipaddress
+import struct
+import time
+
+METADATA_MARKER = b"\xab\xcd\xefMaxMind.com"
+
+def _control(type_id: int, size: int) -> bytes:
+    assert size < 29
+    if type_id <= 7:
+        return bytes([(type_id << 5) | size])
+    return bytes([size, type_id - 7])
+
+def encode(value) -> bytes:
+    if isinstance(value, dict):
+        out = _control(7, len(value))
+        for key, item in value.items():
+            out += encode(key) + encode(item)
+        return out
+    if isinstance(value, list):
+        return _control(11, len(value)) + b"".join(encode(item) for item in value)
+    if isinstance(value, str):
+        raw = value.encode()
+        return _control(2, len(raw)) + raw
+    if isinstance(value, int):
+        raw = value.to_bytes((value.bit_length() + 7) // 8, "big") if value else b""
+        return _control(6 if value < 2 ** 32 else 9, len(raw)) + raw
+    raise TypeError(value)
+
+def write_country_mmdb(path: str, networks: dict):
+    """Write ``{"81.2.69.0/24": "GB", "2a02:db8::/32": "DE"}`` to ``path``"""
+    tree = [[None, None]]
+    data = b""
+    for network, iso_code in networks.items():
+        net = ipaddress.ip_network(network)
+        if net.version == 4:
+            bits, length = int(net.network_address), net.prefixlen + 96
+        else:
+            bits, length = int(net.network_address), net.prefixlen
+        offset = len(data)
+        data += encode({"country": {"iso_code": iso_code}})
+
+        node = 0
+        for depth in range(length):
+            bit = (bits >> (127 - depth)) & 1
+            if depth == length - 1:
+                tree[node][bit] = ("data", offset)
+            else:
+                child = tree[node][bit]
+                if child is None:
+                    tree.append([None, None])
+                    child = tree[node][bit] = ("node", len(tree) - 1)
+                node = child[1]
+
+    node_count = len(tree)
+
+    def record(value) -> int:
+        if value is None:
+            return node_count
+        kind, target = value
+        return target if kind == "node" else node_count + 16 + target
+
+    search_tree = b"".join(
+        struct.pack(">I", record(left))[1:] + struct.pack(">I", record(right))[1:]
+        for left, right in tree
+    )
+    metadata = encode({
+        "binary_format_major_version": 2,
+        "binary_format_minor_version": 0,
+        "build_epoch": int(time.time()),
+        "database_type": "Test-Country",
+        "description": {"en": "test fixture"},
+        "ip_version": 6,
+        "languages": ["en"],
+        "node_count": node_count,
+        "record_size": 24
+    })
+    with open(path, "wb") as f:
+        f.write(search_tree + b"\x00" * 16 + data + METADATA_MARKER + metadata)
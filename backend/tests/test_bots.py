@@ -0,0 +1,78 @@
+import uuid
+import pytest
+
+from app.models import BotHit, Scan
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest, ScanEvent
+from app.services.bots import BotClassifier
+from app.services.redirect import RedirectService
+from app.services.redirect_cache import redirect_cache
+from app.services.scan_sink import ScanSink
+from tests.conftest import TestSessionLocal, make_request
+
+IPHONE_UA = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1"
+)
+
+@pytest.mark.parametrize("user_agent, label", [
+    ("Slackbot-LinkExpanding 1.0 (+https://api.slack.com/robots)", "slack"),
+    ("WhatsApp/2.23.20.0 A", "whatsapp"),
+    ("facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)", "facebook"),
+    ("Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)", "google"),
+    ("curl/8.4.0", "http-client"),
+    ("Mozilla/5.0 (compatible; SemrushBot/7~bl; +http://www.semrush.com/bot.html)", "generic"),
+    (IPHONE_UA, None),
+    ("Mozilla/5.0 (Linux; Android 13; Cubot X30) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36", None),
+    ("", None),
+])
+def test_classifies_user_agents(user_agent, label):
+    """Test common preview bots, crawlers and clients are labelled, browsers aren't"""
+    assert BotClassifier().classify(user_agent) == label
+
+def test_rules_can_be_replaced():
+    """Test load_rules swaps the rule set, including rules with their own groups"""
+    classifier = BotClassifier()
+    classifier.load_rules([("scanner", r"(Acme|Contoso)LinkCheck"), ("slack", r"Slackbot")])
+    
+    assert classifier.classify("ContosoLinkCheck/2.0") == "scanner"
+    assert classifier.classify("Slackbot 1.0") == "slack"
+    assert classifier.classify("facebookexternalhit/1.1") is None
+
+def test_bot_redirect_counted_not_recorded(db_session):
+    """Test a bot is redirected but only bumps the daily counter"""
+    redirect_cache.clear()
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target="https://campaign.example"))
+    service = RedirectService(repo)
+    
+    for _ in range(2):
+        response = service.handle_redirect(qr.code, make_request({"User-Agent": "WhatsApp/2.23.20.0 A"}))
+        assert response.status_code == 302
+    service.handle_redirect(qr.code, make_request({"User-Agent": IPHONE_UA}))
+    
+    assert db_session.query(Scan).filter(Scan.qr_id == qr.id).count() == 1
+    analytics = repo.get_scan_analytics(qr.id)
+    assert analytics["total_scans"] == 1
+    assert analytics["bot_hits"] == 2
+
+def test_sink_diverts_bots_to_counters(db_session):
+    """Test the sink writes humans as scans and bots as one counter row per (QR, day, bot)"""
+    qr_id = str(uuid.uuid4())
+    sink = ScanSink(session_factory=TestSessionLocal)
+    
+    def submit(user_agent: str):
+        sink.submit(ScanEvent(qr_id=qr_id, ip_hash=uuid.uuid4().hex[:16], user_agent=user_agent))
+    
+    for _ in range(3):
+        submit("Slackbot-LinkExpanding 1.0 (+https://api.slack.com/robots)")
+    submit("facebookexternalhit/1.1")
+    submit(IPHONE_UA)
+    sink.flush()
+    submit("Slackbot-LinkExpanding 1.0 (+https://api.slack.com/robots)")
+    sink.flush()
+    
+    rows = {row.bot: row.hits for row in db_session.query(BotHit).filter(BotHit.qr_id == qr_id)}
+    assert rows == {"slack": 4, "facebook": 1}
+    assert db_session.query(Scan).filter(Scan.qr_id == qr_id).count() == 1
+    assert sink.stats()["bot_hits"] == 5
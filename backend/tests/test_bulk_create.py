@@ -0,0 +1,48 @@
+import csv
+import io
+import zipfile
+
+from app.models import QRCode
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest, UTMParams
+from app.services import bulk
+from app.services.bulk import BulkService
+from app.services.qrcode import QRCodeService
+from app.services.short_codes import short_codes
+
+def test_create_qrs_inserts_batch(db_session):
+    """Test a batch insert stores every row, with its A/B split and UTM settings"""
+    repo = QRCodeRepository(db_session)
+    created = repo.create_qrs([
+        QRCreateRequest(type="static", content="hello", name="Static"),
+        QRCreateRequest(type="dynamic", target="https://batch.example", utm=UTMParams(utm_source="batch")),
+        QRCreateRequest(type="dynamic", variants=[{"target": "https://a.example"}, {"target": "https://b.example"}]),
+    ])
+
+    assert [qr.type for qr in created] == ["static", "dynamic", "dynamic"]
+    assert len({qr.code for qr in created}) == 3
+    assert db_session.query(QRCode).filter(QRCode.id.in_([qr.id for qr in created])).count() == 3
+    assert repo.get_redirect_record(created[1].code).target == "https://batch.example?utm_source=batch"
+    split = repo.get_redirect_record(created[2].code)
+    assert split.target == "https://a.example"
+    assert split.variants.targets == ["https://a.example", "https://b.example"]
+
+def test_failed_batch_falls_back_to_rows(db_session, tmp_path, monkeypatch):
+    """Test one bad row fails alone, with the same error a single insert reports"""
+    repo = QRCodeRepository(db_session)
+    taken = repo.create_qr(QRCreateRequest(type="static", content="taken")).code
+    fresh = short_codes.allocate_many(2)
+    monkeypatch.setattr(bulk.short_codes, "allocate_many", lambda count: [fresh[0], taken, fresh[1]][:count])
+
+    service = QRCodeService()
+    service.upload_dir = str(tmp_path)
+    csv_text = "name,type,content,target\nFirst,static,https://one.example,\nClash,static,https://two.example,\nThird,static,https://three.example,"
+    result = BulkService(repo, service).process_bulk_csv(csv_text)
+
+    assert (result["successful"], result["failed"]) == (2, 1)
+    with zipfile.ZipFile(result["zip_path"]) as archive:
+        rows = list(csv.DictReader(io.StringIO(archive.read("results.csv").decode())))
+    assert [row["status"] for row in rows] == ["success", "error", "success"]
+    assert "UNIQUE constraint failed" in rows[1]["error"]
+    assert [row["code"] for row in rows] == [fresh[0], "", fresh[1]]
+    assert db_session.query(QRCode).filter(QRCode.code.in_(fresh)).count() == 2
@@ -0,0 +1,160 @@
+import csv
+import io
+import os
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.models import BulkJobChunk, QRCode
+from app.repo import QRCodeRepository
+from app.services.bulk import BulkService
+from app.services.jobs import bulk_jobs
+from app.services.qrcode import QRCodeService
+from app.services.render_pool import render_pool
+
+def make_csv(prefix: str, rows: int = 5) -> str:
+    lines = "\n".join(f"{prefix} {i},static,https://{prefix}.example/{i}," for i in range(rows))
+    return f"name,type,content,target\n{lines}"
+
+def created_rows(db_session, prefix: str):
+    return db_session.query(QRCode).filter(QRCode.name.like(f"{prefix} %")).all()
+
+@pytest.fixture
+def bulk_service(db_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "BULK_JOB_DIR", str(tmp_path / "jobs"))
+    service = QRCodeService()
+    service.upload_dir = str(tmp_path)
+    return BulkService(QRCodeRepository(db_session), service)
+
+def test_interrupted_job_resumes_after_last_chunk(db_session, bulk_service, monkeypatch):
+    """Test a rerun skips finished chunks, renders committed ones and creates no row twice"""
+    job_id = str(uuid.uuid4())
+    render = render_pool.render
+    calls = []
+
+    def crash_on_second_chunk(tasks, upload_dir, format_type="png"):
+        calls.append(len(tasks))
+        if len(calls) == 2:
+            raise RuntimeError("worker killed")
+        return render(tasks, upload_dir, format_type)
+
+    monkeypatch.setattr(render_pool, "render", crash_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        bulk_service.process_bulk_csv(make_csv("Resume"), job_id=job_id)
+    # Chunks 0 and 1 were committed; only chunk 0 was rendered
+    first_codes = {qr.id: qr.code for qr in created_rows(db_session, "Resume")}
+    assert len(first_codes) == 4
+    assert bulk_service.repo.get_job_chunk_rows(job_id) == {0: 2, 1: 2}
+
+    calls.clear()
+    monkeypatch.setattr(render_pool, "render", lambda *args, **kwargs: calls.append(len(args[0])) or render(*args, **kwargs))
+    result = bulk_service.process_bulk_csv(make_csv("Resume"), job_id=job_id)
+
+    assert calls == [2, 1]  # Chunk 1 rendered from its checkpoint, chunk 2 created; chunk 0 untouched
+    assert (result["total_processed"], result["successful"]) == (5, 5)
+    qrs = created_rows(db_session, "Resume")
+    assert len(qrs) == 5
+    assert all(first_codes[qr.id] == qr.code for qr in qrs if qr.id in first_codes)
+
+    with zipfile.ZipFile(result["zip_path"]) as archive:
+        rows = list(csv.DictReader(io.StringIO(archive.read("results.csv").decode())))
+        assert [row["name"] for row in rows] == [f"Resume {i}" for i in range(5)]
+        assert sorted(name for name in archive.namelist() if name.endswith(".png")) == sorted(f"{qr.code}.png" for qr in qrs)
+
+    bulk_service.discard_checkpoints(job_id)
+    assert bulk_service.repo.get_job_chunk_rows(job_id) == {}
+    assert not os.path.exists(os.path.join(settings.BULK_JOB_DIR, job_id))
+
+def test_rows_from_interrupted_fallback_are_reused(db_session, bulk_service, tmp_path, monkeypatch):
+    """Test rows a row-by-row retry created before the worker died are not created again"""
+    job_id = str(uuid.uuid4())
+    repo = bulk_service.repo
+
+    def broken_batch(*args, **kwargs):
+        raise RuntimeError("batch rejected")
+
+    def crash(checkpoint):
+        raise RuntimeError("worker killed")
+
+    monkeypatch.setattr(repo, "create_qrs", broken_batch)
+    monkeypatch.setattr(repo, "add_job_chunk", crash)
+    with pytest.raises(RuntimeError):
+        bulk_service.process_bulk_csv(make_csv("Fallback", rows=2), job_id=job_id)
+    first_ids = {qr.id for qr in created_rows(db_session, "Fallback")}
+    assert len(first_ids) == 2
+
+    monkeypatch.undo()
+    monkeypatch.setattr(settings, "BULK_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "BULK_JOB_DIR", str(tmp_path / "jobs"))
+    result = bulk_service.process_bulk_csv(make_csv("Fallback", rows=2), job_id=job_id)
+
+    assert result["successful"] == 2
+    assert {qr.id for qr in created_rows(db_session, "Fallback")} == first_ids
+    assert db_session.query(BulkJobChunk).filter(BulkJobChunk.job_id == job_id).count() == 1
+
+def test_failed_job_is_retried_from_checkpoint(setup_test_db, tmp_path, monkeypatch):
+    """Test a failed run queues the job again and the next run finishes it"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "BULK_JOB_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(settings, "BULK_CHUNK_SIZE", 2)
+    render = render_pool.render
+    calls = []
+
+    def fail_once(tasks, upload_dir, format_type="png"):
+        calls.append(len(tasks))
+        if len(calls) == 2:
+            raise RuntimeError("render host lost")
+        return render(tasks, upload_dir, format_type)
+
+    monkeypatch.setattr(render_pool, "render", fail_once)
+    job = bulk_jobs.enqueue(io.BytesIO(make_csv("Retry").encode()), "retry.csv", "demo-user-123")
+
+    bulk_jobs.run(bulk_jobs.claim())
+    retried = bulk_jobs.get(job.id)
+    assert (retried.status, retried.attempts, retried.processed) == ("queued", 1, 2)
+    assert "render host lost" in retried.error
+
+    assert bulk_jobs.claim() == job.id
+    bulk_jobs.run(job.id)
+    done = bulk_jobs.get(job.id)
+    assert (done.status, done.attempts, done.processed, done.succeeded) == ("done", 2, 5, 5)
+    assert calls == [2, 2, 2, 1]
+    assert os.listdir(tmp_path / "jobs") == []
+
+def test_stale_running_job_is_taken_over(setup_test_db, tmp_path, monkeypatch):
+    """Test a running job is only claimed again once its heartbeat is stale"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "BULK_JOB_DIR", str(tmp_path / "jobs"))
+    job = bulk_jobs.enqueue(io.BytesIO(make_csv("Stale").encode()), "stale.csv", "demo-user-123")
+
+    assert bulk_jobs.claim() == job.id
+    assert bulk_jobs.claim() is None
+
+    bulk_jobs._update(job.id, heartbeat_at=datetime.utcnow() - timedelta(seconds=bulk_jobs.stale_after + 1))
+    assert bulk_jobs.claim() == job.id
+    assert bulk_jobs.claim() is None
+    assert bulk_jobs.get(job.id).attempts == 2
+    bulk_jobs.run(job.id)
+    assert bulk_jobs.get(job.id).status == "done"
+
+def test_stale_job_out_of_attempts_is_failed(setup_test_db, tmp_path, monkeypatch):
+    """Test a stale running job that used up its attempts is failed, not taken over again"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "BULK_JOB_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(bulk_jobs, "max_attempts", 1)
+    job = bulk_jobs.enqueue(io.BytesIO(make_csv("Exhausted").encode()), "exhausted.csv", "demo-user-123")
+
+    assert bulk_jobs.claim() == job.id
+    bulk_jobs._update(job.id, heartbeat_at=datetime.utcnow() - timedelta(seconds=bulk_jobs.stale_after + 1))
+    failed = bulk_jobs.failed
+    assert bulk_jobs.claim() is None
+
+    exhausted = bulk_jobs.get(job.id)
+    assert (exhausted.status, exhausted.attempts) == ("failed", 1)
+    assert "stopped responding" in exhausted.error
+    assert exhausted.finished_at is not None
+    assert bulk_jobs.failed == failed + 1
@@ -0,0 +1,71 @@
+import csv
+import io
+import itertools
+import os
+import tracemalloc
+import zipfile
+from types import SimpleNamespace
+
+from app.services.bulk import BulkService
+from app.services.qrcode import QRCodeService
+from app.services.render_pool import render_pool
+
+ROWS = 50000
+
+class InMemoryRepo:
+    """Stands in for the database so the test measures the pipeline alone"""
+
+    def __init__(self):
+        self._ids = itertools.count()
+
+    def create_qrs(self, qr_requests, codes, ids=None, extra=None):
+        return [
+            SimpleNamespace(
+                id=f"qr-{next(self._ids)}", code=code, name=qr_request.name,
+                type=qr_request.type, content=qr_request.content, design={}
+            )
+            for qr_request, code in zip(qr_requests, codes)
+        ]
+
+def test_bulk_memory_stays_bounded(setup_test_db, tmp_path, monkeypatch):
+    """Test a 50k-row upload is processed without holding the upload, rows or results in memory.
+
+    The only state that grows with the job is the ZIP's central directory
+    (a few hundred bytes per entry); parsing the whole CSV and collecting
+    every result, as before, took several times the bound asserted here.
+    """
+    service = QRCodeService()
+    service.upload_dir = str(tmp_path)
+    (tmp_path / "artifact.png").write_bytes(b"\x89PNG" + b"\0" * 300)
+    monkeypatch.setattr(render_pool, "render", lambda tasks, upload_dir, format_type="png": [("artifact.png", "")] * len(tasks))
+
+    upload = tmp_path / "upload.csv"
+    with open(upload, "w", newline="") as f:
+        f.write("name,type,content,target\n")
+        for i in range(ROWS):
+            f.write(f"Row {i},static,https://bulk.example/{i},\n")
+
+    progress = []
+    with open(upload, "r", encoding="utf-8", newline="") as f:
+        tracemalloc.start()
+        try:
+            result = BulkService(InMemoryRepo(), service).process_bulk_csv(f, progress=progress.append)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    assert peak < 40 * 1024 * 1024
+    assert result["successful"] == ROWS
+    assert progress[0]["total"] == ROWS
+    assert progress[-1]["processed"] == ROWS
+
+    with zipfile.ZipFile(result["zip_path"]) as archive:
+        entries = archive.infolist()
+        assert len(entries) == ROWS + 1
+        assert all(entry.compress_type == zipfile.ZIP_STORED for entry in entries)
+        with archive.open("results.csv") as member:
+            results = csv.DictReader(io.TextIOWrapper(member, encoding="utf-8", newline=""))
+            first = next(results)
+            assert first["name"] == "Row 0" and f"{first['code']}.png" in archive.namelist()
+            assert sum(1 for _ in results) == ROWS - 1
+    assert not os.path.exists(f"{result['zip_path']}.part")
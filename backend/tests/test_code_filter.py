@@ -0,0 +1,132 @@
+import uuid
+import pytest
+from fastapi import HTTPException
+
+from app.models import QRCode
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest
+from app.services.code_filter import BloomFilter, CodeFilter
+from app.services.redirect import RedirectService
+from app.services.redirect_cache import redirect_cache
+from tests.conftest import TestSessionLocal, make_request
+
+@pytest.fixture
+def code_filter(setup_test_db, monkeypatch):
+    fresh = CodeFilter(session_factory=TestSessionLocal, negative_ttl=60, sync_interval=60)
+    monkeypatch.setattr("app.services.invalidation.code_filter", fresh)
+    monkeypatch.setattr("app.services.redirect.code_filter", fresh)
+    redirect_cache.clear()
+    yield fresh
+    redirect_cache.clear()
+
+def redirect_status(service: RedirectService, code: str) -> int:
+    try:
+        return service.handle_redirect(code, make_request()).status_code
+    except HTTPException as e:
+        return e.status_code
+
+def insert_from_other_worker(db_session) -> QRCode:
+    """Insert a code directly, as another worker would, without telling this filter"""
+    qr = QRCode(id=str(uuid.uuid4()), code=uuid.uuid4().hex[:8], type="dynamic", target="https://other.example")
+    db_session.add(qr)
+    db_session.commit()
+    return qr
+
+def test_bloom_filter_has_no_false_negatives():
+    """Test every added item is found and the FPR stays near the target"""
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    items = [uuid.uuid4().hex[:8] for _ in range(10000)]
+    for item in items:
+        bloom.add(item)
+    
+    assert all(item in bloom for item in items)
+    
+    probes = [f"missing-{i}" for i in range(20000)]
+    observed = sum(probe in bloom for probe in probes) / len(probes)
+    assert observed < 0.02
+    assert bloom.expected_false_positive_rate == pytest.approx(0.01, rel=0.2)
+    # ~9.6 bits per item at 1%
+    assert bloom.memory_bytes < 10000 * 10 / 8 + 8
+
+def test_unknown_code_rejected_without_database(db_session, code_filter):
+    """Test codes outside the filter 404 without a repository lookup once creates are broadcast"""
+    repo = QRCodeRepository(db_session)
+    known = repo.create_qr(QRCreateRequest(type="dynamic", target="https://known.example"))
+    code_filter.rebuild()
+    code_filter.sync_due()  # use up the sync slot
+    code_filter.creates_broadcast = lambda: True
+    
+    def fail(code):
+        raise AssertionError("database lookup for an unknown code")
+    lookup = repo.get_redirect_record
+    repo.get_redirect_record = fail
+    service = RedirectService(repo)
+    
+    assert redirect_status(service, "nope1234") == 404
+    assert code_filter.stats()["rejected"] == 1
+    
+    repo.get_redirect_record = lookup
+    assert redirect_status(service, known.code) == 302
+
+def test_codes_created_here_are_added(db_session, code_filter):
+    """Test create_qr adds the new code so it redirects immediately"""
+    code_filter.rebuild()
+    code_filter.sync_due()
+    repo = QRCodeRepository(db_session)
+    
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target="https://new.example"))
+    
+    assert code_filter.might_exist(qr.code)
+    assert redirect_status(RedirectService(repo), qr.code) == 302
+
+def test_codes_from_other_workers_found_by_sync(db_session, code_filter):
+    """Test a miss triggers an incremental sync before the code is rejected"""
+    code_filter.rebuild()
+    qr = insert_from_other_worker(db_session)
+    
+    assert redirect_status(RedirectService(QRCodeRepository(db_session)), qr.code) == 302
+    assert code_filter.stats()["syncs"] == 1
+    
+    # Only one sync per interval; in between, misses go to the database
+    other = insert_from_other_worker(db_session)
+    assert redirect_status(RedirectService(QRCodeRepository(db_session)), other.code) == 302
+    stats = code_filter.stats()
+    assert (stats["syncs"], stats["unsynced_misses"]) == (1, 1)
+
+def test_code_created_elsewhere_after_unknown_probe(db_session, code_filter):
+    """Test probing an unknown code doesn't make the next code created elsewhere 404 until a sync"""
+    code_filter.rebuild()
+    service = RedirectService(QRCodeRepository(db_session))
+    assert redirect_status(service, "nope1234") == 404  # uses up this interval's sync
+    
+    # Another worker's session; nothing tells this process's filter
+    other_session = TestSessionLocal()
+    try:
+        code = insert_from_other_worker(other_session).code
+    finally:
+        other_session.close()
+    
+    assert not code_filter.might_exist(code)
+    assert redirect_status(service, code) == 302
+    assert redirect_status(service, "nope1234") == 404
+    stats = code_filter.stats()
+    assert (stats["syncs"], stats["rejected"], stats["unsynced_misses"]) == (1, 1, 2)
+    assert stats["false_positives"] == 0
+
+def test_false_positive_goes_to_negative_cache(db_session, code_filter):
+    """Test a code the filter let through but the database lacks is cached as missing"""
+    code_filter.rebuild()
+    code_filter.add("ghost123")  # stands in for a Bloom false positive
+    repo = QRCodeRepository(db_session)
+    service = RedirectService(repo)
+    
+    assert redirect_status(service, "ghost123") == 404
+    
+    def fail(code):
+        raise AssertionError("database lookup for a cached miss")
+    repo.get_redirect_record = fail
+    
+    assert redirect_status(service, "ghost123") == 404
+    stats = code_filter.stats()
+    assert stats["false_positives"] == 1
+    assert stats["negative_cache_hits"] == 1
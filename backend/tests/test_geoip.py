@@ -0,0 +1,63 @@
+import pytest
+
+from app.models import Scan
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest
+from app.services.geoip import GeoIPResolver
+from app.services.redirect import RedirectService
+from app.services.redirect_cache import redirect_cache
+from tests.mmdb_writer import write_country_mmdb
+from tests.conftest import make_request
+
+@pytest.fixture
+def resolver(tmp_path):
+    path = str(tmp_path / "country.mmdb")
+    write_country_mmdb(path, {
+        "81.2.69.0/24": "GB",
+        "89.160.20.0/22": "SE",
+        "2a02:cf40::/32": "NO"
+    })
+    geoip = GeoIPResolver(path, cache_size=100)
+    yield geoip
+    geoip.close()
+
+def test_country_lookup_ipv4_and_ipv6(resolver):
+    """Test addresses resolve to the country of their network"""
+    assert resolver.country("81.2.69.160") == "GB"
+    assert resolver.country("89.160.23.1") == "SE"
+    assert resolver.country("2a02:cf40:1:2::7") == "NO"
+    assert resolver.country("8.8.8.8") is None
+    assert resolver.country("10.1.2.3") is None
+    assert resolver.country("testclient") is None
+
+def test_lookups_cached_per_prefix(resolver):
+    """Test a /24 (IPv4) or /48 (IPv6) is only looked up once"""
+    resolver.country("81.2.69.1")
+    resolver.country("81.2.69.254")
+    resolver.country("2a02:cf40:1:2::7")
+    resolver.country("2a02:cf40:1:ffff::1")
+    
+    stats = resolver.stats()
+    assert stats["misses"] == 2
+    assert stats["hits"] == 2
+
+def test_missing_database_disables_lookup(tmp_path):
+    """Test a resolver without a database answers None"""
+    resolver = GeoIPResolver(str(tmp_path / "absent.mmdb"))
+    
+    assert resolver.open() is False
+    assert resolver.country("81.2.69.160") is None
+
+def test_scan_recorded_with_country(db_session, resolver, monkeypatch):
+    """Test the redirect resolves the country before hashing the IP"""
+    monkeypatch.setattr("app.services.redirect.geoip", resolver)
+    redirect_cache.clear()
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target="https://geo.example"))
+    
+    RedirectService(repo).handle_redirect(qr.code, make_request({"X-Forwarded-For": "81.2.69.160"}))
+    
+    scan = db_session.query(Scan).filter(Scan.qr_id == qr.id).one()
+    assert scan.country == "GB"
+    assert "81.2.69" not in scan.ip_hash
+    assert repo.get_scan_analytics(qr.id)["top_countries"] == [{"country": "GB", "scans": 1}]
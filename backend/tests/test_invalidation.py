@@ -0,0 +1,138 @@
+import threading
+import fakeredis
+import pytest
+
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest, QRTargetUpdate
+from app.services.invalidation import (
+    QR_CHANGED, InvalidationBus, LoopbackTransport, RedisTransport, _qr_changed
+)
+from app.services.redirect import RedirectService
+from app.services.redirect_cache import RedirectCache
+from app.services.redirect_snapshot import RedirectSnapshot
+from tests.conftest import TestSessionLocal, make_record, make_request
+
+class Recorder:
+    """Handler that remembers keys and lets a test wait for them"""
+    
+    def __init__(self):
+        self.keys = []
+        self.event = threading.Event()
+    
+    def __call__(self, key: str):
+        self.keys.append(key)
+        self.event.set()
+
+@pytest.fixture
+def nodes():
+    started = []
+    
+    def make(transport, name):
+        bus = InvalidationBus(transport, node_id=name)
+        bus.start()
+        started.append(bus)
+        return bus
+    
+    yield make
+    for bus in started:
+        bus.stop()
+
+def loopback_pair():
+    transport = LoopbackTransport()
+    return transport, transport
+
+def redis_pair():
+    server = fakeredis.FakeServer()
+    return RedisTransport(fakeredis.FakeRedis(server=server)), RedisTransport(fakeredis.FakeRedis(server=server))
+
+@pytest.mark.parametrize("make_pair", [loopback_pair, redis_pair], ids=["loopback", "redis"])
+def test_event_reaches_other_node_once(nodes, make_pair):
+    """Test a publish runs local handlers once and reaches the other node"""
+    transport_a, transport_b = make_pair()
+    node_a, node_b = nodes(transport_a, "a"), nodes(transport_b, "b")
+    seen_a, seen_b = Recorder(), Recorder()
+    node_a.register(QR_CHANGED, seen_a)
+    node_b.register(QR_CHANGED, seen_b)
+    
+    node_a.publish(QR_CHANGED, "abc12345")
+    
+    assert seen_b.event.wait(2.0)
+    assert seen_b.keys == ["abc12345"]
+    # Node a handled it locally and skipped its own broadcast
+    assert seen_a.keys == ["abc12345"]
+    assert node_a.stats()["received"] == 0
+
+def test_only_shared_transports_deliver_creates():
+    """Test a bus vouches for cross-node delivery only over a shared transport, after its connect catch-up"""
+    caught_up = []
+    buses = [InvalidationBus(LoopbackTransport(), node_id="loopback"), InvalidationBus(redis_pair()[0], node_id="redis")]
+    for bus in buses:
+        bus.on_connect(lambda: caught_up.append(True))
+        assert not bus.delivering
+        bus.start()
+    try:
+        assert caught_up == [True, True]
+        assert [bus.delivering for bus in buses] == [False, True]
+    finally:
+        for bus in buses:
+            bus.stop()
+    assert not buses[1].delivering
+
+def test_retarget_invalidates_other_node_cache(db_session, nodes, monkeypatch):
+    """Test update_qr_target drops the code from another node's redirect cache"""
+    server = fakeredis.FakeServer()
+    local = nodes(RedisTransport(fakeredis.FakeRedis(server=server)), "local")
+    remote = nodes(RedisTransport(fakeredis.FakeRedis(server=server)), "remote")
+    monkeypatch.setattr("app.repo.invalidation_bus", local)
+    
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target="https://old.example"))
+    remote_cache = RedirectCache(max_size=10, ttl_seconds=60)
+    remote_cache.set(qr.code, make_record(qr.code))
+    done = Recorder()
+    remote.register(QR_CHANGED, remote_cache.invalidate)
+    remote.register(QR_CHANGED, done)
+    
+    repo.update_qr_target(qr.id, QRTargetUpdate(target="https://new.example"))
+    
+    assert done.event.wait(2.0)
+    assert remote_cache.get(qr.code) is None
+
+@pytest.mark.usefixtures("clear_redirect_cache")
+def test_retarget_reaches_other_host_snapshot(db_session, nodes, tmp_path, monkeypatch):
+    """Test a retarget on one host stops another host's snapshot serving the old target"""
+    server = fakeredis.FakeServer()
+    host_a = nodes(RedisTransport(fakeredis.FakeRedis(server=server)), "host-a")
+    host_b = nodes(RedisTransport(fakeredis.FakeRedis(server=server)), "host-b")
+    done = Recorder()
+    host_b.register(QR_CHANGED, _qr_changed)
+    host_b.register(QR_CHANGED, done)
+    
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target="https://old.example"))
+    snapshot_a, snapshot_b = [
+        RedirectSnapshot(str(tmp_path / host / "redirects.snap"), session_factory=TestSessionLocal, poll_interval=60)
+        for host in ("a", "b")
+    ]
+    snapshot_a.start()
+    snapshot_b.start()
+    try:
+        monkeypatch.setattr("app.repo.invalidation_bus", host_a)
+        monkeypatch.setattr("app.repo.redirect_snapshot", snapshot_a)
+        monkeypatch.setattr("app.services.invalidation.redirect_snapshot", snapshot_b)
+        monkeypatch.setattr("app.services.redirect.redirect_snapshot", snapshot_b)
+        service_b = RedirectService(repo)
+        assert service_b.handle_redirect(qr.code, make_request()).headers["location"] == "https://old.example"
+        
+        repo.update_qr_target(qr.id, QRTargetUpdate(target="https://new.example"))
+        
+        assert done.event.wait(2.0)
+        assert snapshot_b.get(qr.code) is None
+        assert service_b.handle_redirect(qr.code, make_request()).headers["location"] == "https://new.example"
+        # A rebuild on host b folds the change in and lifts the tombstone
+        assert snapshot_b.build()
+        assert snapshot_b.get(qr.code).target == "https://new.example"
+        assert snapshot_b.stats()["evicted"] == 0
+    finally:
+        snapshot_a.stop()
+        snapshot_b.stop()
@@ -0,0 +1,80 @@
+import io
+import os
+import time
+import zipfile
+
+from app.config import settings
+from app.services.auth import create_access_token
+from app.services.jobs import bulk_jobs
+
+CSV = """name,type,content,target
+Job QR 1,static,https://job1.example,
+Job QR 2,dynamic,,https://job2.example
+Job QR 3,static,https://job3.example,"""
+
+def auth(user_id: str = "demo-user-123") -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+def wait_for_job(client, job_id: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        data = client.get(f"/api/jobs/{job_id}", headers=auth()).json()
+        if data["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return data
+        time.sleep(0.05)
+
+def test_bulk_upload_is_queued_and_reports_progress(client, tmp_path, monkeypatch):
+    """Test the upload returns 202 at once and the job finishes in the background"""
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(upload_dir))
+    monkeypatch.setattr(settings, "BULK_JOB_DIR", str(tmp_path / "jobs"))
+    files = {"file": ("codes.csv", io.BytesIO(CSV.encode()), "text/csv")}
+    response = client.post("/api/qr/bulk", files=files, headers=auth())
+
+    assert response.status_code == 202
+    queued = response.json()
+    assert queued["status"] == "queued"
+    assert queued["result_url"] is None
+
+    data = wait_for_job(client, queued["id"])
+    assert data["status"] == "done"
+    assert (data["total"], data["processed"], data["succeeded"], data["failed"]) == (3, 3, 3, 0)
+
+    zip_path = os.path.join(str(upload_dir), data["result_url"].rsplit("/", 1)[1])
+    with zipfile.ZipFile(zip_path) as archive:
+        assert len([name for name in archive.namelist() if name.endswith(".png")]) == 3
+    # The upload is kept out of the public upload dir and removed once the job is done
+    assert bulk_jobs.get(queued["id"]).input_path.startswith(str(tmp_path / "jobs"))
+    assert os.listdir(tmp_path / "jobs") == []
+    assert not any(name.endswith(".csv") or name == "jobs" for name in os.listdir(upload_dir))
+
+def test_job_status_is_private(client, tmp_path, monkeypatch):
+    """Test jobs need authentication and are only visible to their owner"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "BULK_JOB_DIR", str(tmp_path / "jobs"))
+    job = bulk_jobs.enqueue(io.BytesIO(CSV.encode()), "codes.csv", "another-user")
+
+    assert client.get(f"/api/jobs/{job.id}").status_code == 401
+    assert client.get(f"/api/jobs/{job.id}", headers=auth()).status_code == 404
+    assert client.get("/api/jobs/missing", headers=auth()).status_code == 404
+    # Let the local runner finish it while the job dir still points at tmp_path
+    deadline = time.monotonic() + 10
+    while bulk_jobs.get(job.id).status not in ("done", "failed") and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert bulk_jobs.get(job.id).status == "done"
+
+def test_claim_is_exclusive(setup_test_db, tmp_path, monkeypatch):
+    """Test a queued job is handed to one worker only, and bad input fails the job"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "BULK_JOB_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(bulk_jobs, "max_attempts", 1)
+    job = bulk_jobs.enqueue(io.BytesIO(b"name,type\n\xff\xfe"), "broken.csv", "demo-user-123")
+
+    assert bulk_jobs.claim() == job.id
+    assert bulk_jobs.claim() is None
+
+    bulk_jobs.run(job.id)
+    failed = bulk_jobs.get(job.id)
+    assert failed.status == "failed"
+    assert "utf-8" in failed.error
@@ -0,0 +1,32 @@
+import io
+import pytest
+import qrcode
+from PIL import Image
+
+from app.services.raster import rasterize
+
+def encode(box_size: int, border: int) -> qrcode.QRCode:
+    qr = qrcode.QRCode(box_size=box_size, border=border)
+    qr.add_data("https://qrbuilder.pro/r/Xk3p9Qa")
+    qr.make(fit=True)
+    return qr
+
+@pytest.mark.parametrize("fill, back", [
+    ("black", "white"),
+    ("navy", "#ffeecc"),
+    ("#123456", "transparent"),
+    ((10, 20, 30), (200, 200, 200)),
+    ("white", "black"),
+])
+@pytest.mark.parametrize("box_size, border", [(1, 0), (10, 4), (33, 2)])
+def test_matches_qrcode_pixels(fill, back, box_size, border):
+    """Test the rasterized PNG decodes to the same pixels as qr.make_image"""
+    qr = encode(box_size, border)
+    reference = qr.make_image(fill_color=fill, back_color=back).get_image()
+    
+    buffer = io.BytesIO()
+    rasterize(qr.get_matrix(), box_size, fill, back).save(buffer, format="PNG")
+    decoded = Image.open(io.BytesIO(buffer.getvalue())).convert(reference.mode)
+    
+    assert decoded.size == reference.size
+    assert decoded.tobytes() == reference.tobytes()
@@ -0,0 +1,77 @@
+import fakeredis
+import pytest
+
+from app.services.rate_limit import InMemoryRateLimiter, RedisRateLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr("app.services.rate_limit.time.monotonic", fake)
+    monkeypatch.setattr("app.services.rate_limit.time.time", fake)
+    return fake
+
+def make_limiters():
+    return [
+        InMemoryRateLimiter(max_attempts=5, window_seconds=60),
+        RedisRateLimiter(fakeredis.FakeRedis(), max_attempts=5, window_seconds=60)
+    ]
+
+@pytest.mark.parametrize("limiter", make_limiters(), ids=["memory", "redis"])
+def test_sixth_attempt_in_window_is_refused(limiter, clock):
+    """Test 5 attempts are allowed per key and window, the 6th is refused"""
+    assert [limiter.hit("ip", "code") for _ in range(6)] == [True] * 5 + [False]
+    
+    # Other codes and other IPs have their own budget
+    assert limiter.hit("ip", "other-code") is True
+    assert limiter.hit("other-ip", "code") is True
+
+@pytest.mark.parametrize("limiter", make_limiters(), ids=["memory", "redis"])
+def test_window_slides(limiter, clock):
+    """Test attempts leave the window one by one and refusals aren't counted"""
+    for _ in range(5):
+        limiter.hit("ip", "code")
+        clock.now += 10
+    
+    # Refused attempts must not push the window further out
+    assert limiter.hit("ip", "code") is False
+    assert limiter.hit("ip", "code") is False
+    
+    # The first attempt (t=1000) expires at t=1060
+    clock.now = 1060.5
+    assert limiter.hit("ip", "code") is True
+    assert limiter.hit("ip", "code") is False
+
+def test_redis_limiter_is_shared_between_workers(clock):
+    """Test two workers pointing at the same Redis share one budget"""
+    server = fakeredis.FakeServer()
+    worker_a = RedisRateLimiter(fakeredis.FakeRedis(server=server), max_attempts=5, window_seconds=60)
+    worker_b = RedisRateLimiter(fakeredis.FakeRedis(server=server), max_attempts=5, window_seconds=60)
+    
+    for _ in range(3):
+        assert worker_a.hit("ip", "code") is True
+    for _ in range(2):
+        assert worker_b.hit("ip", "code") is True
+    
+    assert worker_a.hit("ip", "code") is False
+    assert worker_b.hit("ip", "code") is False
+    
+    worker_a.reset()
+    assert worker_b.hit("ip", "code") is True
+
+def test_in_memory_limiter_prunes_idle_keys(clock):
+    """Test keys whose attempts have expired are dropped once the table is full"""
+    limiter = InMemoryRateLimiter(max_attempts=5, window_seconds=60, max_keys=2)
+    limiter.hit("ip", "a")
+    limiter.hit("ip", "b")
+    clock.now += 61
+    
+    limiter.hit("ip", "c")
+    
+    assert set(limiter._attempts) == {"ip:c"}
@@ -0,0 +1,69 @@
+import pytest
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+
+from app.models import Scan
+from app.repo import QRCodeRepository, AsyncQRCodeRepository
+from app.schemas import QRCreateRequest, QRTargetUpdate
+from app.services.redirect import AsyncRedirectService
+from tests.conftest import TestAsyncSessionLocal, make_request
+
+pytestmark = pytest.mark.usefixtures("clear_redirect_cache")
+
+def create_dynamic_qr(db_session, target: str, **target_update):
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target=target))
+    if target_update:
+        repo.update_qr_target(qr.id, QRTargetUpdate(**target_update))
+    return qr
+
+async def redirect(code: str, password: str = None):
+    async with TestAsyncSessionLocal() as db:
+        service = AsyncRedirectService(AsyncQRCodeRepository(db))
+        return await service.handle_redirect(code, make_request(), password)
+
+async def redirect_status(code: str, password: str = None) -> int:
+    try:
+        return (await redirect(code, password)).status_code
+    except HTTPException as e:
+        return e.status_code
+
+@pytest.mark.asyncio
+async def test_async_redirect_records_scan(db_session):
+    """Test async redirect -> 302 and a scan row"""
+    qr = create_dynamic_qr(db_session, "https://async.example")
+    
+    response = await redirect(qr.code)
+    
+    assert response.status_code == 302
+    assert response.headers["location"] == "https://async.example"
+    assert db_session.query(Scan).filter(Scan.qr_id == qr.id).count() == 1
+
+@pytest.mark.asyncio
+async def test_async_redirect_unknown_code():
+    """Test async redirect for non-existent QR -> 404"""
+    assert await redirect_status("does-not-exist") == 404
+
+@pytest.mark.asyncio
+async def test_async_redirect_expired(db_session):
+    """Test async redirect for expired QR -> 410"""
+    qr = create_dynamic_qr(
+        db_session, "https://expired.example",
+        expiry_at=datetime.utcnow() - timedelta(minutes=1)
+    )
+    
+    assert await redirect_status(qr.code) == 410
+
+@pytest.mark.asyncio
+async def test_async_redirect_password_and_rate_limit(db_session):
+    """Test async password flow -> 401, 302, then 429 after 5 attempts"""
+    qr = create_dynamic_qr(db_session, "https://protected.example", password="secret123")
+    
+    assert await redirect_status(qr.code) == 401
+    assert await redirect_status(qr.code, "wrong") == 401
+    assert await redirect_status(qr.code, "secret123") == 302
+    
+    for i in range(3):
+        assert await redirect_status(qr.code, f"wrong{i}") == 401
+    
+    assert await redirect_status(qr.code, "secret123") == 429
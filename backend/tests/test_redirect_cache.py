@@ -0,0 +1,65 @@
+import time
+import pytest
+from fastapi import HTTPException
+
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest, QRTargetUpdate
+from app.services.redirect import RedirectService
+from app.services.redirect_cache import RedirectCache
+from tests.conftest import make_record, make_request
+
+pytestmark = pytest.mark.usefixtures("clear_redirect_cache")
+
+def test_cache_evicts_least_recently_used():
+    """Test the cache stays bounded and drops the coldest entry"""
+    cache = RedirectCache(max_size=2, ttl_seconds=60)
+    cache.set("a", make_record("a"))
+    cache.set("b", make_record("b"))
+    
+    # Touch "a" so "b" becomes the eviction candidate
+    assert cache.get("a") is not None
+    cache.set("c", make_record("c"))
+    
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_cache_entry_expires_after_ttl():
+    """Test entries are dropped once their TTL has passed"""
+    cache = RedirectCache(max_size=10, ttl_seconds=0.01)
+    cache.set("a", make_record("a"))
+    time.sleep(0.02)
+    
+    assert cache.get("a") is None
+
+def test_cached_redirect_skips_database(db_session):
+    """Test a warm code is served without querying the repository"""
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target="https://cached.example"))
+    service = RedirectService(repo)
+    
+    assert service.handle_redirect(qr.code, make_request()).headers["location"] == "https://cached.example"
+    
+    def fail(code):
+        raise AssertionError("database lookup on a cache hit")
+    repo.get_redirect_record = fail
+    
+    response = service.handle_redirect(qr.code, make_request())
+    assert response.headers["location"] == "https://cached.example"
+
+def test_retarget_and_delete_invalidate_cache(db_session):
+    """Test update_qr_target and delete_qr are visible on the next redirect"""
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target="https://old.example"))
+    service = RedirectService(repo)
+    
+    assert service.handle_redirect(qr.code, make_request()).headers["location"] == "https://old.example"
+    
+    repo.update_qr_target(qr.id, QRTargetUpdate(target="https://new.example"))
+    assert service.handle_redirect(qr.code, make_request()).headers["location"] == "https://new.example"
+    
+    repo.delete_qr(qr.id)
+    with pytest.raises(HTTPException) as exc_info:
+        service.handle_redirect(qr.code, make_request())
+    assert exc_info.value.status_code == 404
@@ -0,0 +1,96 @@
+import uuid
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest, QRTargetUpdate, RedirectRecord
+from app.services.redirect import RedirectService
+from app.services.redirect_cache import redirect_cache
+from app.services.redirect_snapshot import RedirectSnapshot, SnapshotFile, write_snapshot
+from tests.conftest import TestSessionLocal, make_request
+
+@pytest.fixture
+def make_worker(setup_test_db, tmp_path):
+    """Snapshot readers sharing one file, as uvicorn workers on a host would"""
+    workers = []
+    
+    def make():
+        worker = RedirectSnapshot(str(tmp_path / "redirects.snap"), session_factory=TestSessionLocal, poll_interval=60)
+        worker.start()
+        workers.append(worker)
+        return worker
+    
+    redirect_cache.clear()
+    yield make
+    redirect_cache.clear()
+    for worker in workers:
+        worker.stop()
+
+def create_qr(db_session, target: str):
+    return QRCodeRepository(db_session).create_qr(QRCreateRequest(type="dynamic", target=target))
+
+def test_snapshot_file_lookup(tmp_path):
+    """Test binary search over the mapped index finds every code and only those"""
+    path = str(tmp_path / "codes.snap")
+    codes = [uuid.uuid4().hex[:8] for _ in range(500)]
+    write_snapshot(path, [
+        RedirectRecord(id=f"id-{code}", code=code, type="dynamic", target=f"https://{code}.example")
+        for code in codes
+    ])
+    
+    snapshot = SnapshotFile(path)
+    assert snapshot.count == 500
+    assert all(snapshot.get(code).target == f"https://{code}.example" for code in codes)
+    assert snapshot.get("missing1") is None
+    assert snapshot.get("x" * 40) is None
+
+def test_changes_reach_other_workers_through_delta(db_session, make_worker, monkeypatch):
+    """Test a change made by one worker is layered onto another worker's map"""
+    qr = create_qr(db_session, "https://before.example")
+    worker_a, worker_b = make_worker(), make_worker()
+    assert worker_b.get(qr.code).target == "https://before.example"
+    
+    monkeypatch.setattr("app.repo.redirect_snapshot", worker_a)
+    QRCodeRepository(db_session).update_qr_target(qr.id, QRTargetUpdate(target="https://after.example"))
+    assert worker_a.get(qr.code).target == "https://after.example"
+    
+    worker_b.refresh()
+    assert worker_b.get(qr.code).target == "https://after.example"
+    assert worker_b.stats()["delta_entries"] == 1
+    
+    # Compaction folds the delta into a new snapshot that both pick up
+    assert worker_a.build()
+    worker_b.refresh()
+    assert worker_b.stats()["delta_entries"] == 0
+    assert worker_b.get(qr.code).target == "https://after.example"
+
+def test_snapshot_serves_while_database_is_down(db_session, make_worker, monkeypatch):
+    """Test codes in the snapshot keep redirecting when the database errors"""
+    qr = create_qr(db_session, "https://resilient.example")
+    monkeypatch.setattr("app.services.redirect.redirect_snapshot", make_worker())
+    
+    repo = QRCodeRepository(db_session)
+    def database_down(code):
+        raise OperationalError("SELECT", {}, Exception("connection refused"))
+    repo.get_redirect_record = database_down
+    
+    response = RedirectService(repo).handle_redirect(qr.code, make_request())
+    assert response.headers["location"] == "https://resilient.example"
+
+def test_deleted_code_is_tombstoned(db_session, make_worker, monkeypatch):
+    """Test a delete published through the delta 404s without reaching the database"""
+    qr = create_qr(db_session, "https://gone.example")
+    worker = make_worker()
+    monkeypatch.setattr("app.repo.redirect_snapshot", worker)
+    monkeypatch.setattr("app.services.redirect.redirect_snapshot", worker)
+    repo = QRCodeRepository(db_session)
+    repo.delete_qr(qr.id)
+    
+    def fail(code):
+        raise AssertionError("database lookup for a code in the snapshot")
+    repo.get_redirect_record = fail
+    
+    with pytest.raises(HTTPException) as exc_info:
+        RedirectService(repo).handle_redirect(qr.code, make_request())
+    assert exc_info.value.status_code == 404
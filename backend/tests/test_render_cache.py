@@ -0,0 +1,113 @@
+import os
+from types import SimpleNamespace
+import pytest
+from reportlab import rl_config
+
+from app.config import settings
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest, QRUpdateRequest
+from app.services.matrix import matrix_cache
+from app.services.qrcode import QRCodeService
+from app.services.svg import module_runs
+
+def make_qr(**overrides):
+    fields = dict(code="Rc1Test", type="dynamic", content=None, name="Poster", folder="", design={})
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+@pytest.fixture
+def service(tmp_path):
+    service = QRCodeService()
+    service.upload_dir = str(tmp_path)
+    return service
+
+def test_existing_artifact_is_reused(service, monkeypatch):
+    """Test a second render of unchanged inputs neither encodes nor writes"""
+    first = service.generate_qr_images(make_qr(), ["png", "svg"])
+    
+    def fail(*args, **kwargs):
+        raise AssertionError("re-rendered")
+    monkeypatch.setattr(service, "_encode", fail)
+    
+    assert service.generate_qr_images(make_qr(), ["png", "svg"]) == first
+
+def test_design_change_replaces_artifact(service):
+    """Test a new design renders a new file and removes the stale one"""
+    old_url = service.generate_qr_images(make_qr(), ["png"])["png"]
+    new_url = service.generate_qr_images(make_qr(design={"color": "navy"}), ["png"])["png"]
+    
+    assert new_url != old_url
+    assert sorted(os.listdir(service.upload_dir)) == [os.path.basename(new_url)]
+
+def test_static_content_change_replaces_artifact(service):
+    """Test changing the encoded content invalidates the cached render"""
+    old_url = service.generate_qr_images(make_qr(type="static", content="hello"), ["svg"])["svg"]
+    new_url = service.generate_qr_images(make_qr(type="static", content="hello again"), ["svg"])["svg"]
+    
+    assert new_url != old_url
+    assert not os.path.exists(os.path.join(service.upload_dir, os.path.basename(old_url)))
+
+def test_formats_are_cleaned_independently(service):
+    """Test re-rendering the PDF leaves the PNG in place"""
+    png_url = service.generate_qr_images(make_qr(), ["png"])["png"]
+    service.generate_qr_images(make_qr(), ["pdf"])
+    service.generate_qr_images(make_qr(name="Renamed"), ["pdf"])
+    
+    files = os.listdir(service.upload_dir)
+    assert os.path.basename(png_url) in files
+    assert len([name for name in files if name.endswith(".pdf")]) == 1
+
+def test_formats_share_one_encode(service):
+    """Test one request encodes the content once for every format"""
+    matrix_cache.clear()
+    service.generate_qr_images(make_qr(code="Rc1Share"), ["png", "svg", "pdf"])
+
+    assert matrix_cache.stats()["misses"] == 1
+    assert matrix_cache.stats()["hits"] == 2
+
+def test_pdf_draws_vector_modules(service, monkeypatch):
+    """Test the PDF page draws modules as rectangles instead of embedding a raster"""
+    monkeypatch.setattr(rl_config, "pageCompression", 0)
+    url = service.generate_qr_images(make_qr(design={"color": "navy"}), ["pdf"])["pdf"]
+    with open(os.path.join(service.upload_dir, os.path.basename(url)), "rb") as f:
+        pdf = f.read()
+
+    runs = list(module_runs(service._encode(service.get_qr_content(make_qr()))))
+    assert b"/Subtype /Image" not in pdf
+    # One rectangle per run of dark modules, plus the background
+    assert pdf.count(b" re") == len(runs) + 1
+
+def test_image_endpoint_renders_on_demand(client, db_session, tmp_path, monkeypatch):
+    """Test the image endpoint renders once and answers revalidation with 304"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target="https://image.example"))
+    
+    url = QRCodeService().image_urls(qr, ["png"])["png"]
+    assert os.listdir(tmp_path) == []
+    path = url.split("/api/", 1)[1]
+    
+    response = client.get(f"/api/{path}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content.startswith(b"\x89PNG")
+    assert "immutable" in response.headers["cache-control"]
+    etag = response.headers["etag"]
+    assert len(os.listdir(tmp_path)) == 1
+    
+    revalidated = client.get(f"/api/qr/{qr.id}/image.png", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+    assert revalidated.headers["cache-control"] == "public, no-cache"
+    
+    # A design change gives a new ETag, so the old one no longer matches
+    repo.update_qr(qr.id, QRUpdateRequest(design={"color": "teal"}))
+    changed = client.get(f"/api/qr/{qr.id}/image.png", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert len(os.listdir(tmp_path)) == 1
+
+def test_image_endpoint_rejects_unknown(client):
+    """Test unknown codes and formats are 404"""
+    assert client.get("/api/qr/missing/image.png").status_code == 404
+    assert client.get("/api/qr/missing/image.gif").status_code == 404
@@ -0,0 +1,59 @@
+import csv
+import io
+import os
+import zipfile
+from types import SimpleNamespace
+
+from app.repo import QRCodeRepository
+from app.services.bulk import BulkService
+from app.services.qrcode import QRCodeService
+from app.services.render_pool import RenderPool
+
+def make_tasks(count: int):
+    return [
+        {"code": f"Pool{i:03d}", "content": f"https://pool.example/{i}", "design": {"color": "navy"} if i % 2 else {}}
+        for i in range(count)
+    ]
+
+def test_worker_processes_keep_input_order(tmp_path):
+    """Test a multi-process render returns one result per task, in order"""
+    pool = RenderPool(workers=2)
+    tasks = make_tasks(12)
+    tasks[5]["design"] = {"color": "not-a-colour"}
+    try:
+        results = pool.render(tasks, str(tmp_path))
+    finally:
+        pool.shutdown()
+
+    assert len(results) == len(tasks)
+    for index, (task, (filename, error)) in enumerate(zip(tasks, results)):
+        if index == 5:
+            assert filename == "" and error
+        else:
+            assert filename.startswith(f"{task['code']}-") and error == ""
+    assert all(os.path.exists(tmp_path / filename) for filename, error in results if not error)
+    assert pool.stats()["failed"] == 1
+
+def test_matches_inline_render(tmp_path):
+    """Test pooled artifacts get the names the image endpoint would serve"""
+    service = QRCodeService()
+    service.upload_dir = str(tmp_path)
+    task = make_tasks(2)[1]
+
+    [(filename, error)] = RenderPool(workers=1).render([task], str(tmp_path))
+    expected, _ = service.ensure_artifact(SimpleNamespace(type="static", **task), "png")
+    assert error == ""
+    assert filename == expected
+
+def test_bulk_results_follow_csv_order(db_session, tmp_path):
+    """Test the results CSV lists rows in upload order with their own images"""
+    service = QRCodeService()
+    service.upload_dir = str(tmp_path)
+    rows = "\n".join(f"Row {i},static,https://bulk.example/{i}," for i in range(6))
+    result = BulkService(QRCodeRepository(db_session), service).process_bulk_csv(f"name,type,content,target\n{rows}")
+
+    assert result["successful"] == 6
+    with zipfile.ZipFile(result["zip_path"]) as archive:
+        listed = list(csv.DictReader(io.StringIO(archive.read("results.csv").decode())))
+        assert [row["name"] for row in listed] == [f"Row {i}" for i in range(6)]
+        assert all(f"{row['code']}.png" in archive.namelist() for row in listed)
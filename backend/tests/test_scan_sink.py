@@ -0,0 +1,50 @@
+import uuid
+
+from app.models import Scan
+from app.schemas import ScanEvent
+from app.services.scan_sink import ScanSink
+from tests.conftest import TestSessionLocal
+
+def make_event(qr_id: str) -> ScanEvent:
+    return ScanEvent(qr_id=qr_id, ip_hash=uuid.uuid4().hex[:16], device="Other")
+
+def count_scans(db_session, qr_id: str) -> int:
+    return db_session.query(Scan).filter(Scan.qr_id == qr_id).count()
+
+def test_flush_bulk_inserts_queued_events(db_session):
+    """Test queued events land in scans in batches"""
+    qr_id = str(uuid.uuid4())
+    sink = ScanSink(session_factory=TestSessionLocal, batch_size=4, max_queue_size=100)
+    
+    for _ in range(10):
+        assert sink.submit(make_event(qr_id))
+    
+    assert sink.stats()["queue_depth"] == 10
+    assert sink.flush() == 10
+    assert count_scans(db_session, qr_id) == 10
+    assert sink.stats()["flushes"] == 3
+
+def test_full_queue_drops_and_counts(db_session):
+    """Test a saturated sink drops events instead of blocking"""
+    qr_id = str(uuid.uuid4())
+    sink = ScanSink(session_factory=TestSessionLocal, max_queue_size=2)
+    
+    results = [sink.submit(make_event(qr_id)) for _ in range(5)]
+    
+    assert results == [True, True, False, False, False]
+    assert sink.stats()["dropped"] == 3
+    sink.flush()
+    assert count_scans(db_session, qr_id) == 2
+
+def test_stop_flushes_pending_events(db_session):
+    """Test shutdown writes everything still buffered"""
+    qr_id = str(uuid.uuid4())
+    sink = ScanSink(session_factory=TestSessionLocal, batch_size=1000, flush_interval=60)
+    sink.start()
+    for _ in range(25):
+        sink.submit(make_event(qr_id))
+    sink.stop()
+    
+    assert not sink.running
+    assert count_scans(db_session, qr_id) == 25
+    assert sink.stats()["queue_depth"] == 0
@@ -0,0 +1,83 @@
+import threading
+import pytest
+
+from app.models import CodeCounter
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest
+from app.services.short_codes import ALPHABET, ShortCodeAllocator, ShortCodePermutation
+from tests.conftest import TestSessionLocal
+
+def test_permutation_is_a_bijection():
+    """Test a small code space maps onto itself with no collisions"""
+    permutation = ShortCodePermutation(b"test-key", length=2)
+    values = [permutation.permute(value) for value in range(permutation.size)]
+    
+    assert sorted(values) == list(range(permutation.size))
+
+def test_codes_are_fixed_width_base62():
+    """Test codes have the configured length and only base62 characters"""
+    permutation = ShortCodePermutation(b"test-key", length=7)
+    codes = [permutation.code(value) for value in range(1000)]
+    
+    assert all(len(code) == 7 and set(code) <= set(ALPHABET) for code in codes)
+    assert len(set(codes)) == 1000
+    # Consecutive counter values don't give guessable neighbours
+    assert codes[0][:4] != codes[1][:4]
+
+def test_key_changes_the_mapping():
+    """Test two keys give different code sequences"""
+    assert ShortCodePermutation(b"key-a").code(0) != ShortCodePermutation(b"key-b").code(0)
+
+def test_blocks_are_reserved_once_per_block(setup_test_db):
+    """Test codes come from one reservation per block, and bulk gets its own range"""
+    allocator = ShortCodeAllocator(b"test-key", block_size=100, session_factory=TestSessionLocal, counter="test-blocks")
+    codes = [allocator.allocate() for _ in range(150)]
+    codes += allocator.allocate_many(5000)
+    
+    assert len(set(codes)) == 5150
+    assert allocator.stats()["reservations"] == 3
+    db = TestSessionLocal()
+    try:
+        assert db.query(CodeCounter).filter(CodeCounter.name == "test-blocks").one().next_value == 5200
+    finally:
+        db.close()
+
+def test_concurrent_allocators_never_collide(setup_test_db):
+    """Test workers sharing the counter hand out disjoint codes"""
+    allocators = [
+        ShortCodeAllocator(b"test-key", block_size=25, session_factory=TestSessionLocal, counter="test-concurrent")
+        for _ in range(4)
+    ]
+    results = [[] for _ in allocators]
+    
+    def work(index: int):
+        for _ in range(200):
+            results[index].append(allocators[index].allocate())
+    
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(len(allocators))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    codes = [code for result in results for code in result]
+    assert len(codes) == len(set(codes)) == 800
+
+def test_changed_key_stops_allocation(setup_test_db):
+    """Test a counter refuses blocks for a key other than the one its codes were issued under"""
+    original = ShortCodeAllocator(b"key-before", block_size=10, session_factory=TestSessionLocal, counter="test-rotated")
+    issued = original.allocate_many(20)
+    
+    rotated = ShortCodeAllocator(b"key-after", block_size=10, session_factory=TestSessionLocal, counter="test-rotated")
+    with pytest.raises(RuntimeError, match="SHORT_CODE_KEY changed"):
+        rotated.allocate()
+    
+    # The original key carries on from where it was
+    assert original.allocate() not in issued
+
+def test_create_qr_uses_allocator(db_session):
+    """Test new QR codes get 7-character base62 codes"""
+    qr = QRCodeRepository(db_session).create_qr(QRCreateRequest(type="dynamic", target="https://example.com"))
+    
+    assert len(qr.code) == 7
+    assert set(qr.code) <= set(ALPHABET)
@@ -0,0 +1,58 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+import pytest
+import qrcode
+
+from app.services.svg import write_svg
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+def encode(data: str = "https://qrbuilder.pro/r/Xk3p9Qa") -> qrcode.QRCode:
+    qr = qrcode.QRCode(box_size=10, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+def render(qr, fill="black", back="white") -> ET.Element:
+    buffer = io.StringIO()
+    write_svg(qr.get_matrix(), qr.box_size, buffer, fill, back)
+    return ET.fromstring(buffer.getvalue().encode())
+
+def painted_modules(path: str) -> set:
+    """Replay ``M``/``m`` + ``h{n}v1h-{n}z`` runs into the cells they cover"""
+    cells, x, y = set(), 0, 0
+    for command, dx, dy, length in re.findall(r"([Mm])(-?\d+) (-?\d+)h(\d+)v1h-\4z", path):
+        x, y = (int(dx), int(dy)) if command == "M" else (x + int(dx), y + int(dy))
+        cells.update((x + offset, y) for offset in range(int(length)))
+    return cells
+
+@pytest.mark.parametrize("data", ["hi", "https://qrbuilder.pro/r/Xk3p9Qa", "x" * 800])
+def test_path_covers_dark_modules(data):
+    """Test the merged path paints exactly the dark modules, border included"""
+    qr = encode(data)
+    matrix = qr.get_matrix()
+    root = render(qr)
+    path = root.find(f"{SVG}path").get("d")
+
+    expected = {(x, y) for y, row in enumerate(matrix) for x, dark in enumerate(row) if dark}
+    assert painted_modules(path) == expected
+    assert root.get("viewBox") == f"0 0 {len(matrix)} {len(matrix)}"
+    assert root.get("width") == f"{len(matrix)}mm"
+
+def test_design_colours():
+    """Test fill and background come from the design, normalised to hex"""
+    root = render(encode(), fill="navy", back=(255, 238, 204))
+    assert root.find(f"{SVG}rect").get("fill") == "#ffeecc"
+    assert root.find(f"{SVG}path").get("fill") == "#000080"
+
+def test_transparent_background():
+    """Test a transparent background draws no rect; translucent fills keep their alpha"""
+    root = render(encode(), fill=(18, 52, 86, 128), back="transparent")
+    assert root.find(f"{SVG}rect") is None
+    assert root.find(f"{SVG}path").get("fill-opacity") == "0.502"
+
+def test_rejects_unknown_colour():
+    """Test colour values never reach the markup unparsed"""
+    with pytest.raises(ValueError):
+        render(encode(), fill='red" onload="alert(1)')
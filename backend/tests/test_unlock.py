@@ -0,0 +1,70 @@
+import pytest
+from fastapi import HTTPException
+
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest, QRTargetUpdate, RedirectRecord
+from app.services.redirect import RedirectService
+from app.services.unlock import UNLOCK_COOKIE, UnlockTokenSigner
+from tests.conftest import make_request
+
+pytestmark = pytest.mark.usefixtures("clear_redirect_cache")
+
+def make_record(**overrides) -> RedirectRecord:
+    fields = dict(id="qr-1", code="abc12345", type="dynamic", target="https://a.example", password_hash="h1")
+    fields.update(overrides)
+    return RedirectRecord(**fields)
+
+def unlock_cookie(response) -> str:
+    header = response.headers["set-cookie"]
+    assert header.startswith(f"{UNLOCK_COOKIE}=")
+    return header.split(";")[0].split("=", 1)[1]
+
+def test_token_round_trip_and_expiry():
+    """Test a token verifies until it expires and only for its own code"""
+    signer = UnlockTokenSigner("secret", ttl_seconds=60)
+    record = make_record()
+    token = signer.issue(record, now=1000)
+    
+    assert signer.verify(token, record, now=1059)
+    assert not signer.verify(token, record, now=1060)
+    assert not signer.verify(token, make_record(code="other123"), now=1000)
+    assert not signer.verify(token[:-2] + "xx", record, now=1000)
+    assert not signer.verify("garbage", record, now=1000)
+    assert not UnlockTokenSigner("other-secret").verify(token, record, now=1000)
+
+def test_token_bound_to_password_and_target():
+    """Test changing the password hash or target invalidates issued tokens"""
+    signer = UnlockTokenSigner("secret", ttl_seconds=60)
+    token = signer.issue(make_record(), now=1000)
+    
+    assert not signer.verify(token, make_record(password_hash="h2"), now=1000)
+    assert not signer.verify(token, make_record(target="https://b.example"), now=1000)
+
+def test_unlock_cookie_skips_password_and_rate_limit(db_session, monkeypatch):
+    """Test a returning visitor with the cookie is redirected without a password"""
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target="https://locked.example"))
+    repo.update_qr_target(qr.id, QRTargetUpdate(password="secret123"))
+    service = RedirectService(repo)
+    
+    response = service.handle_redirect(qr.code, make_request(), "secret123")
+    assert response.status_code == 302
+    assert f"Path=/r/{qr.code}" in response.headers["set-cookie"]
+    cookie = unlock_cookie(response)
+    
+    def fail(*args):
+        raise AssertionError("unlocked visit hit the rate limiter or database")
+    monkeypatch.setattr("app.services.redirect.rate_limiter.hit", fail)
+    lookup = repo.get_redirect_record
+    repo.get_redirect_record = fail
+    
+    response = service.handle_redirect(qr.code, make_request({"Cookie": f"{UNLOCK_COOKIE}={cookie}"}))
+    assert response.headers["location"] == "https://locked.example"
+    assert "set-cookie" not in response.headers
+    
+    # A new password invalidates the cookie
+    repo.get_redirect_record = lookup
+    repo.update_qr_target(qr.id, QRTargetUpdate(password="changed456"))
+    with pytest.raises(HTTPException) as exc_info:
+        service.handle_redirect(qr.code, make_request({"Cookie": f"{UNLOCK_COOKIE}={cookie}"}))
+    assert exc_info.value.status_code == 401
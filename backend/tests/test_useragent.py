@@ -0,0 +1,49 @@
+from app.schemas import ScanEvent
+from app.services.useragent import UserAgentCache, apply_user_agent, parse_user_agent
+
+IPHONE_UA = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1"
+)
+
+def test_repeat_user_agent_is_served_from_cache():
+    """Test the second parse of a UA is a cache hit with the same labels"""
+    cache = UserAgentCache(max_size=10)
+    
+    first = cache.parse(IPHONE_UA)
+    second = cache.parse(IPHONE_UA)
+    
+    assert second is first
+    assert first == parse_user_agent(IPHONE_UA)
+    assert first.device == "iPhone (iOS)"
+    assert first.browser == "Mobile Safari"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+def test_cache_key_uses_truncated_user_agent():
+    """Test UAs that only differ past the stored length share an entry"""
+    cache = UserAgentCache(max_size=10)
+    base = IPHONE_UA.ljust(200, "x")
+    
+    cache.parse(base + "a")
+    cache.parse(base + "b")
+    
+    assert cache.stats()["size"] == 1
+    assert cache.stats()["hits"] == 1
+
+def test_cache_is_bounded():
+    """Test the least recently used UA is evicted"""
+    cache = UserAgentCache(max_size=2)
+    for ua in ["curl/8.0", "Wget/1.21", "python-requests/2.32"]:
+        cache.parse(ua)
+    
+    assert cache.stats()["size"] == 2
+    cache.parse("curl/8.0")
+    assert cache.stats()["hits"] == 0
+
+def test_apply_user_agent_sets_device_label():
+    """Test scan events get their device label from the parser"""
+    event = ScanEvent(qr_id="qr", ip_hash="abc", user_agent=IPHONE_UA)
+    
+    assert apply_user_agent(event).device == "iPhone (iOS)"
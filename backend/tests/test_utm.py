@@ -0,0 +1,89 @@
+import pytest
+
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest, QRTargetUpdate, QRUpdateRequest, UTMParams
+from app.services.redirect import RedirectService
+from app.services.utm import compile_target, merge_utm
+from tests.conftest import make_request
+
+pytestmark = pytest.mark.usefixtures("clear_redirect_cache")
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://shop.example", "https://shop.example?utm_source=qr&utm_campaign=spring+sale"),
+    ("https://shop.example/p?id=7&ref=%2Fhome", "https://shop.example/p?id=7&ref=%2Fhome&utm_source=qr&utm_campaign=spring+sale"),
+    ("https://shop.example/p?id=7#reviews", "https://shop.example/p?id=7&utm_source=qr&utm_campaign=spring+sale#reviews"),
+    ("https://shop.example/?utm_source=email", "https://shop.example/?utm_source=email&utm_campaign=spring+sale"),
+])
+def test_compile_target_merges_query(url, expected):
+    """Test UTM parameters are appended without disturbing the target's own query"""
+    assert compile_target(url, {"utm_source": "qr", "utm_campaign": "spring sale"}) == expected
+
+def test_qr_settings_override_folder():
+    """Test the QR's own fields win over its folder's, field by field"""
+    merged = merge_utm({"utm_source": "flyer", "utm_medium": "print"}, {"utm_source": "poster"})
+    assert merged == {"utm_source": "poster", "utm_medium": "print"}
+
+def test_redirect_uses_compiled_target(db_session):
+    """Test the redirect emits the compiled target of the QR and its folder"""
+    repo = QRCodeRepository(db_session)
+    repo.set_folder_utm("utm-spring", UTMParams(utm_campaign="spring", utm_medium="print"))
+    qr = repo.create_qr(QRCreateRequest(
+        type="dynamic",
+        target="https://shop.example/?lang=en",
+        folder="utm-spring",
+        utm=UTMParams(utm_source="poster")
+    ))
+    service = RedirectService(repo)
+
+    response = service.handle_redirect(qr.code, make_request())
+    assert response.headers["location"] == "https://shop.example/?lang=en&utm_source=poster&utm_medium=print&utm_campaign=spring"
+    # Stored target stays as entered
+    assert qr.target == "https://shop.example/?lang=en"
+
+def test_updates_recompile_cached_targets(db_session):
+    """Test target, QR and folder changes all reach an already cached record"""
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target="https://a.example", folder="utm-summer"))
+    service = RedirectService(repo)
+    assert service.handle_redirect(qr.code, make_request()).headers["location"] == "https://a.example"
+
+    repo.set_folder_utm("utm-summer", UTMParams(utm_campaign="summer"))
+    assert service.handle_redirect(qr.code, make_request()).headers["location"] == "https://a.example?utm_campaign=summer"
+
+    repo.update_qr_target(qr.id, QRTargetUpdate(target="https://b.example", utm=UTMParams(utm_source="bus")))
+    assert service.handle_redirect(qr.code, make_request()).headers["location"] == "https://b.example?utm_source=bus&utm_campaign=summer"
+
+    repo.update_qr(qr.id, QRUpdateRequest(folder="utm-none"))
+    assert service.handle_redirect(qr.code, make_request()).headers["location"] == "https://b.example?utm_source=bus"
+
+    repo.update_qr_target(qr.id, QRTargetUpdate(utm=UTMParams()))
+    assert service.handle_redirect(qr.code, make_request()).headers["location"] == "https://b.example"
+
+def test_variant_targets_are_compiled(db_session):
+    """Test A/B variant targets get the UTM parameters too"""
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(
+        type="dynamic",
+        variants=[{"target": "https://a.example/x?v=1"}],
+        utm=UTMParams(utm_source="qr")
+    ))
+
+    record = repo.get_redirect_record(qr.code)
+    assert record.variants.targets == ["https://a.example/x?v=1&utm_source=qr"]
+
+def test_loading_a_record_compiles_nothing(db_session, monkeypatch):
+    """Test targets are compiled on write, including a folder's codes and bulk creates, and only read on load"""
+    repo = QRCodeRepository(db_session)
+    single = repo.create_qr(QRCreateRequest(type="dynamic", target="https://one.example", folder="utm-autumn"))
+    batch = repo.create_qrs([
+        QRCreateRequest(type="dynamic", variants=[{"target": "https://two.example"}], folder="utm-autumn")
+    ])[0]
+    repo.set_folder_utm("utm-autumn", UTMParams(utm_campaign="autumn"))
+
+    def fail(*args):
+        raise AssertionError("UTM compiled while loading a redirect record")
+    monkeypatch.setattr("app.repo.compile_target", fail)
+    monkeypatch.setattr("app.repo.build_variant_table", fail)
+
+    assert repo.get_redirect_record(single.code).target == "https://one.example?utm_campaign=autumn"
+    assert repo.get_redirect_record(batch.code).variants.targets == ["https://two.example?utm_campaign=autumn"]
@@ -0,0 +1,109 @@
+import uuid
+from collections import Counter
+import pytest
+
+from app.models import VariantHit
+from app.repo import QRCodeRepository
+from app.schemas import QRCreateRequest, QRTargetUpdate, ScanEvent
+from app.services.redirect import RedirectService
+from app.services.scan_sink import ScanSink
+from app.services.variants import build_variant_table, pick_variant
+from tests.conftest import TestSessionLocal, make_request
+
+IPHONE_UA = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1"
+)
+
+def variants(*weights):
+    return [
+        {"name": chr(ord("A") + i), "target": f"https://{i}.example", "weight": weight}
+        for i, weight in enumerate(weights)
+    ]
+
+pytestmark = pytest.mark.usefixtures("clear_redirect_cache")
+
+def test_alias_table_follows_weights():
+    """Test draws from the alias table match the configured weights"""
+    table = build_variant_table(variants(1, 2, 7))
+    draws = Counter(pick_variant(table) for _ in range(20000))
+
+    assert abs(draws[0] / 20000 - 0.1) < 0.02
+    assert abs(draws[1] / 20000 - 0.2) < 0.02
+    assert abs(draws[2] / 20000 - 0.7) < 0.02
+
+def test_sticky_pick_is_stable_per_key():
+    """Test a sticky key always maps to the same variant, while keys still spread"""
+    table = build_variant_table(variants(1, 1), sticky=True)
+
+    assert len({pick_variant(table, "visitor-1:abc") for _ in range(50)}) == 1
+    assert {pick_variant(table, f"visitor-{i}:abc") for i in range(50)} == {0, 1}
+
+def test_redirect_splits_between_variants(db_session):
+    """Test a split QR redirects to its variants and counts hits per variant"""
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(
+        type="dynamic",
+        variants=[{"target": "https://a.example"}, {"target": "https://b.example", "weight": 3}]
+    ))
+    assert qr.target == "https://a.example"
+    service = RedirectService(repo)
+
+    locations = Counter(
+        service.handle_redirect(qr.code, make_request({"User-Agent": IPHONE_UA})).headers["location"]
+        for _ in range(40)
+    )
+    assert set(locations) == {"https://a.example", "https://b.example"}
+
+    by_variant = {row["variant"]: row for row in repo.get_scan_analytics(qr.id)["by_variant"]}
+    assert by_variant["A"]["scans"] == locations["https://a.example"]
+    assert by_variant["B"]["scans"] == locations["https://b.example"]
+    assert by_variant["B"]["target"] == "https://b.example"
+
+def test_cached_split_needs_no_database(db_session, monkeypatch):
+    """Test the alias table travels with the cached record"""
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", variants=[{"target": "https://a.example"}]))
+    service = RedirectService(repo)
+    service.handle_redirect(qr.code, make_request())
+
+    def fail(*args, **kwargs):
+        raise AssertionError("database hit")
+    monkeypatch.setattr(repo, "get_redirect_record", fail)
+
+    assert service.handle_redirect(qr.code, make_request()).headers["location"] == "https://a.example"
+
+def test_sticky_redirect_and_retarget(db_session):
+    """Test sticky splits keep a visitor on one variant and updates take effect"""
+    repo = QRCodeRepository(db_session)
+    qr = repo.create_qr(QRCreateRequest(type="dynamic", target="https://single.example"))
+    repo.update_qr_target(qr.id, QRTargetUpdate(
+        variants=[{"target": "https://a.example"}, {"target": "https://b.example"}],
+        sticky_variants=True
+    ))
+    service = RedirectService(repo)
+
+    request = make_request({"X-Forwarded-For": "203.0.113.9"})
+    assert len({service.handle_redirect(qr.code, request).headers["location"] for _ in range(20)}) == 1
+
+    # Removing the split falls back to the plain target
+    repo.update_qr_target(qr.id, QRTargetUpdate(variants=[]))
+    assert service.handle_redirect(qr.code, request).headers["location"] == "https://single.example"
+    assert repo.get_variants(qr.id) is None
+
+def test_variant_names_must_be_unique():
+    """Test duplicate variant names are rejected"""
+    with pytest.raises(ValueError):
+        QRTargetUpdate(variants=[{"target": "https://a.example", "name": "x"}, {"target": "https://b.example", "name": "x"}])
+
+def test_sink_tallies_variant_hits(db_session):
+    """Test the sink adds human scans of a split to the per-variant counters"""
+    qr_id = str(uuid.uuid4())
+    sink = ScanSink(session_factory=TestSessionLocal)
+    for variant in ["A", "A", "B"]:
+        sink.submit(ScanEvent(qr_id=qr_id, ip_hash=uuid.uuid4().hex[:16], user_agent=IPHONE_UA, variant=variant))
+    sink.submit(ScanEvent(qr_id=qr_id, ip_hash="bot", user_agent="WhatsApp/2.23.20.0 A", variant="B"))
+    sink.flush()
+
+    rows = {row.variant: row.hits for row in db_session.query(VariantHit).filter(VariantHit.qr_id == qr_id)}
+    assert rows == {"A": 2, "B": 1}